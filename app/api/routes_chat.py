@@ -1,12 +1,24 @@
-from fastapi import APIRouter, Depends
+import asyncio
+import json
+import logging
+import time
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
 from app.api.deps import verify_api_key
 from app.core.config import settings
-from app.rag.embeddings import embed_texts
-from app.rag.chroma_store import search_similar
+from app.core.metrics import CHAT_ERRORS, StageTimer
+from app.rag import answer_cache
+from app.rag.query_embeddings import embed_queries_async, embed_query_async, normalize_question
+from app.rag.retrieval import confident_lexical_hits, lexical_hits, vector_hits, vector_hits_many
 from app.rag.prompt import build_rag_prompt
-from app.rag.llm import generate_answer
+from app.rag.singleflight import chat_flights, flight_key
+from app.rag.llm import generate_answer_async, stream_answer
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/v1/chat", tags=["chat"])
 
@@ -21,35 +33,296 @@ class ChatResponse(BaseModel):
     sources: list[dict]
 
 
-@router.post("", response_model=ChatResponse)
-def chat(request: ChatRequest, _: str = Depends(verify_api_key)):
-    q_emb = embed_texts([request.question])[0]
-    
-    hits = search_similar(query_embedding=q_emb, top_k=settings.TOP_K)
-    hits = hits[:settings.MAX_CONTEXT_CHUNKS]
-    
-    prompt = build_rag_prompt(question=request.question, chunks=hits, language=request.language)
-    answer = generate_answer(prompt=prompt)
-    
-    # Deduplicate sources by post_id, keeping only the best (lowest distance) chunk per post
+class BatchChatRequest(BaseModel):
+    questions: list[Annotated[str, Field(min_length=3, max_length=4000)]] = Field(
+        min_length=1, max_length=settings.CHAT_BATCH_MAX_QUESTIONS
+    )
+    language: str = Field(default="English", max_length=50)
+
+
+class BatchChatItem(BaseModel):
+    question: str
+    answer: str | None = None
+    sources: list[dict] = Field(default_factory=list)
+    error: str | None = None
+
+
+class BatchChatResponse(BaseModel):
+    results: list[BatchChatItem]
+
+
+def build_sources(hits: list[dict]) -> list[dict]:
+    # Hits arrive best first (by distance, BM25 or fused rank); keep the best chunk per post.
+    # Lexical-only hits have no distance.
     seen_posts = {}
     for h in hits:
         meta = h.get("meta", {}) or {}
         post_id = meta.get("post_id")
-        distance = h.get("distance", float('inf'))
         
-        if post_id not in seen_posts or distance < seen_posts[post_id]["distance"]:
+        if post_id not in seen_posts:
             seen_posts[post_id] = {
                 "post_id": post_id,
                 "title": meta.get("title"),
                 "url": meta.get("url"),
                 "chunk_index": meta.get("chunk_index"),
-                "distance": distance,
+                "distance": h.get("distance"),
                 "excerpt": (h.get("text") or "")[:300],
             }
     
-    sources = list(seen_posts.values())
-    # Sort by distance (most relevant first)
-    sources.sort(key=lambda x: x["distance"])
+    return list(seen_posts.values())
+
+
+def _flight_key(request: ChatRequest) -> str:
+    # everything that can change the answer to the same question
+    return flight_key(
+        normalize_question(request.question),
+        request.language,
+        settings.RETRIEVAL_MODE,
+        settings.VECTOR_STORE,
+        settings.TOP_K,
+        settings.MAX_CONTEXT_CHUNKS,
+        settings.CONTEXT_MAX_TOKENS,
+        settings.LLM_PROVIDER,
+        settings.OPENAI_RESPONSES_MODEL,
+        settings.GEMINI_GENERATE_MODEL,
+    )
+
+
+@router.post("", response_model=ChatResponse)
+async def chat(request: ChatRequest, response: Response, _: str = Depends(verify_api_key)):
+    timer = StageTimer()
+    try:
+        if not settings.CHAT_COALESCE_ENABLED:
+            result = await _answer(request, timer)
+        else:
+            result = await chat_flights.do(_flight_key(request), lambda: _answer(request, timer))
+    finally:
+        response.headers["Server-Timing"] = timer.finish()
+    return ChatResponse(**result)
+
+
+async def _answer(request: ChatRequest, timer: StageTimer) -> dict:
+    with timer.stage("retrieve"):
+        lexical = await lexical_hits(request.question)
+        hits = await confident_lexical_hits(request.question, lexical)
+    q_emb = None
+    if hits is None:
+        with timer.stage("embed"):
+            q_emb = await embed_query_async(request.question)
+
+        with timer.stage("cache"):
+            cached = await answer_cache.lookup(embedding=q_emb, language=request.language)
+        if cached:
+            return {"answer": cached.answer, "sources": cached.sources}
+
+        with timer.stage("retrieve"):
+            hits = await vector_hits(q_emb, lexical)
+    else:
+        with timer.stage("cache"):
+            cached = await answer_cache.lookup_lexical(question=request.question, language=request.language, hits=lexical)
+        if cached:
+            return {"answer": cached.answer, "sources": cached.sources}
+    hits = hits[:settings.MAX_CONTEXT_CHUNKS]
+    
+    with timer.stage("prompt"):
+        prompt, hits = build_rag_prompt(question=request.question, chunks=hits, language=request.language)
+    with timer.stage("generate"):
+        answer = await generate_answer_async(prompt=prompt)
+    sources = build_sources(hits)
+
+    with timer.stage("cache"):
+        await _store_answer(
+            question=request.question,
+            embedding=q_emb,
+            language=request.language,
+            answer=answer,
+            sources=sources,
+            hits=hits,
+            lexical=lexical,
+            gen_ms=timer.stages["generate"] * 1000,
+        )
     
-    return ChatResponse(answer=answer, sources=sources)
+    return {"answer": answer, "sources": sources}
+
+
+async def _store_answer(
+    *,
+    question: str,
+    embedding: list[float] | None,
+    language: str,
+    answer: str,
+    sources: list[dict],
+    hits: list[dict],
+    lexical: list[dict],
+    gen_ms: float,
+) -> None:
+    """Semantic cache entry for embedded questions; lexical fast-path answers are keyed on their BM25 hits."""
+    if embedding is not None:
+        await answer_cache.store(
+            question=question, embedding=embedding, language=language, answer=answer, sources=sources, hits=hits, gen_ms=gen_ms
+        )
+    else:
+        await answer_cache.store_lexical(
+            question=question, language=language, answer=answer, sources=sources, hits=lexical, gen_ms=gen_ms
+        )
+
+
+@router.post("/batch", response_model=BatchChatResponse)
+async def chat_batch(request: BatchChatRequest, _: str = Depends(verify_api_key)):
+    """
+    Many questions at once: one embedding request, one vector store query and
+    at most CHAT_BATCH_CONCURRENCY LLM calls in flight. A failing step only
+    fails the questions it was for. Repeated questions are answered once.
+    """
+    unique: dict[str, str] = {}
+    for q in request.questions:
+        unique.setdefault(normalize_question(q), q)
+    position = {key: i for i, key in enumerate(unique)}
+    questions = list(unique.values())
+    items = [BatchChatItem(question=q) for q in questions]
+    embeddings: list[list[float] | None] = [None] * len(questions)
+
+    lexical = await asyncio.gather(*(lexical_hits(q) for q in questions))
+    hits = list(await asyncio.gather(*(confident_lexical_hits(q, lex) for q, lex in zip(questions, lexical))))
+
+    fast = [i for i, h in enumerate(hits) if h is not None]
+    cached = await asyncio.gather(
+        *(answer_cache.lookup_lexical(question=questions[i], language=request.language, hits=lexical[i]) for i in fast)
+    )
+    for i, entry in zip(fast, cached):
+        if entry:
+            items[i].answer, items[i].sources = entry.answer, entry.sources
+
+    pending = [i for i, h in enumerate(hits) if h is None]
+    if pending:
+        try:
+            for i, vec in zip(pending, await embed_queries_async([questions[i] for i in pending])):
+                embeddings[i] = vec
+        except Exception:
+            logger.exception("Batch embedding failed for %d questions", len(pending))
+            CHAT_ERRORS.labels("batch", "embed").inc(len(pending))
+            for i in pending:
+                items[i].error = "embedding failed"
+            pending = []
+
+    cached = await asyncio.gather(
+        *(answer_cache.lookup(embedding=embeddings[i], language=request.language) for i in pending)
+    )
+    for i, entry in zip(pending, cached):
+        if entry:
+            items[i].answer, items[i].sources = entry.answer, entry.sources
+    pending = [i for i, entry in zip(pending, cached) if not entry]
+
+    if pending:
+        try:
+            found = await vector_hits_many([embeddings[i] for i in pending], [lexical[i] for i in pending])
+            for i, h in zip(pending, found):
+                hits[i] = h
+        except Exception:
+            logger.exception("Batch vector search failed for %d questions", len(pending))
+            CHAT_ERRORS.labels("batch", "retrieve").inc(len(pending))
+            for i in pending:
+                items[i].error = "retrieval failed"
+
+    semaphore = asyncio.Semaphore(max(1, settings.CHAT_BATCH_CONCURRENCY))
+
+    async def answer(i: int) -> None:
+        item = items[i]
+        chunks = hits[i][:settings.MAX_CONTEXT_CHUNKS]
+        prompt, chunks = build_rag_prompt(question=item.question, chunks=chunks, language=request.language)
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                item.answer = await generate_answer_async(prompt=prompt)
+            except Exception:
+                logger.exception("Batch answer generation failed")
+                CHAT_ERRORS.labels("batch", "generate").inc()
+                item.error = "answer generation failed"
+                return
+        item.sources = build_sources(chunks)
+        await _store_answer(
+            question=item.question,
+            embedding=embeddings[i],
+            language=request.language,
+            answer=item.answer,
+            sources=item.sources,
+            hits=chunks,
+            lexical=lexical[i],
+            gen_ms=(time.perf_counter() - started) * 1000,
+        )
+
+    await asyncio.gather(*(
+        answer(i) for i, item in enumerate(items) if item.answer is None and item.error is None
+    ))
+    results = [items[position[normalize_question(q)]].model_copy(update={"question": q}) for q in request.questions]
+    return BatchChatResponse(results=results)
+
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/stream")
+async def chat_stream(request: ChatRequest, _: str = Depends(verify_api_key)):
+    async def events():
+        # Headers and a `status` event go out before retrieval starts; sources
+        # follow once it is done, then answer tokens. If the client
+        # disconnects, Starlette cancels this generator, which closes the
+        # upstream provider stream.
+        yield _sse("status", {"stage": "retrieving"})
+        try:
+            lexical = await lexical_hits(request.question)
+            hits = await confident_lexical_hits(request.question, lexical)
+            q_emb = None
+            if hits is None:
+                q_emb = await embed_query_async(request.question)
+                cached = await answer_cache.lookup(embedding=q_emb, language=request.language)
+            else:
+                cached = await answer_cache.lookup_lexical(question=request.question, language=request.language, hits=lexical)
+            if not cached:
+                if hits is None:
+                    hits = await vector_hits(q_emb, lexical)
+                hits = hits[:settings.MAX_CONTEXT_CHUNKS]
+                prompt, hits = build_rag_prompt(question=request.question, chunks=hits, language=request.language)
+                sources = build_sources(hits)
+        except Exception:
+            logger.exception("Retrieval failed for streamed chat")
+            CHAT_ERRORS.labels("stream", "retrieve").inc()
+            yield _sse("error", {"detail": "retrieval failed"})
+            return
+
+        if cached:
+            yield _sse("sources", {"sources": cached.sources})
+            yield _sse("token", {"text": cached.answer})
+            yield _sse("done", {})
+            return
+
+        yield _sse("sources", {"sources": sources})
+        started = time.perf_counter()
+        parts: list[str] = []
+        try:
+            async for delta in stream_answer(prompt=prompt):
+                parts.append(delta)
+                yield _sse("token", {"text": delta})
+        except Exception:
+            logger.exception("Answer generation failed for streamed chat")
+            CHAT_ERRORS.labels("stream", "generate").inc()
+            yield _sse("error", {"detail": "answer generation failed"})
+            return
+        yield _sse("done", {})
+
+        await _store_answer(
+            question=request.question,
+            embedding=q_emb,
+            language=request.language,
+            answer="".join(parts).strip(),
+            sources=sources,
+            hits=hits,
+            lexical=lexical,
+            gen_ms=(time.perf_counter() - started) * 1000,
+        )
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -6,7 +6,7 @@ from celery.result import AsyncResult
 from app.api.deps import verify_api_key
 from app.db.session import SessionLocal
 from app.db import crud
-from app.tasks.ingest import ingest_wordpress
+from app.tasks.ingest import backfill_lexical_index, ingest_wordpress
 
 router = APIRouter(prefix="/v1/ingest", tags=["ingest"])
 
@@ -35,6 +35,12 @@ def run_ingest(
         db.close()
 
 
+@router.post("/lexical-backfill", response_model=IngestResponse)
+def run_lexical_backfill(_: str = Depends(verify_api_key)):
+    task = backfill_lexical_index.delay()
+    return IngestResponse(job_id=task.id)
+
+
 @router.get("/jobs/{job_id}", response_model=JobStatusResponse)
 def job_status(job_id: str, _: str = Depends(verify_api_key)):
     db = SessionLocal()
@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Depends
+
+from app.api.deps import verify_api_key
+from app.core.http import http_pool_stats
+from app.rag.answer_cache import cache_stats
+from app.rag.chroma_store import get_store
+from app.rag.prompt import context_stats
+from app.rag.query_embeddings import query_cache_stats
+from app.rag.retrieval import retrieval_stats
+from app.rag.singleflight import chat_flights
+from app.rag.vector_store import get_vector_store
+
+router = APIRouter(prefix="/v1/stats", tags=["stats"])
+
+
+@router.get("/http")
+def http_stats(_: str = Depends(verify_api_key)):
+    return http_pool_stats()
+
+
+@router.get("/chroma")
+def chroma_stats(_: str = Depends(verify_api_key)):
+    return get_store().stats()
+
+
+@router.get("/vector-store")
+def vector_store_stats(_: str = Depends(verify_api_key)):
+    return get_vector_store().stats()
+
+
+@router.get("/answer-cache")
+async def answer_cache_stats(_: str = Depends(verify_api_key)):
+    return await cache_stats()
+
+
+@router.get("/query-embeddings")
+def query_embedding_stats(_: str = Depends(verify_api_key)):
+    return query_cache_stats()
+
+
+@router.get("/retrieval")
+def retrieval_path_stats(_: str = Depends(verify_api_key)):
+    return retrieval_stats()
+
+
+@router.get("/context")
+def context_packing_stats(_: str = Depends(verify_api_key)):
+    return context_stats()
+
+
+@router.get("/coalescing")
+def coalescing_stats(_: str = Depends(verify_api_key)):
+    return chat_flights.stats()
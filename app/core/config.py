@@ -14,8 +14,22 @@ class Settings(BaseSettings):
     WP_POSTS_PATH: str = "/wp-json/wp/v2/posts"
     WP_PER_PAGE: int = 100
     WP_MAX_POSTS: int = 0  # 0 means unlimited
+    WP_FETCH_CONCURRENCY: int = 4
     WP_USERNAME: str | None = None
     WP_APP_PASSWORD: str | None = None
+    HTML_EXTRACTOR: str = "stream"  # stream|soup
+
+    # Outbound HTTP (shared keep-alive pools per upstream host)
+    HTTP2_ENABLED: bool = True
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0
+    HTTP_CONNECT_TIMEOUT: float = 10.0
+    HTTP_TIMEOUT: float = 60.0
+    LLM_TIMEOUT: float = 90.0
+
+    # Metrics (the API serves /metrics; Celery workers only when a port is set)
+    METRICS_WORKER_PORT: int = 0
 
     # DB
     DATABASE_URL: str
@@ -24,31 +38,95 @@ class Settings(BaseSettings):
     REDIS_URL: str
     CELERY_BROKER_URL: str
     CELERY_RESULT_BACKEND: str
+    REDIS_SOCKET_TIMEOUT: float = 2.0
 
     # Chroma
     CHROMA_HOST: str = "chroma"
     CHROMA_PORT: int = 8000
     CHROMA_COLLECTION: str = "wp_posts"
 
+    # Vector store backend
+    VECTOR_STORE: str = "chroma"                  # chroma|local
+    LOCAL_VECTOR_PATH: str = "data/vectors"
+    LOCAL_VECTOR_DTYPE: str = "float32"           # float32|float16 (half the memory, slower scoring)
+    LOCAL_VECTOR_COMPACT_RATIO: float = 0.25      # compact once this share of rows is deleted
+    LOCAL_VECTOR_QUANTIZATION: str = "none"       # none|int8|binary: scan a compressed copy, re-rank in full precision
+    LOCAL_VECTOR_OVERSAMPLE: int = 4              # candidates re-ranked per result (binary needs ~16)
+
     # RAG tuning
-    CHUNK_SIZE: int = 1200
-    CHUNK_OVERLAP: int = 180
+    CHUNK_STRATEGY: str = "tokens"    # tokens|chars
+    CHUNK_MAX_TOKENS: int = 400
+    CHUNK_OVERLAP_TOKENS: int = 60
+    CHUNK_SIZE: int = 1200            # chars strategy only
+    CHUNK_OVERLAP: int = 180          # chars strategy only
     TOP_K: int = 6
     MAX_CONTEXT_CHUNKS: int = 6
+    CHAT_BATCH_MAX_QUESTIONS: int = 100
+    CHAT_BATCH_CONCURRENCY: int = 8   # LLM calls in flight per /v1/chat/batch request
+    CONTEXT_MAX_TOKENS: int = 3000    # prompt context budget (one header per post, overlap removed); 0 = no limit
+
+    # Retrieval (hybrid adds a BM25 index kept in step with the vector store)
+    RETRIEVAL_MODE: str = "hybrid"                  # vector|hybrid
+    LEXICAL_INDEX_PATH: str = "data/lexical.sqlite3"
+    HYBRID_RRF_K: int = 60                          # reciprocal rank fusion constant
+    LEXICAL_FAST_PATH_MIN_CONFIDENCE: float = 0.6   # answer from BM25 alone, no embedding call; >1 disables
+
+    # Query embedding memoization (in-process LRU + Redis)
+    QUERY_EMBED_CACHE_MAX_SIZE: int = 10000
+    QUERY_EMBED_CACHE_TTL_SECONDS: int = 86400
+
+    # Coalescing of identical in-flight /v1/chat questions (in-process + Redis lock/pub-sub)
+    CHAT_COALESCE_ENABLED: bool = True
+    CHAT_COALESCE_WAIT_SECONDS: float = 0.0        # followers run the question themselves after this; 0 = LLM_TIMEOUT + 30
+    CHAT_COALESCE_LOCK_TTL_SECONDS: float = 10.0   # refreshed while the leader runs; a dead leader is noticed within this
+    CHAT_COALESCE_RESULT_TTL_SECONDS: float = 5.0  # finished result kept for late arrivals
+
+    # Semantic answer cache (Redis)
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_MIN_SIMILARITY: float = 0.95
+    ANSWER_CACHE_TTL_SECONDS: int = 86400
 
     # Providers
     EMBEDDING_PROVIDER: str = "openai"  # openai|gemini
     LLM_PROVIDER: str = "openai"        # openai|gemini
+    EMBEDDING_DIMENSIONS: int = 0       # 0 means the model's default size
+
+    # Embedding cache
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: str = "data/embedding_cache.sqlite3"
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 500000
+
+    # Embedding batching across posts during ingest
+    EMBED_BATCH_MAX_ITEMS: int = 256
+    EMBED_BATCH_MAX_TOKENS: int = 100000
+    EMBED_BATCH_MAX_WAIT_MS: int = 500
+
+    # Ingest pipeline (workers per stage, bounded queue between stages)
+    INGEST_QUEUE_SIZE: int = 64
+    INGEST_PARSE_WORKERS: int = 2
+    INGEST_EMBED_WORKERS: int = 2
+    INGEST_VECTOR_WORKERS: int = 2
+    INGEST_DB_WORKERS: int = 1
+    INGEST_DB_BATCH_SIZE: int = 500
+
+    # Ingest fan-out across Celery workers
+    INGEST_MAX_PARALLEL: int = 4      # concurrent subtasks; 1 disables fan-out
+    INGEST_PAGES_PER_TASK: int = 5
 
     # OpenAI
     OPENAI_API_KEY: str | None = None
+    OPENAI_BASE_URL: str = "https://api.openai.com/v1"
     OPENAI_EMBEDDING_MODEL: str = "text-embedding-3-small"
     OPENAI_RESPONSES_MODEL: str = "gpt-5-mini"
 
     # Gemini
     GEMINI_API_KEY: str | None = None
+    GEMINI_BASE_URL: str = "https://generativelanguage.googleapis.com/v1beta"
     GEMINI_EMBEDDING_MODEL: str = "gemini-embedding-001"
     GEMINI_GENERATE_MODEL: str = "gemini-2.5-flash"
+    GEMINI_EMBED_BATCH_SIZE: int = 100          # batchEmbedContents accepts at most 100 requests
+    GEMINI_EMBED_BATCH_MAX_TOKENS: int = 20000
+    GEMINI_EMBED_CONCURRENCY: int = 4
 
 
 settings = Settings()
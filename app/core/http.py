@@ -0,0 +1,161 @@
+import threading
+import weakref
+from typing import Awaitable, Callable
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import UPSTREAM_RESPONSES
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:  # httpx[http2] extra not installed
+    HTTP2_AVAILABLE = False
+
+
+class _PoolStats:
+    def __init__(self, upstream: str) -> None:
+        self.upstream = upstream
+        self.requests = 0
+        self.connections_opened = 0
+        self.seen: weakref.WeakSet = weakref.WeakSet()
+
+
+_clients: dict[str, httpx.Client] = {}
+_async_clients: dict[str, httpx.AsyncClient] = {}
+_stats: dict[str, _PoolStats] = {}
+_lock = threading.Lock()
+
+
+def _origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _upstream(origin: str) -> str:
+    """Metrics label: the provider name for the configured APIs, else the host."""
+    for name, url in (("openai", settings.OPENAI_BASE_URL), ("gemini", settings.GEMINI_BASE_URL), ("wordpress", settings.WP_BASE_URL)):
+        if _origin(url) == origin:
+            return name
+    return urlsplit(origin).netloc
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(settings.HTTP_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT)
+
+
+def _pool_connections(client: httpx.Client | httpx.AsyncClient) -> list:
+    pool = getattr(client._transport, "_pool", None)
+    return list(getattr(pool, "connections", []) or [])
+
+
+def _track(origin: str, client_ref: weakref.ref) -> Callable[[httpx.Response], None]:
+    stats = _stats[origin]
+
+    def on_response(response: httpx.Response) -> None:
+        stats.requests += 1
+        UPSTREAM_RESPONSES.labels(stats.upstream, str(response.status_code)).inc()
+        client = client_ref()
+        if client is None:
+            return
+        for conn in _pool_connections(client):
+            if conn not in stats.seen:
+                stats.seen.add(conn)
+                stats.connections_opened += 1
+
+    return on_response
+
+
+def _track_async(origin: str, client_ref: weakref.ref) -> Callable[[httpx.Response], Awaitable[None]]:
+    on_response = _track(origin, client_ref)
+
+    async def on_response_async(response: httpx.Response) -> None:
+        on_response(response)
+
+    return on_response_async
+
+
+def get_http_client(url: str) -> httpx.Client:
+    """Process-wide keep-alive client for the upstream host of `url`."""
+    origin = _origin(url)
+    client = _clients.get(origin)
+    if client is not None and not client.is_closed:
+        return client
+
+    with _lock:
+        client = _clients.get(origin)
+        if client is None or client.is_closed:
+            _stats.setdefault(origin, _PoolStats(_upstream(origin)))
+            client = httpx.Client(
+                http2=settings.HTTP2_ENABLED and HTTP2_AVAILABLE,
+                limits=_limits(),
+                timeout=_timeout(),
+            )
+            client.event_hooks["response"] = [_track(origin, weakref.ref(client))]
+            _clients[origin] = client
+    return client
+
+
+def get_async_http_client(url: str) -> httpx.AsyncClient:
+    """Async counterpart of get_http_client, for the FastAPI event loop."""
+    origin = _origin(url)
+    client = _async_clients.get(origin)
+    if client is not None and not client.is_closed:
+        return client
+
+    with _lock:
+        client = _async_clients.get(origin)
+        if client is None or client.is_closed:
+            _stats.setdefault(origin, _PoolStats(_upstream(origin)))
+            client = httpx.AsyncClient(
+                http2=settings.HTTP2_ENABLED and HTTP2_AVAILABLE,
+                limits=_limits(),
+                timeout=_timeout(),
+            )
+            client.event_hooks["response"] = [_track_async(origin, weakref.ref(client))]
+            _async_clients[origin] = client
+    return client
+
+
+def close_http_clients() -> None:
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+async def aclose_http_clients() -> None:
+    with _lock:
+        clients = list(_async_clients.values())
+        _async_clients.clear()
+    for client in clients:
+        await client.aclose()
+
+
+def http_pool_stats() -> dict[str, dict]:
+    out: dict[str, dict] = {}
+    for origin, stats in _stats.items():
+        conns = []
+        for client in (_clients.get(origin), _async_clients.get(origin)):
+            if client is not None:
+                conns.extend(_pool_connections(client))
+        idle = sum(1 for c in conns if c.is_idle())
+        out[origin] = {
+            "requests": stats.requests,
+            "connections_opened": stats.connections_opened,
+            "handshakes_avoided": max(0, stats.requests - stats.connections_opened),
+            "active_connections": len(conns) - idle,
+            "idle_connections": idle,
+            "http2": settings.HTTP2_ENABLED and HTTP2_AVAILABLE,
+        }
+    return out
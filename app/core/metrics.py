@@ -0,0 +1,101 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+
+CHAT_STAGES = ("embed", "cache", "retrieve", "prompt", "generate", "total")
+
+CHAT_STAGE_SECONDS = Histogram(
+    "rag_chat_stage_seconds",
+    "Time spent in each stage of a /v1/chat request",
+    ["stage"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+UPSTREAM_RESPONSES = Counter(
+    "rag_upstream_responses",
+    "HTTP responses from upstream services (openai, gemini, wordpress) by status code",
+    ["upstream", "status"],
+)
+PROVIDER_TOKENS = Counter(
+    "rag_provider_tokens",
+    "Tokens billed by the embedding/LLM providers, as reported in their usage fields",
+    ["provider", "operation", "kind"],
+)
+CHAT_ERRORS = Counter(
+    "rag_chat_errors",
+    "Failed steps of /v1/chat/batch and /v1/chat/stream requests (one per affected question)",
+    ["endpoint", "stage"],
+)
+INGEST_POSTS = Counter("rag_ingest_posts", "Posts seen by ingest runs", ["outcome"])
+INGEST_CHUNKS = Counter("rag_ingest_chunks", "Chunks handled by ingest runs", ["outcome"])
+INGEST_EMBEDDING_REQUESTS = Counter("rag_ingest_embedding_requests", "Embedding batches sent by ingest runs")
+
+# label children bound once; .labels() does a dict lookup under a lock on every call
+_STAGE = {stage: CHAT_STAGE_SECONDS.labels(stage) for stage in CHAT_STAGES}
+
+# ingest pipeline counter names -> metric
+INGEST_COUNTERS = {
+    "fetched": INGEST_POSTS.labels("fetched"),
+    "skipped": INGEST_POSTS.labels("skipped"),
+    "processed": INGEST_POSTS.labels("processed"),
+    "chunks_added": INGEST_CHUNKS.labels("embedded"),
+    "chunks_unchanged": INGEST_CHUNKS.labels("unchanged"),
+    "chunks_removed": INGEST_CHUNKS.labels("removed"),
+    "embedding_requests": INGEST_EMBEDDING_REQUESTS,
+}
+
+
+class StageTimer:
+    """
+    Stage durations of one request: observed into rag_chat_stage_seconds and
+    rendered as a Server-Timing header by finish(). A request answered by a
+    coalesced execution only gets `total`.
+    """
+
+    __slots__ = ("started", "stages")
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.stages: dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def finish(self) -> str:
+        """Records the durations and returns the Server-Timing header value."""
+        coalesced = not self.stages
+        self.stages["total"] = time.perf_counter() - self.started
+        for name, seconds in self.stages.items():
+            _STAGE[name].observe(seconds)
+        header = ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items())
+        return "coalesced, " + header if coalesced else header
+
+
+def record_tokens(provider: str, operation: str, input_tokens: int = 0, output_tokens: int = 0) -> None:
+    if input_tokens:
+        PROVIDER_TOKENS.labels(provider, operation, "input").inc(input_tokens)
+    if output_tokens:
+        PROVIDER_TOKENS.labels(provider, operation, "output").inc(output_tokens)
+
+
+def metrics_registry() -> CollectorRegistry:
+    """
+    The default registry, or with PROMETHEUS_MULTIPROC_DIR set (several
+    uvicorn workers, prefork Celery) one that merges every process's files.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render_metrics() -> bytes:
+    return generate_latest(metrics_registry())
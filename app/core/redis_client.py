@@ -0,0 +1,28 @@
+import redis
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+
+_client: redis.Redis | None = None
+_async_client: aioredis.Redis | None = None
+
+
+def get_redis() -> redis.Redis:
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL, socket_timeout=settings.REDIS_SOCKET_TIMEOUT)
+    return _client
+
+
+def get_async_redis() -> aioredis.Redis:
+    global _async_client
+    if _async_client is None:
+        _async_client = aioredis.Redis.from_url(settings.REDIS_URL, socket_timeout=settings.REDIS_SOCKET_TIMEOUT)
+    return _async_client
+
+
+async def aclose_redis() -> None:
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
@@ -68,6 +68,50 @@ def should_reprocess_post(db: Session, wp_post_id: int, modified_gmt: str | None
     return True
 
 
+def get_modified_gmt_map(db: Session, wp_post_ids: list[int]) -> dict[int, str | None]:
+    """{wp_post_id: modified_gmt} of the given posts that already exist, in one query."""
+    if not wp_post_ids:
+        return {}
+    rows = db.execute(select(Post.wp_post_id, Post.modified_gmt).where(Post.wp_post_id.in_(wp_post_ids)))
+    return {wp_post_id: modified_gmt for wp_post_id, modified_gmt in rows}
+
+
+_UPSERT_COLUMNS = ("slug", "url", "title", "modified_gmt", "status", "last_ingested_at")
+
+
+def bulk_upsert_posts(db: Session, rows: list[dict]) -> int:
+    """
+    Insert or update many posts (upsert_post keyword dicts) with one
+    INSERT ... ON CONFLICT (wp_post_id) DO UPDATE and a single commit.
+    """
+    if not rows:
+        return 0
+
+    now = datetime.now(timezone.utc)
+    # last write wins when a post appears twice in one batch (ON CONFLICT can't touch a row twice)
+    values = list({r["wp_post_id"]: {**r, "last_ingested_at": now} for r in rows}.values())
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        for r in values:
+            upsert_post(db, **{k: v for k, v in r.items() if k != "last_ingested_at"})
+        return len(values)
+
+    # 7 bind params per row; stay well under Postgres' 65535 limit
+    for start in range(0, len(values), 1000):
+        stmt = insert(Post).values(values[start:start + 1000])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Post.wp_post_id],
+            set_={**{c: stmt.excluded[c] for c in _UPSERT_COLUMNS}, "updated_at": func.now()},
+        )
+        db.execute(stmt)
+    db.commit()
+    return len(values)
+
 
 def create_ingest_job(db: Session, celery_task_id: str) -> IngestJob:
     job = IngestJob(celery_task_id=celery_task_id, status="queued")
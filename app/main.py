@@ -1,13 +1,29 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST
 from app.core.config import settings
+from app.core.http import aclose_http_clients, close_http_clients
+from app.core.metrics import render_metrics
+from app.core.redis_client import aclose_redis
 from app.db.session import engine
 from app.db.models import Base
 from app.api.routes_ingest import router as ingest_router
 from app.api.routes_posts import router as posts_router
 from app.api.routes_chat import router as chat_router
+from app.api.routes_stats import router as stats_router
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await aclose_http_clients()
+    close_http_clients()
+    await aclose_redis()
 
-app = FastAPI(title=settings.APP_NAME)
+
+app = FastAPI(title=settings.APP_NAME, lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -25,8 +41,15 @@ Base.metadata.create_all(bind=engine)
 app.include_router(ingest_router)
 app.include_router(posts_router)
 app.include_router(chat_router)
+app.include_router(stats_router)
 
 
 @app.get("/health")
 def health():
     return {"ok": True}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    # Prometheus scrape endpoint; like /health it takes no API key
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
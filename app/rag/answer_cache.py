@@ -0,0 +1,449 @@
+import hashlib
+import json
+import time
+import uuid
+from dataclasses import dataclass
+
+import numpy as np
+import redis
+
+from app.core.config import settings
+from app.core.redis_client import get_async_redis, get_redis
+from app.rag.query_embeddings import normalize_question
+
+PREFIX = "answer_cache"
+STATS_KEY = f"{PREFIX}:stats"
+# post id -> modified_gmt of the version currently indexed, written by ingest
+MODIFIED_KEY = f"{PREFIX}:modified"
+
+# Every change to a language's entries bumps its version and appends
+# "<version> +|- <entry ids>" to its log, so other processes can replay the
+# changes instead of re-reading the whole set.
+_BUMP = (
+    "local v = redis.call('incr', KEYS[1]) "
+    "redis.call('rpush', KEYS[2], v .. ' ' .. ARGV[1]) "
+    "redis.call('ltrim', KEYS[2], -tonumber(ARGV[2]), -1) "
+    "return v"
+)
+_LOG_MAX = 1000
+
+
+def _entry_key(entry_id: str) -> str:
+    return f"{PREFIX}:entry:{entry_id}"
+
+
+def _lang_key(language: str) -> str:
+    return f"{PREFIX}:lang:{language.strip().lower()}"
+
+
+def _post_key(post_id: str) -> str:
+    return f"{PREFIX}:post:{post_id}"
+
+
+def _version_key(language: str) -> str:
+    return f"{PREFIX}:version:{language.strip().lower()}"
+
+
+def _log_key(language: str) -> str:
+    return f"{PREFIX}:log:{language.strip().lower()}"
+
+
+def _bump(pipe, language: str, op: str, entry_ids: list[str]) -> None:
+    pipe.eval(_BUMP, 2, _version_key(language), _log_key(language), " ".join([op, *entry_ids]), _LOG_MAX)
+
+
+def _modified(value: str | None) -> str:
+    return (value or "")[:64]  # as in vector_store.chunk_metadata
+
+
+@dataclass
+class CachedAnswer:
+    answer: str
+    sources: list[dict]
+    similarity: float
+
+
+class _LanguageIndex:
+    """
+    In-process copy of one language's normalized question embeddings of one
+    size. Rows are appended into spare capacity, so picking up new entries
+    does not copy the whole matrix; only removals rebuild it.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.version: int | None = None
+        self.ids: list[str] = []
+        self.other: set[str] = set()  # entries embedded with another model/size
+        self._positions: dict[str, int] = {}
+        self._buffer = np.zeros((0, dim), dtype=np.float32)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._buffer[:len(self.ids)]
+
+    def __contains__(self, entry_id: str) -> bool:
+        return entry_id in self._positions or entry_id in self.other
+
+    def append(self, entry_id: str, row: np.ndarray) -> None:
+        if entry_id in self._positions:
+            return
+        n = len(self.ids)
+        if n == self._buffer.shape[0]:
+            grown = np.zeros((max(64, 2 * n), self.dim), dtype=np.float32)
+            grown[:n] = self._buffer[:n]
+            self._buffer = grown
+        self._buffer[n] = row
+        self._positions[entry_id] = n
+        self.ids.append(entry_id)
+
+    def retain(self, members: set[str]) -> None:
+        self.other &= members
+        self._keep([i for i, entry_id in enumerate(self.ids) if entry_id in members])
+
+    def discard(self, entry_ids: set[str]) -> None:
+        self.other -= entry_ids
+        self._keep([i for i, entry_id in enumerate(self.ids) if entry_id not in entry_ids])
+
+    def _keep(self, keep: list[int]) -> None:
+        if len(keep) == len(self.ids):
+            return
+        self._buffer = self._buffer[keep]
+        self.ids = [self.ids[i] for i in keep]
+        self._positions = {entry_id: i for i, entry_id in enumerate(self.ids)}
+
+
+_indexes: dict[tuple[str, int], _LanguageIndex] = {}
+
+
+def _normalize(vec: list[float] | np.ndarray) -> np.ndarray:
+    arr = np.asarray(vec, dtype=np.float32)
+    norm = float(np.linalg.norm(arr))
+    return arr / norm if norm else arr
+
+
+async def _sync_index(r, language: str, dim: int) -> _LanguageIndex:
+    # An unchanged version costs one GET; otherwise the changes since this
+    # process last looked are replayed from the log, and only when it no
+    # longer reaches back that far is the whole member set re-read.
+    lang_key = _lang_key(language)
+    index = _indexes.get((lang_key, dim))
+    if index is None:
+        index = _indexes[(lang_key, dim)] = _LanguageIndex(dim)
+    version = int(await r.get(_version_key(language)) or 0)
+    if index.version == version:
+        return index
+
+    changes = None
+    if index.version is not None and 0 < version - index.version <= _LOG_MAX:
+        changes = await _changes(r, language, index.version, version)
+    if changes is None:
+        members = {i.decode() for i in await r.smembers(lang_key)}
+        index.retain(members)
+        new_ids = [i for i in members if i not in index]
+    else:
+        added, removed = changes
+        index.discard(removed)
+        new_ids = [i for i in added if i not in index and i not in removed]
+    index.version = version
+    await _load(r, language, index, new_ids)
+    return index
+
+
+async def _changes(r, language: str, since: int, version: int) -> tuple[list[str], set[str]] | None:
+    """Entries added and removed between versions `since` and `version`; None when the log doesn't cover them."""
+    log = await r.lrange(_log_key(language), since - version, -1)
+    added: list[str] = []
+    removed: set[str] = set()
+    expected = since + 1
+    for line in log:
+        v, op, *entry_ids = line.decode().split(" ")
+        if int(v) != expected:
+            return None  # trimmed, lost, or moved on since the GET
+        expected += 1
+        if op == "+":
+            added.extend(entry_ids)
+        else:
+            removed.update(entry_ids)
+    if expected != version + 1:
+        return None
+    return added, removed
+
+
+async def _load(r, language: str, index: _LanguageIndex, new_ids: list[str]) -> None:
+    if not new_ids:
+        return
+    pipe = r.pipeline()
+    for entry_id in new_ids:
+        pipe.hget(_entry_key(entry_id), "embedding")
+    blobs = await pipe.execute()
+
+    expired: list[str] = []
+    for entry_id, blob in zip(new_ids, blobs):
+        if blob is None:
+            expired.append(entry_id)
+            continue
+        row = np.frombuffer(blob, dtype=np.float32)
+        if row.shape[0] == index.dim:
+            index.append(entry_id, row)
+        else:
+            index.other.add(entry_id)
+    if expired:
+        await _remove(r, language, expired)
+
+
+async def _remove(r, language: str, entry_ids: list[str]) -> None:
+    pipe = r.pipeline()
+    pipe.delete(*(_entry_key(i) for i in entry_ids))
+    pipe.srem(_lang_key(language), *entry_ids)
+    _bump(pipe, language, "-", entry_ids)
+    await pipe.execute()
+
+
+async def _is_stale(r, posts_blob: bytes | str | None) -> bool:
+    """True when a post the answer cited was re-indexed after the chunks it was built from were retrieved."""
+    posts: dict[str, str] = json.loads(posts_blob) if posts_blob else {}
+    if not posts:
+        return False
+    current = await r.hmget(MODIFIED_KEY, *posts)
+    return any(now is not None and now.decode() != posts[post_id] for post_id, now in zip(posts, current))
+
+
+def _best(index: _LanguageIndex, q: np.ndarray) -> tuple[str, float] | None:
+    if not index.ids:
+        return None
+    sims = index.matrix @ q
+    best = int(np.argmax(sims))
+    return index.ids[best], float(sims[best])
+
+
+async def _miss(r) -> None:
+    await r.hincrby(STATS_KEY, "misses", 1)
+
+
+async def _entry(r, entry_id: str, language: str, similarity: float | None) -> CachedAnswer | None:
+    """The entry if it still exists and is fresh; `similarity` is None for lexical entries (not in the language index)."""
+    entry = await r.hmget(_entry_key(entry_id), "answer", "sources", "gen_ms", "posts")
+    if entry[0] is None or await _is_stale(r, entry[3]):
+        # Expired since this process loaded it, or stored by a request that
+        # retrieved its chunks before ingest re-indexed one of the posts
+        if similarity is None:
+            await r.delete(_entry_key(entry_id))
+        else:
+            await _remove(r, language, [entry_id])
+        await _miss(r)
+        return None
+
+    pipe = r.pipeline()
+    pipe.hincrby(STATS_KEY, "hits", 1)
+    pipe.hincrbyfloat(STATS_KEY, "saved_ms", float(entry[2] or 0))
+    await pipe.execute()
+    return CachedAnswer(answer=entry[0].decode(), sources=json.loads(entry[1]), similarity=1.0 if similarity is None else similarity)
+
+
+async def lookup(*, embedding: list[float], language: str) -> CachedAnswer | None:
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+    r = get_async_redis()
+    try:
+        q = _normalize(embedding)
+        best = _best(await _sync_index(r, language, q.shape[0]), q)
+        if best is None or best[1] < settings.ANSWER_CACHE_MIN_SIMILARITY:
+            await _miss(r)
+            return None
+        return await _entry(r, best[0], language, best[1])
+    except (redis.RedisError, OSError) as e:
+        print(f"Answer cache lookup failed: {e}")
+        return None
+
+
+def _lexical_entry_id(question: str, language: str, hits: list[dict]) -> str:
+    # Lexical fast-path answers are not embedded, so they are keyed on the exact
+    # question and the chunks it retrieved rather than found by similarity
+    key = "\x1f".join([language.strip().lower(), normalize_question(question), *(h["id"] for h in hits)])
+    return "lexical-" + hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+async def lookup_lexical(*, question: str, language: str, hits: list[dict]) -> CachedAnswer | None:
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+    r = get_async_redis()
+    try:
+        return await _entry(r, _lexical_entry_id(question, language, hits), language, None)
+    except (redis.RedisError, OSError) as e:
+        print(f"Answer cache lookup failed: {e}")
+        return None
+
+
+def _cited_posts(hits: list[dict]) -> dict[str, str]:
+    posts: dict[str, str] = {}
+    for h in hits:
+        meta = h.get("meta", {}) or {}
+        if meta.get("post_id"):
+            posts[str(meta["post_id"])] = _modified(meta.get("modified_gmt"))
+    return posts
+
+
+async def _store(
+    r,
+    entry_id: str,
+    *,
+    question: str,
+    language: str,
+    answer: str,
+    sources: list[dict],
+    posts: dict[str, str],
+    gen_ms: float,
+    embedding: np.ndarray | None,
+) -> int | None:
+    """Writes the entry; returns the language's new version when it joined the language index."""
+    ttl = settings.ANSWER_CACHE_TTL_SECONDS
+    mapping = {
+        "question": question,
+        "language": language,
+        "answer": answer,
+        "sources": json.dumps(sources, ensure_ascii=False),
+        "posts": json.dumps(posts),
+        "gen_ms": round(gen_ms, 3),
+        "created_at": time.time(),
+    }
+    if embedding is not None:
+        mapping["embedding"] = embedding.tobytes()
+
+    pipe = r.pipeline()
+    if embedding is not None:
+        _bump(pipe, language, "+", [entry_id])
+    pipe.hset(_entry_key(entry_id), mapping=mapping)
+    pipe.expire(_entry_key(entry_id), ttl)
+    if embedding is not None:
+        pipe.sadd(_lang_key(language), entry_id)
+    for post_id in posts:
+        pipe.sadd(_post_key(post_id), entry_id)
+        pipe.expire(_post_key(post_id), ttl)
+    results = await pipe.execute()
+    return int(results[0]) if embedding is not None else None
+
+
+async def store(
+    *,
+    question: str,
+    embedding: list[float],
+    language: str,
+    answer: str,
+    sources: list[dict],
+    hits: list[dict],
+    gen_ms: float,
+) -> None:
+    if not settings.ANSWER_CACHE_ENABLED or not answer:
+        return
+    posts = _cited_posts(hits)
+    q = _normalize(embedding)
+    r = get_async_redis()
+    try:
+        if await _is_stale(r, json.dumps(posts)):
+            return
+        # Requests that missed together all store; one entry per question is enough
+        index = await _sync_index(r, language, q.shape[0])
+        best = _best(index, q)
+        if best is not None and best[1] >= settings.ANSWER_CACHE_MIN_SIMILARITY:
+            return
+        entry_id = uuid.uuid4().hex
+        version = await _store(
+            r, entry_id,
+            question=question, language=language, answer=answer, sources=sources, posts=posts, gen_ms=gen_ms, embedding=q,
+        )
+        if index.version == version - 1:
+            # nothing else changed in between; no need to read our own entry back
+            index.append(entry_id, q)
+            index.version = version
+    except (redis.RedisError, OSError) as e:
+        print(f"Answer cache store failed: {e}")
+
+
+async def store_lexical(
+    *,
+    question: str,
+    language: str,
+    answer: str,
+    sources: list[dict],
+    hits: list[dict],
+    gen_ms: float,
+) -> None:
+    if not settings.ANSWER_CACHE_ENABLED or not answer:
+        return
+    posts = _cited_posts(hits)
+    r = get_async_redis()
+    try:
+        if await _is_stale(r, json.dumps(posts)):
+            return
+        await _store(
+            r, _lexical_entry_id(question, language, hits),
+            question=question, language=language, answer=answer, sources=sources, posts=posts, gen_ms=gen_ms, embedding=None,
+        )
+    except (redis.RedisError, OSError) as e:
+        print(f"Answer cache store failed: {e}")
+
+
+def invalidate_posts(modified_gmt: dict[int | str, str | None]) -> int:
+    """
+    Drop every cached answer that cited one of these posts (post id ->
+    modified_gmt just indexed). Called from ingest after re-indexing; the
+    recorded modified_gmt also rejects answers stored afterwards by requests
+    that retrieved the old chunks.
+    """
+    if not settings.ANSWER_CACHE_ENABLED or not modified_gmt:
+        return 0
+    post_ids = [str(post_id) for post_id in modified_gmt]
+    r = get_redis()
+    try:
+        pipe = r.pipeline()
+        pipe.hset(MODIFIED_KEY, mapping={str(k): _modified(v) for k, v in modified_gmt.items()})
+        for post_id in post_ids:
+            pipe.smembers(_post_key(post_id))
+        entry_ids = list({i.decode() for members in pipe.execute()[1:] for i in members})
+        if not entry_ids:
+            return 0
+
+        pipe = r.pipeline()
+        for entry_id in entry_ids:
+            pipe.hget(_entry_key(entry_id), "language")
+        languages = pipe.execute()
+
+        by_language: dict[str, list[str]] = {}
+        pipe = r.pipeline()
+        for entry_id, language in zip(entry_ids, languages):
+            pipe.delete(_entry_key(entry_id))
+            if language is not None:
+                pipe.srem(_lang_key(language.decode()), entry_id)
+                by_language.setdefault(language.decode(), []).append(entry_id)
+        for language, ids in by_language.items():
+            _bump(pipe, language, "-", ids)
+        for post_id in post_ids:
+            pipe.delete(_post_key(post_id))
+        pipe.hincrby(STATS_KEY, "invalidated", len(entry_ids))
+        pipe.execute()
+        return len(entry_ids)
+    except (redis.RedisError, OSError) as e:
+        print(f"Answer cache invalidation failed: {e}")
+        return 0
+
+
+async def cache_stats() -> dict:
+    r = get_async_redis()
+    try:
+        raw = await r.hgetall(STATS_KEY)
+    except (redis.RedisError, OSError) as e:
+        print(f"Answer cache stats failed: {e}")
+        return {"enabled": settings.ANSWER_CACHE_ENABLED, "available": False}
+    stats = {k.decode(): float(v) for k, v in raw.items()}
+    hits = int(stats.get("hits", 0))
+    misses = int(stats.get("misses", 0))
+    return {
+        "enabled": settings.ANSWER_CACHE_ENABLED,
+        "available": True,
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        "latency_saved_ms": round(stats.get("saved_ms", 0.0), 3),
+        "invalidated": int(stats.get("invalidated", 0)),
+    }
@@ -1,55 +1,240 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Iterator, TypeVar
+
 import chromadb
+import httpx
+from chromadb.api.models.AsyncCollection import AsyncCollection
 from chromadb.api.models.Collection import Collection
+from chromadb.errors import InvalidCollectionException, NotFoundError
 
 from app.core.config import settings
+from app.core.latency import LatencyCounters
+from app.rag.vector_store import ChunkDiff, chunk_metadata, diff_chunks, stale_metadata
 
+T = TypeVar("T")
 
-def get_collection() -> Collection:
-    client = chromadb.HttpClient(host=settings.CHROMA_HOST, port=settings.CHROMA_PORT)
-    return client.get_or_create_collection(name=settings.CHROMA_COLLECTION)
-
-
-def upsert_post_chunks(
-    *,
-    post_id: int,
-    title: str | None,
-    url: str | None,
-    modified_gmt: str | None,
-    chunks: list[str],
-    embeddings: list[list[float]],
-) -> None:
-    col = get_collection()
-
-    col.delete(where={"post_id": str(post_id)})
-
-    ids = [f"{post_id}:{i}" for i in range(len(chunks))]
-    metadatas = [
-        {
-            "post_id": str(post_id),
-            "title": (title or "")[:500],
-            "url": (url or "")[:2000],
-            "modified_gmt": (modified_gmt or "")[:64],
-            "chunk_index": i,
-        }
-        for i in range(len(chunks))
-    ]
-
-    col.add(ids=ids, documents=chunks, embeddings=embeddings, metadatas=metadatas)
+# Errors after which the cached client/collection is dropped and the call retried once:
+# Chroma restarted (connection refused/reset) or the collection was recreated.
+_RECONNECT_ERRORS = (httpx.TransportError, ConnectionError, InvalidCollectionException, NotFoundError)
 
 
-def search_similar(*, query_embedding: list[float], top_k: int) -> list[dict]:
-    col = get_collection()
-    res = col.query(
-        query_embeddings=[query_embedding],
-        n_results=top_k,
-        include=["documents", "metadatas", "distances"],
-    )
-    docs = res.get("documents", [[]])[0]
-    metas = res.get("metadatas", [[]])[0]
-    dists = res.get("distances", [[]])[0]
-    ids = res.get("ids", [[]])[0]  # ids همیشه برگردانده میشه حتی اگر در include نباشه
+def reshape_query_result(res: dict, query_index: int = 0) -> list[dict]:
+    docs = (res.get("documents") or [[]])[query_index]
+    metas = (res.get("metadatas") or [[]])[query_index]
+    dists = (res.get("distances") or [[]])[query_index]
+    ids = (res.get("ids") or [[]])[query_index]  # ids همیشه برگردانده میشه حتی اگر در include نباشه
 
     out = []
     for i in range(len(docs)):
         out.append({"id": ids[i], "text": docs[i], "meta": metas[i], "distance": dists[i]})
     return out
+
+
+class ChromaStore:
+    """One Chroma client and collection handle per process, reconnected on demand."""
+
+    def __init__(self, *, host: str, port: int, collection_name: str):
+        self.host = host
+        self.port = port
+        self.collection_name = collection_name
+        self.latency = LatencyCounters()
+        self.reconnects = 0
+        self._lock = threading.Lock()
+        self._collection: Collection | None = None
+        self._async_lock: asyncio.Lock | None = None
+        self._async_collection: AsyncCollection | None = None
+
+    def collection(self) -> Collection:
+        col = self._collection
+        if col is not None:
+            return col
+        with self._lock:
+            if self._collection is None:
+                with self.latency.time("connect"):
+                    client = chromadb.HttpClient(host=self.host, port=self.port)
+                    self._collection = client.get_or_create_collection(name=self.collection_name)
+            return self._collection
+
+    async def async_collection(self) -> AsyncCollection:
+        col = self._async_collection
+        if col is not None:
+            return col
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        async with self._async_lock:
+            if self._async_collection is None:
+                with self.latency.time("connect"):
+                    client = await chromadb.AsyncHttpClient(host=self.host, port=self.port)
+                    self._async_collection = await client.get_or_create_collection(name=self.collection_name)
+            return self._async_collection
+
+    def reset(self) -> None:
+        with self._lock:
+            self._collection = None
+            self._async_collection = None
+
+    def _call(self, op: str, fn: Callable[[Collection], T]) -> T:
+        try:
+            with self.latency.time(op):
+                return fn(self.collection())
+        except _RECONNECT_ERRORS:
+            self.reset()
+            self.reconnects += 1
+            with self.latency.time(op):
+                return fn(self.collection())
+
+    async def _acall(self, op: str, fn: Callable[[AsyncCollection], Awaitable[T]]) -> T:
+        try:
+            with self.latency.time(op):
+                return await fn(await self.async_collection())
+        except _RECONNECT_ERRORS:
+            self.reset()
+            self.reconnects += 1
+            with self.latency.time(op):
+                return await fn(await self.async_collection())
+
+    def diff_post_chunks(self, *, post_id: int, chunks: list[str]) -> ChunkDiff:
+        res = self._call("get", lambda col: col.get(where={"post_id": str(post_id)}, include=["metadatas"]))
+        return diff_chunks(post_id, chunks, dict(zip(res.get("ids") or [], res.get("metadatas") or [])))
+
+    def apply_chunk_diff(
+        self,
+        diff: ChunkDiff,
+        *,
+        title: str | None,
+        url: str | None,
+        modified_gmt: str | None,
+        chunks: list[str],
+        embeddings: list[list[float]],
+    ) -> None:
+        """Delete removed chunks, add new ones (`embeddings` aligned with diff.added) and patch stale metadata of kept ones."""
+        if len(embeddings) != len(diff.added):
+            raise RuntimeError(f"Got {len(embeddings)} embeddings for {len(diff.added)} added chunks")
+
+        if diff.removed:
+            self._call("delete", lambda col: col.delete(ids=diff.removed))
+
+        if diff.added:
+            ids = [diff.ids[i] for i in diff.added]
+            documents = [chunks[i] for i in diff.added]
+            metadatas = [chunk_metadata(diff.post_id, title, url, modified_gmt, i) for i in diff.added]
+            self._call("add", lambda col: col.add(ids=ids, documents=documents, embeddings=embeddings, metadatas=metadatas))
+
+        stale_ids, stale_metadatas = stale_metadata(diff, title=title, url=url, modified_gmt=modified_gmt)
+        if stale_ids:
+            self._call("update", lambda col: col.update(ids=stale_ids, metadatas=stale_metadatas))
+
+    def upsert_post_chunks(
+        self,
+        *,
+        post_id: int,
+        title: str | None,
+        url: str | None,
+        modified_gmt: str | None,
+        chunks: list[str],
+        embeddings: list[list[float]],
+    ) -> ChunkDiff:
+        diff = self.diff_post_chunks(post_id=post_id, chunks=chunks)
+        self.apply_chunk_diff(
+            diff,
+            title=title,
+            url=url,
+            modified_gmt=modified_gmt,
+            chunks=chunks,
+            embeddings=[embeddings[i] for i in diff.added],
+        )
+        return diff
+
+    def search_similar(self, *, query_embedding: list[float], top_k: int) -> list[dict]:
+        res = self._call(
+            "query",
+            lambda col: col.query(
+                query_embeddings=[query_embedding],
+                n_results=top_k,
+                include=["documents", "metadatas", "distances"],
+            ),
+        )
+        return reshape_query_result(res)
+
+    async def search_similar_async(self, *, query_embedding: list[float], top_k: int) -> list[dict]:
+        res = await self._acall(
+            "query",
+            lambda col: col.query(
+                query_embeddings=[query_embedding],
+                n_results=top_k,
+                include=["documents", "metadatas", "distances"],
+            ),
+        )
+        return reshape_query_result(res)
+
+    def search_similar_many(self, *, query_embeddings: list[list[float]], top_k: int) -> list[list[dict]]:
+        if not query_embeddings:
+            return []
+        res = self._call(
+            "query",
+            lambda col: col.query(
+                query_embeddings=query_embeddings,
+                n_results=top_k,
+                include=["documents", "metadatas", "distances"],
+            ),
+        )
+        return [reshape_query_result(res, i) for i in range(len(query_embeddings))]
+
+    async def search_similar_many_async(self, *, query_embeddings: list[list[float]], top_k: int) -> list[list[dict]]:
+        if not query_embeddings:
+            return []
+        res = await self._acall(
+            "query",
+            lambda col: col.query(
+                query_embeddings=query_embeddings,
+                n_results=top_k,
+                include=["documents", "metadatas", "distances"],
+            ),
+        )
+        return [reshape_query_result(res, i) for i in range(len(query_embeddings))]
+
+    def iter_chunks(self, batch_size: int = 1000) -> Iterator[list[dict]]:
+        offset = 0
+        while True:
+            res = self._call(
+                "get",
+                lambda col: col.get(include=["documents", "metadatas"], limit=batch_size, offset=offset),
+            )
+            ids = res.get("ids") or []
+            if not ids:
+                return
+            yield [
+                {"id": chunk_id, "text": doc, "meta": meta}
+                for chunk_id, doc, meta in zip(ids, res.get("documents") or [], res.get("metadatas") or [])
+            ]
+            offset += len(ids)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "backend": "chroma",
+            "connected": self._collection is not None,
+            "reconnects": self.reconnects,
+            "operations": self.latency.snapshot(),
+        }
+
+
+_store: ChromaStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> ChromaStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ChromaStore(
+                    host=settings.CHROMA_HOST,
+                    port=settings.CHROMA_PORT,
+                    collection_name=settings.CHROMA_COLLECTION,
+                )
+    return _store
+
+
+def get_collection() -> Collection:
+    return get_store().collection()
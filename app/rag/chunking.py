@@ -1,11 +1,117 @@
+import re
+
 from app.core.config import settings
 
+# A sentence: from a non-space up to terminal punctuation (plus closing quotes/brackets)
+# followed by whitespace, or to the end of the line. Never crosses a newline, so
+# paragraph/heading boundaries from html_to_text are always split points.
+_SENTENCE = re.compile(r"\S[^\n]*?(?:[.!?؟…]+[\"'»”)\]]*(?=\s|$)|(?=[^\S\n]*$))", re.M)
+_WORD = re.compile(r"\S+")
+
+# Lines this short with no terminal punctuation are treated as headings
+_HEADING_MAX_TOKENS = 24
+
+
+class _Span:
+    # size is UTF-8 bytes plus one separator, so a chunk's estimate_tokens()
+    # is (sum of sizes) / 4, the same measure the embedding batcher uses
+    __slots__ = ("start", "end", "size", "heading")
+
+    def __init__(self, start: int, end: int, size: int, heading: bool = False):
+        self.start = start
+        self.end = end
+        self.size = size
+        self.heading = heading
+
+
+def _spans(text: str, max_bytes: int) -> list[_Span]:
+    """Sentence spans; sentences over max_bytes are cut between words, words over it every max_bytes // 4 chars."""
+    spans: list[_Span] = []
+    for m in _SENTENCE.finditer(text):
+        start, end = m.span()
+        sentence = m.group()
+        size = len(sentence.encode("utf-8")) + 1
+        if size <= max_bytes:
+            heading = (
+                size <= _HEADING_MAX_TOKENS * 4
+                and (start == 0 or text[start - 1] == "\n")
+                and (end == len(text) or text[end] == "\n")
+                and sentence[-1] not in ".!?؟…:;،"
+            )
+            spans.append(_Span(start, end, size, heading))
+            continue
+
+        piece_start = piece_end = start
+        piece_size = 0
+        for w in _WORD.finditer(sentence):
+            w_start, w_end = start + w.start(), start + w.end()
+            word_size = len(w.group().encode("utf-8")) + 1
+            if piece_size and (piece_size + word_size > max_bytes or word_size > max_bytes):
+                spans.append(_Span(piece_start, piece_end, piece_size))
+                piece_size = 0
+            if word_size > max_bytes:
+                step = max_bytes // 4
+                for cut in range(w_start, w_end, step):
+                    piece = text[cut:min(cut + step, w_end)]
+                    spans.append(_Span(cut, cut + len(piece), len(piece.encode("utf-8")) + 1))
+                continue
+            if not piece_size:
+                piece_start = w_start
+            piece_end = w_end
+            piece_size += word_size
+        if piece_size:
+            spans.append(_Span(piece_start, piece_end, piece_size))
+
+    # charge the real whitespace run between spans, not just one separator
+    for prev, nxt in zip(spans, spans[1:]):
+        prev.size += nxt.start - prev.end - 1
+    return spans
 
-def chunk_text(text: str) -> list[str]:
-    text = (text or "").strip()
-    if not text:
-        return []
 
+def chunk_by_tokens(text: str, *, max_tokens: int, overlap_tokens: int) -> list[str]:
+    """
+    Pack consecutive sentences into chunks of at most max_tokens (estimated).
+    Each chunk repeats whole trailing sentences of the previous one up to
+    overlap_tokens, and a heading that would end a chunk starts the next one
+    instead. Chunks are single slices of `text`, so the work is linear.
+    """
+    max_bytes = max_tokens * 4
+    overlap_bytes = overlap_tokens * 4
+    spans = _spans(text, max_bytes)
+    chunks: list[str] = []
+    lo = 0          # first span of the current chunk
+    size = 0
+    for hi, span in enumerate(spans):
+        if hi > lo and size + span.size > max_bytes:
+            # don't leave headings dangling at the end of a chunk
+            end = hi
+            while end - 1 > lo and spans[end - 1].heading:
+                end -= 1
+            heading_size = sum(s.size for s in spans[end:hi])
+            if heading_size + span.size > max_bytes:
+                end = hi
+            chunks.append(text[spans[lo].start:spans[end - 1].end])
+
+            if end < hi:
+                lo, size = end, heading_size  # new section starts at its heading, no overlap
+            else:
+                prev_lo, lo, size = lo, hi, 0
+                while (
+                    lo - 1 > prev_lo
+                    and not spans[lo - 1].heading
+                    and size + spans[lo - 1].size <= overlap_bytes
+                ):
+                    lo -= 1
+                    size += spans[lo].size
+                if size + span.size > max_bytes:
+                    lo, size = hi, 0
+        size += span.size
+    if lo < len(spans):
+        chunks.append(text[spans[lo].start:spans[-1].end])
+    return chunks
+
+
+def _chunk_by_chars(text: str) -> list[str]:
     size = max(200, settings.CHUNK_SIZE)
     overlap = max(0, min(settings.CHUNK_OVERLAP, size - 50))
 
@@ -23,3 +129,15 @@ def chunk_text(text: str) -> list[str]:
         start = end - overlap
 
     return chunks
+
+
+def chunk_text(text: str) -> list[str]:
+    text = (text or "").strip()
+    if not text:
+        return []
+
+    if settings.CHUNK_STRATEGY == "chars":
+        return _chunk_by_chars(text)
+    max_tokens = max(50, settings.CHUNK_MAX_TOKENS)
+    overlap = max(0, min(settings.CHUNK_OVERLAP_TOKENS, max_tokens // 2))
+    return chunk_by_tokens(text, max_tokens=max_tokens, overlap_tokens=overlap)
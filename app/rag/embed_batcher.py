@@ -0,0 +1,101 @@
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from app.core.config import settings
+from app.rag.embeddings import embed_texts
+from app.rag.tokens import estimate_tokens
+
+OnReady = Callable[[Any, list[str], list[list[float]]], None]
+
+
+@dataclass
+class _Pending:
+    owner: Any
+    texts: list[str]
+    vectors: list[list[float] | None] = field(default_factory=list)
+    remaining: int = 0
+
+
+class EmbeddingBatcher:
+    """
+    Accumulates chunks from many owners (posts) into embedding requests sized by
+    item count and estimated tokens. Once every chunk of an owner has a vector,
+    on_ready(owner, texts, vectors) is called with the vectors in chunk order.
+    """
+
+    def __init__(
+        self,
+        on_ready: OnReady,
+        *,
+        max_items: int | None = None,
+        max_tokens: int | None = None,
+        max_wait_s: float | None = None,
+        embed_fn: Callable[[list[str]], list[list[float]]] = embed_texts,
+    ):
+        self.on_ready = on_ready
+        self.max_items = max(1, max_items or settings.EMBED_BATCH_MAX_ITEMS)
+        self.max_tokens = max(1, max_tokens or settings.EMBED_BATCH_MAX_TOKENS)
+        self.max_wait_s = settings.EMBED_BATCH_MAX_WAIT_MS / 1000 if max_wait_s is None else max_wait_s
+        self.embed_fn = embed_fn
+        self.requests = 0
+        self.embedded = 0
+
+        self._queue: deque[tuple[_Pending, int, str, int]] = deque()
+        self._queued_tokens = 0
+        self._oldest: float | None = None
+
+    def add(self, owner: Any, texts: list[str]) -> None:
+        if not texts:
+            self.on_ready(owner, [], [])
+            return
+
+        entry = _Pending(owner=owner, texts=texts, vectors=[None] * len(texts), remaining=len(texts))
+        for i, text in enumerate(texts):
+            tokens = estimate_tokens(text)
+            self._queue.append((entry, i, text, tokens))
+            self._queued_tokens += tokens
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            if len(self._queue) >= self.max_items or self._queued_tokens >= self.max_tokens:
+                self._flush_batch()
+        self.poll()
+
+    def poll(self) -> None:
+        """Flush whatever is queued once the oldest chunk has waited longer than max_wait_s."""
+        if self._oldest is not None and time.monotonic() - self._oldest >= self.max_wait_s:
+            self.flush()
+
+    def time_until_deadline(self) -> float | None:
+        if self._oldest is None:
+            return None
+        return max(0.0, self.max_wait_s - (time.monotonic() - self._oldest))
+
+    def flush(self) -> None:
+        while self._queue:
+            self._flush_batch()
+
+    def _flush_batch(self) -> None:
+        batch: list[tuple[_Pending, int, str, int]] = []
+        tokens = 0
+        while self._queue and len(batch) < self.max_items:
+            item = self._queue[0]
+            if batch and tokens + item[3] > self.max_tokens:
+                break
+            batch.append(self._queue.popleft())
+            tokens += item[3]
+        self._queued_tokens -= tokens
+        self._oldest = time.monotonic() if self._queue else None
+
+        vectors = self.embed_fn([text for _, _, text, _ in batch])
+        if len(vectors) != len(batch):
+            raise RuntimeError(f"Embedding provider returned {len(vectors)} vectors for {len(batch)} chunks")
+        self.requests += 1
+        self.embedded += len(batch)
+
+        for (entry, i, _, _), vec in zip(batch, vectors):
+            entry.vectors[i] = vec
+            entry.remaining -= 1
+            if entry.remaining == 0:
+                self.on_ready(entry.owner, entry.texts, entry.vectors)  # type: ignore[arg-type]
@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from app.core.config import settings
+from app.rag.tokens import estimate_tokens
+
+_SQLITE_MAX_VARS = 500
+
+
+def normalize_text(text: str) -> str:
+    return unicodedata.normalize("NFC", text or "").strip()
+
+
+def cache_key(*, provider: str, model: str, dimensions: int, text: str) -> str:
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{provider}:{model}:{dimensions}:{digest}"
+
+
+class EmbeddingCache:
+    """Content-addressed embedding store backed by a local SQLite file, evicted in LRU order."""
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        # COUNT(*) scans the table, so the bound is checked once per max_entries/20 rows written
+        # (and on the first write after startup) rather than on every write
+        self._prune_every = max(1, max_entries // 20)
+        self._since_prune = self._prune_every
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings(last_used)")
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, keys: list[str]) -> dict[str, list[float]]:
+        found: dict[str, list[float]] = {}
+        if not keys:
+            return found
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            for i in range(0, len(keys), _SQLITE_MAX_VARS):
+                part = keys[i:i + _SQLITE_MAX_VARS]
+                marks = ",".join("?" * len(part))
+                rows = conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", part).fetchall()
+                for key, blob in rows:
+                    vec = array("f")
+                    vec.frombytes(blob)
+                    found[key] = vec.tolist()
+                if rows:
+                    conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE key IN ({','.join('?' * len(rows))})",
+                        [now, *[r[0] for r in rows]],
+                    )
+        return found
+
+    def put_many(self, items: dict[str, list[float]]) -> None:
+        if not items:
+            return
+        now = time.time()
+        # zero vectors are placeholders for empty texts (see embeddings._GeminiPlan), not embeddings
+        rows = [(key, array("f", vec).tobytes(), now) for key, vec in items.items() if any(vec)]
+        if not rows:
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows)
+            self._since_prune += len(rows)
+            if self._since_prune >= self._prune_every:
+                self._since_prune = 0
+                self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        if self.max_entries <= 0:
+            return
+        count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = count - self.max_entries
+        if excess <= 0:
+            return
+        # Trim a little below the bound so we don't evict on every single insert
+        excess += self.max_entries // 20
+        conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+
+    def _lookup(
+        self, texts: list[str], *, provider: str, model: str, dimensions: int
+    ) -> tuple[list[str], dict[str, list[float]], list[str], list[str]]:
+        keys = [cache_key(provider=provider, model=model, dimensions=dimensions, text=t) for t in texts]
+        cached = self.get_many(list(dict.fromkeys(keys)))
+
+        # Identical texts inside one call only go over the wire once
+        miss_keys: list[str] = []
+        miss_texts: list[str] = []
+        pending: set[str] = set()
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in pending:
+                pending.add(key)
+                miss_keys.append(key)
+                miss_texts.append(text)
+
+        hit_count = sum(1 for k in keys if k in cached)
+        self.hits += hit_count
+        self.misses += len(texts) - hit_count
+        self.tokens_saved += sum(estimate_tokens(t) for k, t in zip(keys, texts) if k in cached)
+        return keys, cached, miss_keys, miss_texts
+
+    def _merge(
+        self,
+        keys: list[str],
+        cached: dict[str, list[float]],
+        miss_keys: list[str],
+        fresh: list[list[float]],
+    ) -> list[list[float]]:
+        if len(fresh) != len(miss_keys):
+            raise RuntimeError(f"Embedding provider returned {len(fresh)} vectors for {len(miss_keys)} texts")
+        fresh_by_key = dict(zip(miss_keys, fresh))
+        self.put_many(fresh_by_key)
+        cached.update(fresh_by_key)
+        return [cached[k] for k in keys]
+
+    def embed(
+        self,
+        texts: list[str],
+        *,
+        provider: str,
+        model: str,
+        dimensions: int,
+        embed_fn: Callable[[list[str]], list[list[float]]],
+    ) -> list[list[float]]:
+        keys, cached, miss_keys, miss_texts = self._lookup(texts, provider=provider, model=model, dimensions=dimensions)
+        fresh = embed_fn(miss_texts) if miss_texts else []
+        return self._merge(keys, cached, miss_keys, fresh)
+
+    async def embed_async(
+        self,
+        texts: list[str],
+        *,
+        provider: str,
+        model: str,
+        dimensions: int,
+        embed_fn: Callable[[list[str]], Awaitable[list[list[float]]]],
+    ) -> list[list[float]]:
+        # SQLite reads/writes block (busy timeout, the lock), so they run off the event loop
+        keys, cached, miss_keys, miss_texts = await asyncio.to_thread(
+            self._lookup, texts, provider=provider, model=model, dimensions=dimensions
+        )
+        fresh = await embed_fn(miss_texts) if miss_texts else []
+        return await asyncio.to_thread(self._merge, keys, cached, miss_keys, fresh)
+
+    def counters(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "tokens_saved": self.tokens_saved}
+
+
+_cache: EmbeddingCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache | None:
+    global _cache
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache(settings.EMBEDDING_CACHE_PATH, settings.EMBEDDING_CACHE_MAX_ENTRIES)
+    return _cache
+
+
+def cache_counters() -> dict[str, int]:
+    cache = get_embedding_cache()
+    if cache is None:
+        return {"hits": 0, "misses": 0, "tokens_saved": 0}
+    return cache.counters()
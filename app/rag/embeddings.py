@@ -1,69 +1,191 @@
-from typing import Literal
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Literal
 import httpx
 
 from app.core.config import settings
+from app.core.http import get_async_http_client, get_http_client
+from app.core.metrics import record_tokens
+from app.rag.embedding_cache import get_embedding_cache
+from app.rag.tokens import estimate_tokens
 
 Provider = Literal["openai", "gemini"]
 
+GEMINI_MAX_TEXT_CHARS = 20000
 
-def embed_texts(texts: list[str]) -> list[list[float]]:
+
+def _provider() -> tuple[Provider, str]:
     provider: Provider = settings.EMBEDDING_PROVIDER.lower()  # type: ignore
     if provider == "gemini":
-        return _embed_gemini(texts)
-    return _embed_openai(texts)
+        return provider, settings.GEMINI_EMBEDDING_MODEL
+    return provider, settings.OPENAI_EMBEDDING_MODEL
 
 
-def _embed_openai(texts: list[str]) -> list[list[float]]:
+def embed_texts(texts: list[str], *, use_cache: bool = True) -> list[list[float]]:
+    provider, model = _provider()
+    embed_fn = _embed_gemini if provider == "gemini" else _embed_openai
+
+    cache = get_embedding_cache() if use_cache else None
+    if cache is None:
+        return embed_fn(texts)
+    return cache.embed(
+        texts,
+        provider=provider,
+        model=model,
+        dimensions=settings.EMBEDDING_DIMENSIONS,
+        embed_fn=embed_fn,
+    )
+
+
+async def embed_texts_async(texts: list[str], *, use_cache: bool = True) -> list[list[float]]:
+    """Async embed_texts; use_cache=False skips the ingest embedding cache (query embeddings have their own)."""
+    provider, model = _provider()
+    embed_fn = _embed_gemini_async if provider == "gemini" else _embed_openai_async
+
+    cache = get_embedding_cache() if use_cache else None
+    if cache is None:
+        return await embed_fn(texts)
+    return await cache.embed_async(
+        texts,
+        provider=provider,
+        model=model,
+        dimensions=settings.EMBEDDING_DIMENSIONS,
+        embed_fn=embed_fn,
+    )
+
+
+def _openai_request(texts: list[str]) -> tuple[str, dict[str, str], dict[str, Any]]:
     if not settings.OPENAI_API_KEY:
         raise RuntimeError("OPENAI_API_KEY is missing")
 
-    url = "https://api.openai.com/v1/embeddings"
+    url = settings.OPENAI_BASE_URL.rstrip("/") + "/embeddings"
     headers = {"Authorization": f"Bearer {settings.OPENAI_API_KEY}", "Content-Type": "application/json"}
-    payload = {"model": settings.OPENAI_EMBEDDING_MODEL, "input": texts}
+    payload: dict[str, Any] = {"model": settings.OPENAI_EMBEDDING_MODEL, "input": texts}
+    if settings.EMBEDDING_DIMENSIONS > 0:
+        payload["dimensions"] = settings.EMBEDDING_DIMENSIONS
+    return url, headers, payload
 
-    with httpx.Client(timeout=60) as client:
-        r = client.post(url, headers=headers, json=payload)
-        r.raise_for_status()
-        data = r.json()
+
+def _embed_openai(texts: list[str]) -> list[list[float]]:
+    url, headers, payload = _openai_request(texts)
+    r = get_http_client(url).post(url, headers=headers, json=payload)
+    r.raise_for_status()
+    data = r.json()
+    record_tokens("openai", "embed", (data.get("usage") or {}).get("prompt_tokens", 0))
 
     return [item["embedding"] for item in data["data"]]
 
 
+async def _embed_openai_async(texts: list[str]) -> list[list[float]]:
+    url, headers, payload = _openai_request(texts)
+    r = await get_async_http_client(url).post(url, headers=headers, json=payload)
+    r.raise_for_status()
+    data = r.json()
+    record_tokens("openai", "embed", (data.get("usage") or {}).get("prompt_tokens", 0))
+
+    return [item["embedding"] for item in data["data"]]
+
+
+def pack_batches(texts: list[str], *, max_items: int, max_tokens: int) -> list[list[int]]:
+    """Group text positions into consecutive batches bounded by item count and estimated tokens."""
+    batches: list[list[int]] = []
+    current: list[int] = []
+    current_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (len(current) >= max_items or current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+class _GeminiPlan:
+    """
+    Gemini rejects empty content, so only non-empty texts are sent; the
+    empty ones get zero-vector placeholders to keep positions aligned.
+    Gemini also has a limit of ~20k characters per text.
+    """
+
+    def __init__(self, texts: list[str]):
+        if not settings.GEMINI_API_KEY:
+            raise RuntimeError("GEMINI_API_KEY is missing")
+
+        self.model = settings.GEMINI_EMBEDDING_MODEL
+        self.url = f"{settings.GEMINI_BASE_URL.rstrip('/')}/models/{self.model}:batchEmbedContents"
+        self.params = {"key": settings.GEMINI_API_KEY}
+        self.count = len(texts)
+        self.positions = [i for i, t in enumerate(texts) if t and t.strip()]
+        self.to_send = [texts[i][:GEMINI_MAX_TEXT_CHARS] for i in self.positions]
+        self.batches = pack_batches(
+            self.to_send,
+            max_items=settings.GEMINI_EMBED_BATCH_SIZE,
+            max_tokens=settings.GEMINI_EMBED_BATCH_MAX_TOKENS,
+        )
+
+    def payload(self, batch: list[int]) -> dict[str, Any]:
+        requests = []
+        for j in batch:
+            req: dict[str, Any] = {"model": f"models/{self.model}", "content": {"parts": [{"text": self.to_send[j]}]}}
+            if settings.EMBEDDING_DIMENSIONS > 0:
+                req["outputDimensionality"] = settings.EMBEDDING_DIMENSIONS
+            requests.append(req)
+        return {"requests": requests}
+
+    @staticmethod
+    def parse(r: httpx.Response, batch: list[int]) -> list[list[float]]:
+        try:
+            r.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            print(f"Error embedding batch of {len(batch)} texts: {e}")
+            print(f"Response: {e.response.text}")
+            raise
+        vectors = [e["values"] for e in r.json()["embeddings"]]
+        if len(vectors) != len(batch):
+            raise RuntimeError(f"Gemini returned {len(vectors)} embeddings for a batch of {len(batch)} texts")
+        return vectors
+
+    def assemble(self, results: list[list[list[float]]]) -> list[list[float]]:
+        sent = [vec for vectors in results for vec in vectors]
+        if len(sent) != len(self.positions):
+            raise RuntimeError(f"Gemini returned {len(sent)} embeddings for {len(self.positions)} texts")
+        dims = len(sent[0]) if sent else settings.EMBEDDING_DIMENSIONS
+        if dims <= 0 and self.count:
+            raise RuntimeError("Cannot size placeholders for empty texts: no vectors returned and EMBEDDING_DIMENSIONS is 0")
+        embeddings: list[list[float]] = [[0.0] * dims for _ in range(self.count)]
+        for i, vec in zip(self.positions, sent):
+            embeddings[i] = vec
+        return embeddings
+
+
 def _embed_gemini(texts: list[str]) -> list[list[float]]:
-    if not settings.GEMINI_API_KEY:
-        raise RuntimeError("GEMINI_API_KEY is missing")
-
-    model = settings.GEMINI_EMBEDDING_MODEL
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:embedContent"
-    
-    embeddings = []
-    with httpx.Client(timeout=60) as client:
-        for text in texts:
-            # Skip empty or whitespace-only texts
-            if not text or not text.strip():
-                continue
-            
-            # Gemini has a limit of ~20k characters per request
-            text = text[:20000] if len(text) > 20000 else text
-            
-            payload = {
-                "model": f"models/{model}",
-                "content": {
-                    "parts": [{"text": text}]
-                }
-            }
-            
-            params = {"key": settings.GEMINI_API_KEY}
-            
-            try:
-                r = client.post(url, params=params, json=payload)
-                r.raise_for_status()
-                data = r.json()
-                embeddings.append(data["embedding"]["values"])
-            except httpx.HTTPStatusError as e:
-                # Log the error with more details
-                print(f"Error embedding text (length: {len(text)}): {e}")
-                print(f"Response: {e.response.text if hasattr(e, 'response') else 'No response'}")
-                raise
-
-    return embeddings
+    plan = _GeminiPlan(texts)
+    client = get_http_client(plan.url)
+
+    def embed_batch(batch: list[int]) -> list[list[float]]:
+        r = client.post(plan.url, params=plan.params, json=plan.payload(batch))
+        return plan.parse(r, batch)
+
+    results: list[list[list[float]]] = []
+    if plan.batches:
+        workers = max(1, min(settings.GEMINI_EMBED_CONCURRENCY, len(plan.batches)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(embed_batch, plan.batches))
+    return plan.assemble(results)
+
+
+async def _embed_gemini_async(texts: list[str]) -> list[list[float]]:
+    plan = _GeminiPlan(texts)
+    client = get_async_http_client(plan.url)
+    semaphore = asyncio.Semaphore(max(1, settings.GEMINI_EMBED_CONCURRENCY))
+
+    async def embed_batch(batch: list[int]) -> list[list[float]]:
+        async with semaphore:
+            r = await client.post(plan.url, params=plan.params, json=plan.payload(batch))
+        return plan.parse(r, batch)
+
+    results = await asyncio.gather(*(embed_batch(b) for b in plan.batches))
+    return plan.assemble(list(results))
@@ -0,0 +1,162 @@
+from html.parser import HTMLParser
+from typing import Protocol
+
+from bs4 import BeautifulSoup
+from bs4.dammit import EntitySubstitution
+
+# Elements whose text never reaches the chunker
+SKIP_TAGS = frozenset({"script", "style", "noscript"})
+
+# Tags the BeautifulSoup tree builder closes immediately (never hold text)
+VOID_TAGS = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "keygen", "link", "menuitem", "meta",
+    "param", "source", "track", "wbr", "basefont", "bgsound", "command", "frame", "image", "isindex",
+    "nextid", "spacer",
+})
+
+
+def _clean_lines(text: str) -> str:
+    return "\n".join([line.strip() for line in text.splitlines() if line.strip()])
+
+
+class HtmlExtractor(Protocol):
+    name: str
+
+    def extract(self, html: str) -> str: ...
+
+
+class SoupExtractor:
+    """Reference implementation: full BeautifulSoup tree with html.parser."""
+
+    name = "soup"
+
+    def extract(self, html: str) -> str:
+        soup = BeautifulSoup(html or "", "html.parser")
+        for tag in soup(list(SKIP_TAGS)):
+            tag.decompose()
+        return _clean_lines(soup.get_text(separator="\n"))
+
+
+class _TextCollector(HTMLParser):
+    """
+    Replays the events BeautifulSoup's html.parser builder reacts to, keeping
+    only a stack of open tag names: an end tag closes everything up to the most
+    recent open tag of that name (and is ignored when none is open), every
+    non-text event ends the current string, and character references are
+    decoded the way the builder does. Like the builder, an end tag matching
+    an earlier <br>-style void start tag (`<br>a</br>b`) is swallowed
+    without ending the string.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.parts: list[str] = []
+        self.stack: list[str] = []
+        self.open_counts: dict[str, int] = {}
+        self.closed_void: list[str] = []
+        self.skipping = 0
+
+    def handle_starttag(self, tag: str, attrs) -> None:
+        self.parts.append("\n")
+        if tag in VOID_TAGS:
+            self.closed_void.append(tag)
+            return
+        self._open(tag)
+
+    def _open(self, tag: str) -> None:
+        self.stack.append(tag)
+        self.open_counts[tag] = self.open_counts.get(tag, 0) + 1
+        if tag in SKIP_TAGS:
+            self.skipping += 1
+
+    def handle_startendtag(self, tag: str, attrs) -> None:
+        # <tag/> opens and closes at once, unless its end checks off an earlier
+        # <tag>; the builder then leaves this one open until a later </tag>
+        self.parts.append("\n")
+        if tag in self.closed_void:
+            self.closed_void.remove(tag)
+            self._open(tag)
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in self.closed_void:
+            self.closed_void.remove(tag)
+            return
+        self.parts.append("\n")
+        if not self.open_counts.get(tag):
+            return
+        while self.stack:
+            name = self.stack.pop()
+            self.open_counts[name] -= 1
+            if name in SKIP_TAGS:
+                self.skipping -= 1
+            if name == tag:
+                break
+
+    def handle_data(self, data: str) -> None:
+        if not self.skipping:
+            self.parts.append(data)
+
+    def handle_charref(self, name: str) -> None:
+        try:
+            n = int(name[1:], 16) if name[:1] in ("x", "X") else int(name)
+        except ValueError:
+            n = -1
+        data = None
+        if 0 <= n < 256:
+            # &#147; and friends usually mean Windows-1252
+            try:
+                data = bytes([n]).decode("windows-1252")
+            except UnicodeDecodeError:
+                pass
+        if not data:
+            try:
+                data = chr(n)
+            except (ValueError, OverflowError):
+                data = "\N{REPLACEMENT CHARACTER}"
+        self.handle_data(data)
+
+    def handle_entityref(self, name: str) -> None:
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self.handle_data(character if character is not None else f"&{name}")
+
+    def unknown_decl(self, data: str) -> None:
+        # <![CDATA[...]]> is text for get_text(); other declarations are not
+        self.parts.append("\n")
+        if data.upper().startswith("CDATA["):
+            self.handle_data(data[6:])
+            self.parts.append("\n")
+
+    def handle_comment(self, data: str) -> None:
+        self.parts.append("\n")
+
+    def handle_decl(self, decl: str) -> None:
+        self.parts.append("\n")
+
+    def handle_pi(self, data: str) -> None:
+        self.parts.append("\n")
+
+
+class StreamExtractor:
+    """Single pass over the markup with the stdlib parser; no tree is built."""
+
+    name = "stream"
+
+    def extract(self, html: str) -> str:
+        if not html:
+            return ""
+        if "<" not in html and "&" not in html:
+            return _clean_lines(html)
+        collector = _TextCollector()
+        collector.feed(html)
+        collector.close()
+        return _clean_lines("".join(collector.parts))
+
+
+_EXTRACTORS: dict[str, HtmlExtractor] = {e.name: e for e in (StreamExtractor(), SoupExtractor())}
+
+
+def get_extractor(name: str) -> HtmlExtractor:
+    try:
+        return _EXTRACTORS[name]
+    except KeyError:
+        raise RuntimeError(f"Unknown HTML_EXTRACTOR: {name} (expected one of {', '.join(_EXTRACTORS)})")
@@ -0,0 +1,287 @@
+import asyncio
+import json
+import re
+import sqlite3
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Any, Iterable
+
+from app.core.config import settings
+from app.core.latency import LatencyCounters
+from app.rag.vector_store import ChunkDiff, chunk_metadata
+
+_SQLITE_MAX_VARS = 500
+
+# Arabic-script variants folded to their Persian form; ZWNJ splits words
+# (کتاب‌ها -> کتاب ها) so suffixed forms still match their stem.
+_FOLD = str.maketrans({
+    "ي": "ی", "ى": "ی", "ك": "ک",
+    "ۀ": "ه", "ة": "ه", "ە": "ه", "ھ": "ه",
+    "أ": "ا", "إ": "ا", "ٱ": "ا", "آ": "ا",
+    "\u200c": " ", "\u200d": "", "\u0640": "",
+    **{chr(0x06F0 + d): str(d) for d in range(10)},
+    **{chr(0x0660 + d): str(d) for d in range(10)},
+})
+_DIACRITICS = re.compile("[\u064b-\u065f\u0670\u06d6-\u06ed]")
+_TOKEN = re.compile(r"\w+")
+
+_STOPWORDS_TEXT = (
+    "و در به از که این را با است برای آن یک تا هم بر یا می ها های شد شده بود کرد کند "
+    "چه چی چطور چگونه کجا کی آیا من ما شما او هر اما نیز باید هست نیست "
+    "a an and are as at be by do does for from how i in is it of on or the to what when where which who why with"
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased, Persian-normalized word tokens (ي/ك -> ی/ک, no diacritics, ASCII digits)."""
+    text = unicodedata.normalize("NFKC", text or "").casefold().translate(_FOLD)
+    return _TOKEN.findall(_DIACRITICS.sub("", text))
+
+
+STOPWORDS = frozenset(tokenize(_STOPWORDS_TEXT))
+
+
+def query_terms(question: str) -> list[str]:
+    """Distinct tokens of a question without stopwords (all of them if nothing else is left)."""
+    tokens = list(dict.fromkeys(tokenize(question)))
+    return [t for t in tokens if t not in STOPWORDS] or tokens
+
+
+class LexicalIndex:
+    """
+    BM25 over chunk text and post titles, backed by an SQLite FTS5 table.
+
+    Rows mirror the vector store's chunks (same ids, documents and
+    metadata), so a lexical hit can go into the prompt without touching the
+    vector store. Text is normalized by tokenize() before FTS5 sees it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.latency = LatencyCounters()
+        self._lock = threading.Lock()
+        self._backfilled = False
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "row INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, post_id TEXT NOT NULL, "
+            "document TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_post_id ON chunks(post_id)")
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS terms USING fts5(body, title, tokenize='unicode61 remove_diacritics 0')"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        # title terms count half as much as body terms; ORDER BY rank uses this
+        self._conn.execute("INSERT INTO terms(terms, rank) VALUES ('rank', 'bm25(1.0, 0.5)')")
+
+    def _insert(self, rows: list[tuple[str, str, str, dict]]) -> None:
+        for chunk_id, post_id, document, meta in rows:
+            cur = self._conn.execute(
+                "INSERT INTO chunks(id, post_id, document, metadata) VALUES (?, ?, ?, ?)",
+                (chunk_id, post_id, document, json.dumps(meta, ensure_ascii=False)),
+            )
+            self._conn.execute(
+                "INSERT INTO terms(rowid, body, title) VALUES (?, ?, ?)",
+                (cur.lastrowid, " ".join(tokenize(document)), " ".join(tokenize(meta.get("title", "")))),
+            )
+
+    def _delete(self, ids: list[str]) -> None:
+        for i in range(0, len(ids), _SQLITE_MAX_VARS):
+            part = ids[i:i + _SQLITE_MAX_VARS]
+            marks = ",".join("?" * len(part))
+            self._conn.execute(f"DELETE FROM terms WHERE rowid IN (SELECT row FROM chunks WHERE id IN ({marks}))", part)
+            self._conn.execute(f"DELETE FROM chunks WHERE id IN ({marks})", part)
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn()
+                self._conn.execute("COMMIT")
+                return result
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def apply_chunk_diff(
+        self,
+        diff: ChunkDiff,
+        *,
+        title: str | None,
+        url: str | None,
+        modified_gmt: str | None,
+        chunks: list[str],
+    ) -> None:
+        """
+        Bring the post's rows in line with its new chunk list. Compares against
+        what this index holds rather than diff.added/removed, so posts indexed
+        before the index existed are filled in on their next sync.
+        """
+        post_id = str(diff.post_id)
+
+        def write() -> None:
+            existing = dict(self._conn.execute("SELECT id, metadata FROM chunks WHERE post_id = ?", (post_id,)))
+            wanted = set(diff.ids)
+            stale = [chunk_id for chunk_id in existing if chunk_id not in wanted]
+            rows = []
+            for i, chunk_id in enumerate(diff.ids):
+                meta = chunk_metadata(diff.post_id, title, url, modified_gmt, i)
+                if chunk_id not in existing:
+                    rows.append((chunk_id, post_id, chunks[i], meta))
+                elif json.loads(existing[chunk_id]) != meta:
+                    stale.append(chunk_id)
+                    rows.append((chunk_id, post_id, chunks[i], meta))
+            self._delete(stale)
+            self._insert(rows)
+
+        with self.latency.time("write"):
+            self._transaction(write)
+
+    def add_missing(self, hits: Iterable[dict]) -> int:
+        """Index vector-store chunks ({id, text, meta}) this index does not have yet; returns how many."""
+        hits = list(hits)
+
+        def write() -> int:
+            ids = [h["id"] for h in hits]
+            have = set()
+            for i in range(0, len(ids), _SQLITE_MAX_VARS):
+                part = ids[i:i + _SQLITE_MAX_VARS]
+                have.update(r for (r,) in self._conn.execute(
+                    f"SELECT id FROM chunks WHERE id IN ({','.join('?' * len(part))})", part
+                ))
+            rows = [
+                (h["id"], str((h.get("meta") or {}).get("post_id", "")), h.get("text") or "", h.get("meta") or {})
+                for h in hits if h["id"] not in have
+            ]
+            self._insert(rows)
+            return len(rows)
+
+        with self.latency.time("backfill"):
+            return self._transaction(write)
+
+    def search(self, question: str, top_k: int) -> list[dict]:
+        """Best chunks by BM25; `score` is positive, larger is better."""
+        terms = query_terms(question)
+        if not terms or top_k <= 0:
+            return []
+        match = " OR ".join(f'"{t}"' for t in terms)
+        with self.latency.time("query"), self._lock:
+            rows = self._conn.execute(
+                "SELECT c.id, c.document, c.metadata, terms.rank FROM terms JOIN chunks c ON c.row = terms.rowid "
+                "WHERE terms MATCH ? ORDER BY terms.rank LIMIT ?",
+                (match, top_k),
+            ).fetchall()
+        return [
+            {"id": chunk_id, "text": document, "meta": json.loads(metadata), "score": -rank}
+            for chunk_id, document, metadata, rank in rows
+        ]
+
+    async def search_async(self, question: str, top_k: int) -> list[dict]:
+        return await asyncio.to_thread(self.search, question, top_k)
+
+    def best_score_outside(self, question: str, post_id: Any) -> float:
+        """BM25 score of the best chunk from any post other than `post_id`; 0.0 when nothing else matches."""
+        terms = query_terms(question)
+        if not terms:
+            return 0.0
+        match = " OR ".join(f'"{t}"' for t in terms)
+        with self.latency.time("query"), self._lock:
+            row = self._conn.execute(
+                "SELECT terms.rank FROM terms JOIN chunks c ON c.row = terms.rowid "
+                "WHERE terms MATCH ? AND c.post_id != ? ORDER BY terms.rank LIMIT 1",
+                (match, str(post_id)),
+            ).fetchone()
+        return -row[0] if row else 0.0
+
+    async def best_score_outside_async(self, question: str, post_id: Any) -> float:
+        return await asyncio.to_thread(self.best_score_outside, question, post_id)
+
+    def mark_backfilled(self) -> None:
+        """Record that every chunk of the vector store has been indexed (see backfill_lexical_index)."""
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO state(key, value) VALUES ('backfilled', '1')")
+        self._backfilled = True
+
+    def is_backfilled(self) -> bool:
+        """
+        Whether the index covers the whole corpus. Until then it only holds
+        posts that changed since it was created, and a lead over them says
+        nothing about the posts it is missing.
+        """
+        if not self._backfilled:
+            with self._lock:
+                row = self._conn.execute("SELECT value FROM state WHERE key = 'backfilled'").fetchone()
+            self._backfilled = row is not None
+        return self._backfilled
+
+    async def is_backfilled_async(self) -> bool:
+        if self._backfilled:
+            return True
+        return await asyncio.to_thread(self.is_backfilled)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            (rows,) = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()
+            (posts,) = self._conn.execute("SELECT COUNT(DISTINCT post_id) FROM chunks").fetchone()
+        return {
+            "path": self.path,
+            "chunks": rows,
+            "posts": posts,
+            "backfilled": self.is_backfilled(),
+            "operations": self.latency.snapshot(),
+        }
+
+
+def post_id_of(hit: dict) -> Any:
+    return (hit.get("meta") or {}).get("post_id")
+
+
+def confidence(question: str, hits: list[dict], runner_up: float | None = None) -> float:
+    """
+    0..1: share of the question's terms found in the best hit (text and
+    title), times how far its score is ahead of the best hit from any other
+    post. A title or product-name query that only one post matches scores ~1.
+    `runner_up` is that other post's score when `hits` doesn't reach it (see
+    LexicalIndex.best_score_outside); without one there is no margin to lose.
+    """
+    terms = query_terms(question)
+    if not hits or not terms:
+        return 0.0
+    top = hits[0]
+    top_post = post_id_of(top)
+    found = set(tokenize(top.get("text", ""))) | set(tokenize((top.get("meta") or {}).get("title", "")))
+    coverage = sum(t in found for t in terms) / len(terms)
+    if runner_up is None:
+        runner_up = next((h["score"] for h in hits[1:] if post_id_of(h) != top_post), 0.0)
+    margin = 1.0 - runner_up / top["score"] if top["score"] > 0 else 0.0
+    return coverage * max(0.0, margin)
+
+
+def reciprocal_rank_fusion(*rankings: list[dict], k: int = 60) -> list[dict]:
+    """Merge ranked hit lists by id; each hit gains `rrf_score`. The first list's dict wins for shared ids."""
+    scores: dict[str, float] = {}
+    merged: dict[str, dict] = {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking, start=1):
+            scores[hit["id"]] = scores.get(hit["id"], 0.0) + 1.0 / (k + rank)
+            merged.setdefault(hit["id"], hit)
+    order = sorted(scores, key=scores.__getitem__, reverse=True)
+    return [{**merged[i], "rrf_score": scores[i]} for i in order]
+
+
+_index: LexicalIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_lexical_index() -> LexicalIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = LexicalIndex(settings.LEXICAL_INDEX_PATH)
+    return _index
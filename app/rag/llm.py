@@ -1,5 +1,13 @@
+import json
+from typing import Any, AsyncIterator
+
 import httpx
+
 from app.core.config import settings
+from app.core.http import get_async_http_client, get_http_client
+from app.core.metrics import record_tokens
+
+INSTRUCTIONS = "You are a helpful assistant. Answer in the same language as the user's question. Use the provided context only when relevant. If unknown, say you don't know."
 
 
 def generate_answer(*, prompt: str) -> str:
@@ -9,24 +17,40 @@ def generate_answer(*, prompt: str) -> str:
     return _gen_openai(prompt)
 
 
-def _gen_openai(prompt: str) -> str:
+async def generate_answer_async(*, prompt: str) -> str:
+    provider = settings.LLM_PROVIDER.lower()
+    if provider == "gemini":
+        return await _gen_gemini_async(prompt)
+    return await _gen_openai_async(prompt)
+
+
+def _openai_request(prompt: str) -> tuple[str, dict[str, str], dict[str, Any]]:
     if not settings.OPENAI_API_KEY:
         raise RuntimeError("OPENAI_API_KEY is missing")
 
-    url = "https://api.openai.com/v1/responses"
+    url = settings.OPENAI_BASE_URL.rstrip("/") + "/responses"
     headers = {"Authorization": f"Bearer {settings.OPENAI_API_KEY}", "Content-Type": "application/json"}
 
     payload = {
         "model": settings.OPENAI_RESPONSES_MODEL,
-        "instructions": "You are a helpful assistant. Answer in the same language as the user's question. Use the provided context only when relevant. If unknown, say you don't know.",
+        "instructions": INSTRUCTIONS,
         "input": prompt,
     }
+    return url, headers, payload
 
-    with httpx.Client(timeout=90) as client:
-        r = client.post(url, headers=headers, json=payload)
-        r.raise_for_status()
-        data = r.json()
 
+def _record_openai_usage(data: dict) -> None:
+    usage = data.get("usage") or {}
+    record_tokens("openai", "generate", usage.get("input_tokens", 0), usage.get("output_tokens", 0))
+
+
+def _record_gemini_usage(data: dict) -> None:
+    usage = data.get("usageMetadata") or {}
+    record_tokens("gemini", "generate", usage.get("promptTokenCount", 0), usage.get("candidatesTokenCount", 0))
+
+
+def _parse_openai(data: dict) -> str:
+    _record_openai_usage(data)
     if isinstance(data, dict) and data.get("output_text"):
         return str(data["output_text"])
 
@@ -39,22 +63,109 @@ def _gen_openai(prompt: str) -> str:
     return "\n".join(text_parts).strip() or ""
 
 
-def _gen_gemini(prompt: str) -> str:
+def _gen_openai(prompt: str) -> str:
+    url, headers, payload = _openai_request(prompt)
+    r = get_http_client(url).post(url, headers=headers, json=payload, timeout=settings.LLM_TIMEOUT)
+    r.raise_for_status()
+    return _parse_openai(r.json())
+
+
+async def _gen_openai_async(prompt: str) -> str:
+    url, headers, payload = _openai_request(prompt)
+    r = await get_async_http_client(url).post(url, headers=headers, json=payload, timeout=settings.LLM_TIMEOUT)
+    r.raise_for_status()
+    return _parse_openai(r.json())
+
+
+def _gemini_request(prompt: str, *, method: str = "generateContent") -> tuple[str, dict[str, str], dict[str, Any]]:
     if not settings.GEMINI_API_KEY:
         raise RuntimeError("GEMINI_API_KEY is missing")
 
     model = settings.GEMINI_GENERATE_MODEL
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
+    url = f"{settings.GEMINI_BASE_URL.rstrip('/')}/models/{model}:{method}"
     headers = {"x-goog-api-key": settings.GEMINI_API_KEY, "Content-Type": "application/json"}
     payload = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+    return url, headers, payload
 
-    with httpx.Client(timeout=90) as client:
-        r = client.post(url, headers=headers, json=payload)
-        r.raise_for_status()
-        data = r.json()
 
+def _parse_gemini(data: dict) -> str:
+    _record_gemini_usage(data)
     candidates = data.get("candidates", []) or []
     if not candidates:
         return ""
     parts = candidates[0].get("content", {}).get("parts", []) or []
     return "".join([p.get("text", "") for p in parts]).strip()
+
+
+def _gen_gemini(prompt: str) -> str:
+    url, headers, payload = _gemini_request(prompt)
+    r = get_http_client(url).post(url, headers=headers, json=payload, timeout=settings.LLM_TIMEOUT)
+    r.raise_for_status()
+    return _parse_gemini(r.json())
+
+
+async def _gen_gemini_async(prompt: str) -> str:
+    url, headers, payload = _gemini_request(prompt)
+    r = await get_async_http_client(url).post(url, headers=headers, json=payload, timeout=settings.LLM_TIMEOUT)
+    r.raise_for_status()
+    return _parse_gemini(r.json())
+
+
+async def stream_answer(*, prompt: str) -> AsyncIterator[str]:
+    """Yield answer text deltas as the provider produces them."""
+    provider = settings.LLM_PROVIDER.lower()
+    if provider == "gemini":
+        deltas = _stream_gemini(prompt)
+    else:
+        deltas = _stream_openai(prompt)
+    async for delta in deltas:
+        yield delta
+
+
+async def _iter_sse_json(r: httpx.Response) -> AsyncIterator[dict]:
+    if r.is_error:
+        await r.aread()
+        r.raise_for_status()
+    async for line in r.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if not data or data == "[DONE]":
+            continue
+        yield json.loads(data)
+
+
+async def _stream_openai(prompt: str) -> AsyncIterator[str]:
+    url, headers, payload = _openai_request(prompt)
+    payload["stream"] = True
+
+    client = get_async_http_client(url)
+    # Leaving this block (including on cancellation when the client disconnects)
+    # closes the upstream stream, so generation stops being billed.
+    async with client.stream("POST", url, headers=headers, json=payload, timeout=settings.LLM_TIMEOUT) as r:
+        async for event in _iter_sse_json(r):
+            kind = event.get("type")
+            if kind == "response.output_text.delta" and event.get("delta"):
+                yield event["delta"]
+            elif kind == "response.completed":
+                _record_openai_usage(event.get("response") or {})
+            elif kind in ("response.failed", "error"):
+                raise RuntimeError(f"OpenAI stream failed: {event}")
+
+
+async def _stream_gemini(prompt: str) -> AsyncIterator[str]:
+    url, headers, payload = _gemini_request(prompt, method="streamGenerateContent")
+
+    client = get_async_http_client(url)
+    async with client.stream(
+        "POST", url, params={"alt": "sse"}, headers=headers, json=payload, timeout=settings.LLM_TIMEOUT
+    ) as r:
+        usage: dict = {}
+        async for event in _iter_sse_json(r):
+            # every chunk carries the running totals; the last one has the final counts
+            usage = event.get("usageMetadata") or usage
+            for candidate in (event.get("candidates") or [])[:1]:
+                for part in candidate.get("content", {}).get("parts", []) or []:
+                    if part.get("text"):
+                        yield part["text"]
+        _record_gemini_usage({"usageMetadata": usage})
@@ -0,0 +1,557 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Iterator
+
+import numpy as np
+
+from app.core.latency import LatencyCounters
+from app.rag.vector_store import ChunkDiff, chunk_metadata, diff_chunks, stale_metadata
+
+_INITIAL_CAPACITY = 1024
+_SCORE_BLOCK_ROWS = 16384     # rows scored per matmul; bounds the float16 -> float32 temporary
+_CODE_BLOCK_ROWS = 2048       # int8 rows widened to float32 at a time
+_MIN_COMPACT_ROWS = 1024
+_SEARCH_ATTEMPTS = 3          # searches redone when another process compacts between scoring and lookup
+
+QUANTIZATIONS = ("none", "int8", "binary")
+
+
+def int8_codes(matrix: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector scalar quantization: x ~= codes * scale."""
+    scales = np.abs(matrix).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+    codes = np.rint(matrix / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def binary_codes(matrix: np.ndarray) -> np.ndarray:
+    """Sign bits, padded to whole 64-bit words so Hamming distance runs on uint64."""
+    bits = np.packbits(matrix > 0, axis=1)
+    pad = -bits.shape[1] % 8
+    return np.pad(bits, ((0, 0), (0, pad))) if pad else bits
+
+
+class _Snapshot:
+    """Read-only maps of one generation of the index files."""
+
+    def __init__(self, key: tuple, arrays: dict[str, np.ndarray], rows: int):
+        self.key = key
+        self.arrays = arrays
+        self.rows = rows
+
+
+class LocalVectorStore:
+    """
+    In-process brute-force vector index.
+
+    Vectors live in a contiguous (capacity x dim) matrix file mapped with
+    np.memmap, next to float32 squared norms and a uint8 alive mask; ids,
+    documents and metadata live in SQLite. Appends fill free rows at the end,
+    deletes only clear the alive flag, and once dead rows exceed compact_ratio
+    the live rows are copied into a new file generation.
+
+    With quantization="int8" (1 byte per dimension) or "binary" (1 bit), a
+    compressed copy of every vector is kept next to the full matrix. Searches
+    scan only the compressed copy, keep top_k * oversample candidates and
+    re-rank those with the full-precision rows, so the full matrix is read
+    from disk for a handful of rows per query instead of staying resident.
+
+    Several processes can share the directory: writers serialize on SQLite's
+    write lock (BEGIN IMMEDIATE) and readers remap when the committed
+    generation, capacity or row count changes. Row data is written and marked
+    alive before the transaction commits, so a row is never searchable
+    without its metadata being about to appear (hits without metadata are
+    dropped).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        dtype: str = "float32",
+        compact_ratio: float = 0.25,
+        quantization: str = "none",
+        oversample: int = 4,
+    ):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.dtype("float32"), np.dtype("float16")):
+            raise RuntimeError(f"LOCAL_VECTOR_DTYPE must be float32 or float16, got {dtype}")
+        if quantization not in QUANTIZATIONS:
+            raise RuntimeError(f"LOCAL_VECTOR_QUANTIZATION must be one of {', '.join(QUANTIZATIONS)}, got {quantization}")
+        self.compact_ratio = compact_ratio
+        self.quantization = quantization
+        self.oversample = max(1, oversample)
+        self.latency = LatencyCounters()
+        self.compactions = 0
+        self._lock = threading.RLock()
+        self._snapshot: _Snapshot | None = None
+
+        self._conn = sqlite3.connect(
+            self.path / "index.sqlite3", timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "row INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, post_id TEXT NOT NULL, "
+            "document TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_post_id ON chunks(post_id)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._write(self._requantize_if_changed)
+
+    # --- state / files ---------------------------------------------------
+
+    def _state(self) -> dict[str, Any]:
+        state = {
+            "dim": 0, "dtype": self.dtype.name, "quantization": "none",
+            "generation": 0, "capacity": 0, "rows": 0, "dead": 0,
+        }
+        for key, value in self._conn.execute("SELECT key, value FROM state"):
+            state[key] = value if key in ("dtype", "quantization") else int(value)
+        if state["dim"] and state["dtype"] != self.dtype.name:
+            raise RuntimeError(f"{self.path} stores {state['dtype']} vectors, LOCAL_VECTOR_DTYPE is {self.dtype.name}")
+        return state
+
+    def _save_state(self, **values: Any) -> None:
+        self._conn.executemany(
+            "INSERT INTO state(key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            [(k, str(v)) for k, v in values.items()],
+        )
+
+    def _layout(self, state: dict[str, Any]) -> dict[str, tuple[np.dtype, tuple[int, ...]]]:
+        """dtype and per-row shape of every array file for the state's quantization."""
+        dim = state["dim"]
+        layout = {
+            "vectors": (self.dtype, (dim,)),
+            "norms": (np.dtype(np.float32), ()),
+            "alive": (np.dtype(np.uint8), ()),
+        }
+        if state["quantization"] == "int8":
+            layout["codes"] = (np.dtype(np.int8), (dim,))
+            layout["scales"] = (np.dtype(np.float32), ())
+        elif state["quantization"] == "binary":
+            layout["codes"] = (np.dtype(np.uint8), ((dim + 63) // 64 * 8,))
+        return layout
+
+    def _file(self, name: str, generation: int) -> Path:
+        return self.path / f"{name}-{generation}.bin"
+
+    def _ensure_files(self, state: dict[str, Any]) -> None:
+        for name, (dtype, shape) in self._layout(state).items():
+            size = state["capacity"] * int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+            with open(self._file(name, state["generation"]), "ab") as f:
+                if f.tell() < size:
+                    f.truncate(size)
+
+    def _map(self, state: dict[str, Any], mode: str) -> dict[str, np.ndarray]:
+        return {
+            name: np.memmap(self._file(name, state["generation"]), dtype=dtype, mode=mode, shape=(state["capacity"], *shape))
+            for name, (dtype, shape) in self._layout(state).items()
+        }
+
+    def _write_codes(self, state: dict[str, Any], arrays: dict[str, np.ndarray], start: int, matrix: np.ndarray) -> None:
+        end = start + len(matrix)
+        if state["quantization"] == "int8":
+            arrays["codes"][start:end], arrays["scales"][start:end] = int8_codes(matrix)
+        elif state["quantization"] == "binary":
+            arrays["codes"][start:end] = binary_codes(matrix)
+
+    def _requantize_if_changed(self, state: dict[str, Any]) -> None:
+        if state["quantization"] == self.quantization:
+            return
+        for name in ("codes", "scales"):  # "codes" changes shape between modes
+            self._remove(self._file(name, state["generation"]))
+        state["quantization"] = self.quantization
+        if state["capacity"]:
+            with self.latency.time("quantize"):
+                self._ensure_files(state)
+                arrays = self._map(state, "r+")
+                for start in range(0, state["rows"], _SCORE_BLOCK_ROWS):
+                    block = np.asarray(arrays["vectors"][start:start + _SCORE_BLOCK_ROWS], dtype=np.float32)
+                    self._write_codes(state, arrays, start, block)
+                for arr in arrays.values():
+                    arr.flush()
+        self._save_state(quantization=self.quantization)
+        self._snapshot = None
+
+    @staticmethod
+    def _remove(file: Path) -> None:
+        try:
+            os.remove(file)
+        except OSError:
+            pass
+
+    def _read_snapshot(self) -> _Snapshot | None:
+        with self._lock:
+            state = self._state()
+            if not state["capacity"]:
+                return None
+            key = (state["generation"], state["capacity"], state["quantization"])
+            snap = self._snapshot
+            if snap is None or snap.key != key:
+                snap = self._snapshot = _Snapshot(key, self._map(state, "r"), state["rows"])
+            else:
+                snap.rows = state["rows"]
+            return snap
+
+    # --- writes ----------------------------------------------------------
+
+    def _write(self, fn) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                fn(self._state())
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _append(self, state: dict[str, Any], rows: list[tuple[str, str, str, dict]], embeddings: list[list[float]]) -> None:
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim != 2 or matrix.shape[0] != len(rows):
+            raise RuntimeError(f"Got {matrix.shape[0] if matrix.ndim else 0} embeddings for {len(rows)} chunks")
+        dim = state["dim"] or matrix.shape[1]
+        if matrix.shape[1] != dim:
+            raise RuntimeError(f"Embedding size {matrix.shape[1]} does not match the index ({dim})")
+
+        start = state["rows"]
+        capacity = state["capacity"]
+        if start + len(rows) > capacity:
+            capacity = max(_INITIAL_CAPACITY, capacity * 2, start + len(rows))
+        state.update(dim=dim, capacity=capacity)
+        self._ensure_files(state)
+
+        arrays = self._map(state, "r+")
+        end = start + len(rows)
+        arrays["vectors"][start:end] = matrix
+        stored = arrays["vectors"][start:end].astype(np.float32)  # norms of what is stored (float16 rounding)
+        arrays["norms"][start:end] = np.einsum("ij,ij->i", stored, stored)
+        self._write_codes(state, arrays, start, stored)
+        for name, arr in arrays.items():
+            if name != "alive":
+                arr.flush()
+        arrays["alive"][start:end] = 1
+        arrays["alive"].flush()
+
+        self._conn.executemany(
+            "INSERT INTO chunks(row, id, post_id, document, metadata) VALUES (?, ?, ?, ?, ?)",
+            [(start + i, chunk_id, post_id, document, json.dumps(meta, ensure_ascii=False))
+             for i, (chunk_id, post_id, document, meta) in enumerate(rows)],
+        )
+        self._save_state(dim=dim, dtype=self.dtype.name, capacity=capacity, rows=end)
+        state["rows"] = end
+
+    def _delete(self, state: dict[str, Any], ids: list[str]) -> None:
+        placeholders = ",".join("?" * len(ids))
+        rows = [r for (r,) in self._conn.execute(f"SELECT row FROM chunks WHERE id IN ({placeholders})", ids)]
+        if not rows:
+            return
+        alive = self._map(state, "r+")["alive"]
+        alive[rows] = 0
+        alive.flush()
+        self._conn.execute(f"DELETE FROM chunks WHERE id IN ({placeholders})", ids)
+        state["dead"] += len(rows)
+        self._save_state(dead=state["dead"])
+
+    def _compact(self, state: dict[str, Any]) -> None:
+        """Copy live rows into a new generation; row numbers only ever move down."""
+        live = np.fromiter((r for (r,) in self._conn.execute("SELECT row FROM chunks ORDER BY row")), dtype=np.int64)
+        old_generation = state["generation"]
+        new_state = {**state, "generation": old_generation + 1, "capacity": max(_INITIAL_CAPACITY, len(live) * 2)}
+        self._ensure_files(new_state)
+
+        src = self._map(state, "r")
+        dst = self._map(new_state, "r+")
+        for start in range(0, len(live), _SCORE_BLOCK_ROWS):
+            block = live[start:start + _SCORE_BLOCK_ROWS]
+            for name in dst:
+                if name != "alive":
+                    dst[name][start:start + len(block)] = src[name][block]
+        dst["alive"][:len(live)] = 1
+        for arr in dst.values():
+            arr.flush()
+
+        self._conn.executemany(
+            "UPDATE chunks SET row = ? WHERE row = ?",
+            [(new, int(old)) for new, old in enumerate(live) if new != old],
+        )
+        self._save_state(generation=new_state["generation"], capacity=new_state["capacity"], rows=len(live), dead=0)
+        state.update(new_state, rows=len(live), dead=0)
+        self.compactions += 1
+
+        # Readers still mapping the old files keep them alive until they remap (POSIX).
+        for name in self._layout(state):
+            self._remove(self._file(name, old_generation))
+
+    def _maybe_compact(self, state: dict[str, Any]) -> None:
+        if state["rows"] >= _MIN_COMPACT_ROWS and state["dead"] > self.compact_ratio * state["rows"]:
+            with self.latency.time("compact"):
+                self._compact(state)
+
+    def compact(self) -> None:
+        self._write(lambda state: self._compact(state) if state["capacity"] else None)
+
+    # --- VectorStore -----------------------------------------------------
+
+    def diff_post_chunks(self, *, post_id: int, chunks: list[str]) -> ChunkDiff:
+        with self.latency.time("get"), self._lock:
+            rows = self._conn.execute("SELECT id, metadata FROM chunks WHERE post_id = ?", (str(post_id),)).fetchall()
+        return diff_chunks(post_id, chunks, {chunk_id: json.loads(meta) for chunk_id, meta in rows})
+
+    def apply_chunk_diff(
+        self,
+        diff: ChunkDiff,
+        *,
+        title: str | None,
+        url: str | None,
+        modified_gmt: str | None,
+        chunks: list[str],
+        embeddings: list[list[float]],
+    ) -> None:
+        if len(embeddings) != len(diff.added):
+            raise RuntimeError(f"Got {len(embeddings)} embeddings for {len(diff.added)} added chunks")
+        stale_ids, stale_metadatas = stale_metadata(diff, title=title, url=url, modified_gmt=modified_gmt)
+        if not (diff.removed or diff.added or stale_ids):
+            return
+
+        def write(state: dict[str, Any]) -> None:
+            if diff.removed:
+                self._delete(state, diff.removed)
+            if diff.added:
+                rows = [
+                    (diff.ids[i], str(diff.post_id), chunks[i], chunk_metadata(diff.post_id, title, url, modified_gmt, i))
+                    for i in diff.added
+                ]
+                self._append(state, rows, embeddings)
+            if stale_ids:
+                self._conn.executemany(
+                    "UPDATE chunks SET metadata = ? WHERE id = ?",
+                    [(json.dumps(m, ensure_ascii=False), i) for i, m in zip(stale_ids, stale_metadatas)],
+                )
+            self._maybe_compact(state)
+
+        with self.latency.time("write"):
+            self._write(write)
+
+    def upsert_post_chunks(
+        self,
+        *,
+        post_id: int,
+        title: str | None,
+        url: str | None,
+        modified_gmt: str | None,
+        chunks: list[str],
+        embeddings: list[list[float]],
+    ) -> ChunkDiff:
+        diff = self.diff_post_chunks(post_id=post_id, chunks=chunks)
+        self.apply_chunk_diff(
+            diff,
+            title=title,
+            url=url,
+            modified_gmt=modified_gmt,
+            chunks=chunks,
+            embeddings=[embeddings[i] for i in diff.added],
+        )
+        return diff
+
+    def _exact_distances(self, snap: _Snapshot, query: np.ndarray, start: int, end: int, out: np.ndarray) -> None:
+        vectors, norms = snap.arrays["vectors"], snap.arrays["norms"]
+        for lo in range(start, end, _SCORE_BLOCK_ROWS):
+            hi = min(end, lo + _SCORE_BLOCK_ROWS)
+            block = vectors[lo:hi]
+            if block.dtype != np.float32:
+                block = block.astype(np.float32)
+            # |x - q|^2 - |q|^2 = |x|^2 - 2 x.q
+            np.subtract(norms[lo:hi], 2.0 * (block @ query), out=out[lo - start:hi - start])
+
+    def _approx_distances(self, snap: _Snapshot, query: np.ndarray, n: int) -> np.ndarray:
+        """First-pass scores from the compressed copy; only their order matters."""
+        codes = snap.arrays["codes"]
+        if snap.key[2] == "binary":
+            q = binary_codes(query[None, :])[0].view(np.uint64)
+            words = codes[:n].view(np.uint64)
+            dist = np.empty(n, dtype=np.float32)
+            for lo in range(0, n, _SCORE_BLOCK_ROWS):
+                hi = min(n, lo + _SCORE_BLOCK_ROWS)
+                dist[lo:hi] = np.bitwise_count(words[lo:hi] ^ q).sum(axis=1, dtype=np.uint32)
+            return dist
+
+        dots = np.empty(n, dtype=np.float32)
+        buf = np.empty((min(n, _CODE_BLOCK_ROWS), codes.shape[1]), dtype=np.float32)
+        for lo in range(0, n, _CODE_BLOCK_ROWS):
+            hi = min(n, lo + _CODE_BLOCK_ROWS)
+            block = buf[:hi - lo]
+            np.copyto(block, codes[lo:hi], casting="unsafe")
+            np.matmul(block, query, out=dots[lo:hi])
+        dots *= snap.arrays["scales"][:n]
+        return snap.arrays["norms"][:n] - 2.0 * dots
+
+    @staticmethod
+    def _top(dist: np.ndarray, k: int) -> np.ndarray:
+        k = min(k, len(dist))
+        top = np.argpartition(dist, k - 1)[:k] if k < len(dist) else np.arange(len(dist))
+        top = top[np.argsort(dist[top], kind="stable")]
+        return top[np.isfinite(dist[top])]
+
+    def _nearest_rows(self, snap: _Snapshot, query: np.ndarray, top_k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Rows and squared L2 distances of the top_k closest live vectors."""
+        n = snap.rows
+        dead = snap.arrays["alive"][:n] == 0
+        q_norm = float(query @ query)
+
+        if snap.key[2] == "none":
+            dist = np.empty(n, dtype=np.float32)
+            self._exact_distances(snap, query, 0, n, dist)
+            dist[dead] = np.inf
+            top = self._top(dist, top_k)
+            return top, dist[top] + q_norm
+
+        approx = self._approx_distances(snap, query, n)
+        approx[dead] = np.inf
+        candidates = np.sort(self._top(approx, top_k * self.oversample))  # sorted rows read the memmap in order
+        if not len(candidates):
+            return candidates, np.empty(0, dtype=np.float32)
+        full = snap.arrays["vectors"][candidates].astype(np.float32)
+        dist = snap.arrays["norms"][candidates] - 2.0 * (full @ query)
+        top = self._top(dist, top_k)
+        return candidates[top], dist[top] + q_norm
+
+    def _nearest_rows_many(self, snap: _Snapshot, queries: np.ndarray, top_k: int) -> list[tuple[np.ndarray, np.ndarray]]:
+        """_nearest_rows for several queries in one pass over the matrix (exact search only)."""
+        n, nq = snap.rows, len(queries)
+        vectors, norms = snap.arrays["vectors"], snap.arrays["norms"]
+        dead = snap.arrays["alive"][:n] == 0
+        qt = np.ascontiguousarray(queries.T)
+        best_rows = np.empty((nq, 0), dtype=np.int64)
+        best_dist = np.empty((nq, 0), dtype=np.float32)
+        for lo in range(0, n, _SCORE_BLOCK_ROWS):
+            hi = min(n, lo + _SCORE_BLOCK_ROWS)
+            block = vectors[lo:hi]
+            if block.dtype != np.float32:
+                block = block.astype(np.float32)
+            dist = norms[lo:hi, None] - 2.0 * (block @ qt)      # (rows, queries)
+            dist[dead[lo:hi]] = np.inf
+            k = min(top_k, hi - lo)
+            part = np.argpartition(dist, k - 1, axis=0)[:k]
+            best_rows = np.concatenate([best_rows, (part + lo).T], axis=1)
+            best_dist = np.concatenate([best_dist, np.take_along_axis(dist, part, axis=0).T], axis=1)
+            if best_rows.shape[1] > top_k:
+                keep = np.argpartition(best_dist, top_k - 1, axis=1)[:, :top_k]
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+                best_dist = np.take_along_axis(best_dist, keep, axis=1)
+
+        q_norms = np.einsum("ij,ij->i", queries, queries)
+        out = []
+        for rows, dist, q_norm in zip(best_rows, best_dist, q_norms):
+            order = np.argsort(dist, kind="stable")
+            order = order[np.isfinite(dist[order])]
+            out.append((rows[order], dist[order] + q_norm))
+        return out
+
+    def _lookup(self, rows: list[int], generation: int) -> dict[int, tuple[str, str, str]] | None:
+        """
+        Chunks at these rows of `generation`, or None when a compaction has
+        renumbered the rows since (the generation check and the read share
+        one SQLite snapshot).
+        """
+        if not rows:
+            return {}
+        placeholders = ",".join("?" * len(rows))
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                current = self._conn.execute("SELECT value FROM state WHERE key = 'generation'").fetchone()
+                if int(current[0] if current else 0) != generation:
+                    return None
+                return {
+                    row: (chunk_id, document, metadata)
+                    for row, chunk_id, document, metadata in self._conn.execute(
+                        f"SELECT row, id, document, metadata FROM chunks WHERE row IN ({placeholders})", rows
+                    )
+                }
+            finally:
+                self._conn.execute("COMMIT")
+
+    @staticmethod
+    def _hits(rows: np.ndarray, distances: np.ndarray, found: dict[int, tuple[str, str, str]]) -> list[dict]:
+        hits = []
+        for row, distance in zip(rows.tolist(), distances.tolist()):
+            if row in found:
+                chunk_id, document, metadata = found[row]
+                hits.append({"id": chunk_id, "text": document, "meta": json.loads(metadata), "distance": max(0.0, distance)})
+        return hits
+
+    def search_similar(self, *, query_embedding: list[float], top_k: int) -> list[dict]:
+        return self.search_similar_many(query_embeddings=[query_embedding], top_k=top_k)[0]
+
+    async def search_similar_async(self, *, query_embedding: list[float], top_k: int) -> list[dict]:
+        # numpy releases the GIL in the matmul, so a worker thread keeps the event loop free
+        return await asyncio.to_thread(self.search_similar, query_embedding=query_embedding, top_k=top_k)
+
+    def search_similar_many(self, *, query_embeddings: list[list[float]], top_k: int) -> list[list[dict]]:
+        with self.latency.time("query" if len(query_embeddings) == 1 else "query_many"):
+            for _ in range(_SEARCH_ATTEMPTS):
+                snap = self._read_snapshot()
+                if snap is None or not snap.rows or top_k <= 0 or not len(query_embeddings):
+                    return [[] for _ in query_embeddings]
+                queries = np.asarray(query_embeddings, dtype=np.float32)
+                if len(queries) == 1 or snap.key[2] != "none":
+                    nearest = [self._nearest_rows(snap, q, top_k) for q in queries]
+                else:
+                    nearest = self._nearest_rows_many(snap, queries, top_k)
+                found = self._lookup(sorted({int(r) for rows, _ in nearest for r in rows}), snap.key[0])
+                if found is not None:
+                    return [self._hits(rows, distances, found) for rows, distances in nearest]
+            raise RuntimeError(f"{self.path} was compacted during {_SEARCH_ATTEMPTS} searches in a row")
+
+    async def search_similar_many_async(self, *, query_embeddings: list[list[float]], top_k: int) -> list[list[dict]]:
+        return await asyncio.to_thread(self.search_similar_many, query_embeddings=query_embeddings, top_k=top_k)
+
+    def iter_chunks(self, batch_size: int = 1000) -> Iterator[list[dict]]:
+        last = -1
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT row, id, document, metadata FROM chunks WHERE row > ? ORDER BY row LIMIT ?", (last, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            yield [{"id": chunk_id, "text": document, "meta": json.loads(metadata)} for _, chunk_id, document, metadata in rows]
+            last = rows[-1][0]
+
+    def _scan_bytes(self, state: dict[str, Any]) -> int:
+        """Bytes a query scans (and that should stay resident): the codes when quantized, else the matrix."""
+        layout = self._layout(state)
+        names = ["norms", "alive"] + (["vectors"] if state["quantization"] == "none" else ["codes", "scales"])
+        return sum(
+            state["capacity"] * int(np.prod(layout[name][1], dtype=np.int64)) * layout[name][0].itemsize
+            for name in names if name in layout
+        )
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            state = self._state()
+        return {
+            "backend": "local",
+            "path": str(self.path),
+            "dtype": self.dtype.name,
+            "quantization": state["quantization"],
+            "oversample": self.oversample,
+            "dim": state["dim"],
+            "rows": state["rows"],
+            "live_rows": state["rows"] - state["dead"],
+            "dead_rows": state["dead"],
+            "capacity": state["capacity"],
+            "generation": state["generation"],
+            "matrix_bytes": state["capacity"] * state["dim"] * self.dtype.itemsize,
+            "scan_bytes": self._scan_bytes(state),
+            "compactions": self.compactions,
+            "operations": self.latency.snapshot(),
+        }
@@ -1,4 +1,153 @@
-def build_rag_prompt(*, question: str, chunks: list[dict], language: str = "English") -> str:
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+
+from app.core.config import settings
+from app.rag.tokens import estimate_tokens
+
+_MIN_OVERLAP_CHARS = 4      # sentence overlap can be one short sentence ("End …")
+_GAP = "\n...\n"            # between non-adjacent chunks of one post
+_TERMINALS = ".!?؟…"        # what chunking._SENTENCE ends a sentence on
+_CLOSERS = "\"'»”)]"
+
+_stats_lock = threading.Lock()
+_stats: Counter = Counter()
+
+
+def _starts_sentence(text: str, i: int) -> bool:
+    if i == 0:
+        return True
+    if not text[i - 1].isspace():
+        return False
+    before = text[:i].rstrip()
+    if not before or "\n" in text[len(before):i]:
+        return True
+    return before.rstrip(_CLOSERS)[-1:] in tuple(_TERMINALS)
+
+
+def overlap_length(a: str, b: str, *, min_chars: int = _MIN_OVERLAP_CHARS, sentences: bool = False) -> int:
+    """
+    Length of the longest suffix of `a` that is also a prefix of `b`, or 0.
+    Shorter matches than min_chars don't count; with `sentences` the match
+    must also start a sentence in `a` and end at whitespace in `b`.
+    """
+    if min_chars <= 0:
+        return 0
+    probe = b[:min_chars]
+    if len(probe) < min_chars:
+        return 0
+    i = a.find(probe, max(0, len(a) - len(b)))
+    while i != -1:
+        ov = len(a) - i
+        if b.startswith(a[i:]) and (
+            not sentences or (_starts_sentence(a, i) and (ov == len(b) or b[ov].isspace()))
+        ):
+            return ov
+        i = a.find(probe, i + 1)
+    return 0
+
+
+def _chunk_overlap() -> dict:
+    """overlap_length() arguments matching how chunk_text() overlaps chunks; min_chars 0 when it doesn't."""
+    if settings.CHUNK_STRATEGY == "chars":
+        overlap = max(0, min(settings.CHUNK_OVERLAP, max(200, settings.CHUNK_SIZE) - 50))
+        # strip() can shave whitespace off either end of the repeated slice
+        return {"min_chars": overlap // 2, "sentences": False}
+    # the token strategy repeats whole sentences, which can be short
+    return {"min_chars": _MIN_OVERLAP_CHARS if settings.CHUNK_OVERLAP_TOKENS > 0 else 0, "sentences": True}
+
+
+@dataclass
+class _PostContext:
+    title: str
+    url: str
+    chunks: dict[int, str] = field(default_factory=dict)   # chunk_index -> text
+
+    def body(self) -> str:
+        """Selected chunks in document order; adjacent ones merged with their overlap removed."""
+        parts: list[str] = []
+        prev_index, prev_text = None, ""
+        rule = _chunk_overlap()
+        for index in sorted(self.chunks):
+            text = self.chunks[index].strip()
+            if prev_index is not None and index == prev_index + 1:
+                ov = overlap_length(prev_text, text, **rule)
+                parts.append(text[ov:] if ov else "\n" + text)
+            else:
+                parts.append((_GAP if parts else "") + text)
+            prev_index, prev_text = index, text
+        return "".join(parts)
+
+    def render(self, n: int) -> str:
+        return f"\n[{n}] Title: {self.title}\nURL: {self.url}\nSnippet:\n{self.body()}"
+
+
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int
+    raw_tokens: int        # what one header + full text per chunk would have cost
+    chunks_used: int
+    chunks_dropped: int
+    chunks: list[dict]     # the hits that made it in, best first
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.raw_tokens - self.tokens)
+
+
+def pack_context(chunks: list[dict], max_tokens: int) -> PackedContext:
+    """
+    Group hits (best first) under one header per post and add them while they
+    fit in max_tokens (0 = no limit); the best hit is always kept. Posts are
+    numbered in order of their best hit.
+    """
+    posts: dict[str, _PostContext] = {}
+    kept: list[dict] = []
+    used = dropped = 0
+    tokens = 0
+    for n, ch in enumerate(chunks):
+        meta = ch.get("meta", {}) or {}
+        text = ch.get("text", "") or ""
+        index = meta.get("chunk_index")
+        key = str(meta.get("post_id")) if meta.get("post_id") is not None and index is not None else f"hit:{n}"
+        post = posts.get(key) or _PostContext(title=meta.get("title", ""), url=meta.get("url", ""))
+        before = estimate_tokens(post.render(0)) if key in posts else 0
+        trial = _PostContext(post.title, post.url, {**post.chunks, int(index or 0): text})
+        cost = estimate_tokens(trial.render(0)) - before
+        if max_tokens and used and tokens + cost > max_tokens:
+            dropped += 1
+            continue
+        posts[key] = trial
+        kept.append(ch)
+        tokens += cost
+        used += 1
+
+    text = "\n".join(post.render(i) for i, post in enumerate(posts.values(), start=1))
+    raw = "\n".join(
+        f"\n[{i}] Title: {(ch.get('meta') or {}).get('title', '')}\nURL: {(ch.get('meta') or {}).get('url', '')}\nSnippet:\n{ch.get('text', '')}"
+        for i, ch in enumerate(chunks, start=1)
+    )
+    return PackedContext(
+        text=text,
+        tokens=estimate_tokens(text),
+        raw_tokens=estimate_tokens(raw),
+        chunks_used=used,
+        chunks_dropped=dropped,
+        chunks=kept,
+    )
+
+
+def build_rag_prompt(*, question: str, chunks: list[dict], language: str = "English") -> tuple[str, list[dict]]:
+    """The prompt and the chunks packed into it; cite only those, the rest didn't fit CONTEXT_MAX_TOKENS."""
+    context = pack_context(chunks, settings.CONTEXT_MAX_TOKENS)
+    with _stats_lock:
+        _stats["requests"] += 1
+        _stats["raw_tokens"] += context.raw_tokens
+        _stats["context_tokens"] += context.tokens
+        _stats["tokens_saved"] += context.tokens_saved
+        _stats["chunks_dropped"] += context.chunks_dropped
+
     lines: list[str] = []
     lines.append("You will answer the user's question using the provided context snippets.")
     lines.append("If the context does not contain the answer, say you don't know.")
@@ -7,10 +156,19 @@ def build_rag_prompt(*, question: str, chunks: list[dict], language: str = "Engl
     lines.append(question.strip())
     lines.append("")
     lines.append("Context snippets:")
-    for i, ch in enumerate(chunks, start=1):
-        meta = ch.get("meta", {}) or {}
-        title = meta.get("title", "")
-        url = meta.get("url", "")
-        lines.append(f"\n[{i}] Title: {title}\nURL: {url}\nSnippet:\n{ch.get('text','')}")
+    lines.append(context.text)
     lines.append(f"\nAnswer in {language}:")
-    return "\n".join(lines)
+    return "\n".join(lines), context.chunks
+
+
+def context_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    requests = stats.get("requests", 0)
+    raw = stats.get("raw_tokens", 0)
+    return {
+        **stats,
+        "max_tokens": settings.CONTEXT_MAX_TOKENS,
+        "tokens_saved_per_request": round(stats.get("tokens_saved", 0) / requests, 1) if requests else 0.0,
+        "saved_ratio": round(stats.get("tokens_saved", 0) / raw, 4) if raw else 0.0,
+    }
@@ -0,0 +1,144 @@
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+import redis
+
+from app.core.config import settings
+from app.core.redis_client import get_async_redis
+from app.rag.embeddings import embed_texts_async
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    text = unicodedata.normalize("NFKC", question or "")
+    # Zero-width non-joiner/joiner are spelling variants in Persian, not meaning
+    text = text.replace("\u200c", " ").replace("\u200d", "")
+    return _WHITESPACE.sub(" ", text).strip().casefold()
+
+
+class LRUCache:
+    """Thread-safe in-process LRU with per-entry TTL."""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._data: OrderedDict[str, tuple[float, list[float]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> list[float] | None:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: list[float]) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+_memory = LRUCache(settings.QUERY_EMBED_CACHE_MAX_SIZE, settings.QUERY_EMBED_CACHE_TTL_SECONDS)
+_redis_hits = 0
+_redis_errors = 0
+
+
+def _cache_key(normalized: str) -> str:
+    provider = settings.EMBEDDING_PROVIDER.lower()
+    model = settings.GEMINI_EMBEDDING_MODEL if provider == "gemini" else settings.OPENAI_EMBEDDING_MODEL
+    digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    return f"query_emb:{provider}:{model}:{settings.EMBEDDING_DIMENSIONS}:{digest}"
+
+
+async def embed_query_async(question: str) -> list[float]:
+    """Embedding of a chat question as typed, memoized in-process and in Redis under its normalized form."""
+    return (await embed_queries_async([question]))[0]
+
+
+async def embed_queries_async(questions: list[str]) -> list[list[float]]:
+    """
+    Embeddings of several questions: one Redis MGET for the ones missing from
+    memory and one provider request for the rest (duplicates embedded once).
+    """
+    global _redis_hits, _redis_errors
+    keys = [_cache_key(normalize_question(q)) for q in questions]
+    # the normalized form is only the cache key; the first spelling seen is what gets embedded
+    texts: dict[str, str] = {}
+    for key, q in zip(keys, questions):
+        texts.setdefault(key, q)
+
+    found: dict[str, list[float]] = {}
+    for key in texts:
+        vec = _memory.get(key)
+        if vec is not None:
+            found[key] = vec
+    missing = [key for key in texts if key not in found]
+    if not missing:
+        return [found[key] for key in keys]
+
+    r = get_async_redis()
+    try:
+        blobs = await r.mget(missing)
+    except (redis.RedisError, OSError) as e:
+        print(f"Query embedding cache lookup failed: {e}")
+        _redis_errors += 1
+        blobs = [None] * len(missing)
+    for key, blob in zip(missing, blobs):
+        if blob is not None:
+            _redis_hits += 1
+            found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            _memory.put(key, found[key])
+
+    missing = [key for key in missing if key not in found]
+    if missing:
+        vectors = await embed_texts_async([texts[key] for key in missing], use_cache=False)
+        for key, vec in zip(missing, vectors):
+            found[key] = vec
+            _memory.put(key, vec)
+        try:
+            pipe = r.pipeline()
+            for key, vec in zip(missing, vectors):
+                pipe.set(key, np.asarray(vec, dtype=np.float32).tobytes(), ex=settings.QUERY_EMBED_CACHE_TTL_SECONDS)
+            await pipe.execute()
+        except (redis.RedisError, OSError) as e:
+            print(f"Query embedding cache store failed: {e}")
+            _redis_errors += 1
+    return [found[key] for key in keys]
+
+
+def query_cache_stats() -> dict:
+    return {"memory": _memory.stats(), "redis_hits": _redis_hits, "redis_errors": _redis_errors}
@@ -0,0 +1,70 @@
+from collections import Counter
+
+from app.core.config import settings
+from app.rag.lexical import confidence, get_lexical_index, post_id_of, reciprocal_rank_fusion
+from app.rag.vector_store import search_similar_async, search_similar_many_async
+
+RETRIEVAL_MODES = ("vector", "hybrid")
+
+_paths: Counter = Counter()
+
+
+async def lexical_hits(question: str) -> list[dict]:
+    """BM25 hits of the question; empty in vector mode."""
+    mode = settings.RETRIEVAL_MODE
+    if mode not in RETRIEVAL_MODES:
+        raise RuntimeError(f"Unknown RETRIEVAL_MODE: {mode} (expected {' or '.join(RETRIEVAL_MODES)})")
+    if mode == "vector":
+        return []
+    return await get_lexical_index().search_async(question, settings.TOP_K)
+
+
+async def confident_lexical_hits(question: str, lexical: list[dict]) -> list[dict] | None:
+    """
+    The lexical hits if they are sure enough to answer without embedding the
+    question, else None. Always None until the index has been backfilled.
+    """
+    threshold = settings.LEXICAL_FAST_PATH_MIN_CONFIDENCE
+    # a runner-up can only lower the confidence, so look for one only when it could still pass
+    if not lexical or confidence(question, lexical) < threshold:
+        return None
+    if not await get_lexical_index().is_backfilled_async():
+        return None
+    top_post = post_id_of(lexical[0])
+    runner_up = None
+    if all(post_id_of(h) == top_post for h in lexical):
+        # one long post filled all TOP_K hits; the margin needs the best chunk of any other post
+        runner_up = await get_lexical_index().best_score_outside_async(question, top_post)
+    if confidence(question, lexical, runner_up) >= threshold:
+        _paths["lexical"] += 1
+        return lexical
+    return None
+
+
+def _fuse(hits: list[dict], lexical: list[dict]) -> list[dict]:
+    if not lexical:
+        _paths["vector"] += 1
+        return hits
+    _paths["hybrid"] += 1
+    return reciprocal_rank_fusion(hits, lexical, k=settings.HYBRID_RRF_K)
+
+
+async def vector_hits(query_embedding: list[float], lexical: list[dict]) -> list[dict]:
+    """Vector hits, fused with the lexical ones by reciprocal rank when there are any."""
+    hits = await search_similar_async(query_embedding=query_embedding, top_k=settings.TOP_K)
+    return _fuse(hits, lexical)
+
+
+async def vector_hits_many(query_embeddings: list[list[float]], lexicals: list[list[dict]]) -> list[list[dict]]:
+    """vector_hits for several questions with a single vector store query."""
+    results = await search_similar_many_async(query_embeddings=query_embeddings, top_k=settings.TOP_K)
+    return [_fuse(hits, lexical) for hits, lexical in zip(results, lexicals)]
+
+
+def retrieval_stats() -> dict:
+    total = sum(_paths.values())
+    return {
+        "mode": settings.RETRIEVAL_MODE,
+        "paths": dict(_paths),
+        "lexical_fast_path_ratio": round(_paths["lexical"] / total, 4) if total else 0.0,
+    }
@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import json
+import uuid
+from collections import Counter
+from typing import Any, Awaitable, Callable
+
+import redis
+
+from app.core.config import settings
+from app.core.redis_client import get_async_redis
+
+# Delete / extend the lock only if this leader still owns it (it may have expired and been re-taken)
+_RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+_REFRESH = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) end return 0"
+_FAILED = "-"   # published instead of a result when the leader failed; followers then run themselves
+
+
+def flight_key(*parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Runs one execution per key at a time and hands its (JSON-serializable)
+    result to every concurrent caller.
+
+    Inside a process, callers share an asyncio task, so a caller that goes
+    away does not cancel the others. Across processes, the first one to take
+    a Redis lock runs the work and publishes the result on a channel (and
+    keeps it for result_ttl seconds for late subscribers); the others wait
+    for it and run the work themselves if the leader fails, times out or
+    Redis is unavailable.
+
+    The lock lives lock_ttl seconds and the leader keeps extending it while
+    it works, so followers notice a leader whose process died within
+    lock_ttl instead of waiting out wait_seconds.
+    """
+
+    def __init__(self, prefix: str, *, lock_ttl: float, wait_seconds: float, result_ttl: float):
+        self.prefix = prefix
+        self.lock_ttl = lock_ttl
+        self.wait_seconds = wait_seconds
+        self.result_ttl = result_ttl
+        self.counts: Counter = Counter()
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[dict]]) -> dict:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._run(key, fn))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.counts["local_followers"] += 1
+        return await asyncio.shield(task)
+
+    def _done(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here in case every caller went away
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[dict]]) -> dict:
+        r = get_async_redis()
+        lock_key, result_key, channel = (f"{self.prefix}:{part}:{key}" for part in ("lock", "result", "done"))
+        token = uuid.uuid4().hex
+        try:
+            blob = await r.get(result_key)
+            if blob is not None:
+                self.counts["redis_followers"] += 1
+                return json.loads(blob)
+            leader = await r.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000))
+        except (redis.RedisError, OSError) as e:
+            print(f"Single-flight lock failed, running locally: {e}")
+            self.counts["redis_errors"] += 1
+            self.counts["leaders"] += 1
+            return await fn()
+
+        if not leader:
+            result = await self._wait(r, lock_key, result_key, channel)
+            if result is not None:
+                self.counts["redis_followers"] += 1
+                return result
+            self.counts["fallbacks"] += 1
+            return await fn()
+
+        self.counts["leaders"] += 1
+        payload = _FAILED
+        heartbeat = asyncio.create_task(self._heartbeat(r, lock_key, token))
+        try:
+            result = await fn()
+            payload = json.dumps(result, ensure_ascii=False)
+            return result
+        finally:
+            heartbeat.cancel()
+            try:
+                pipe = r.pipeline(transaction=False)
+                if payload != _FAILED:
+                    pipe.set(result_key, payload, px=int(self.result_ttl * 1000))
+                pipe.publish(channel, payload)
+                pipe.eval(_RELEASE, 1, lock_key, token)
+                await pipe.execute()
+            except (redis.RedisError, OSError) as e:
+                print(f"Single-flight publish failed: {e}")
+                self.counts["redis_errors"] += 1
+
+    async def _heartbeat(self, r, lock_key: str, token: str) -> None:
+        while True:
+            await asyncio.sleep(self.lock_ttl / 3)
+            try:
+                await r.eval(_REFRESH, 1, lock_key, token, int(self.lock_ttl * 1000))
+            except (redis.RedisError, OSError) as e:
+                print(f"Single-flight lock refresh failed: {e}")
+                self.counts["redis_errors"] += 1
+
+    async def _wait(self, r, lock_key: str, result_key: str, channel: str) -> dict | None:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait_seconds
+        pubsub = r.pubsub()
+        try:
+            await pubsub.subscribe(channel)
+            # the leader may have finished between our lock attempt and the subscribe
+            blob = await r.get(result_key)
+            while blob is None:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return None
+                msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=min(remaining, 1.0))
+                if msg is not None:
+                    blob = msg["data"]
+                elif not await r.exists(lock_key):
+                    # released (result published just before) or expired because the leader died
+                    blob = await r.get(result_key)
+                    if blob is None:
+                        self.counts["abandoned"] += 1
+                        return None
+            blob = blob.decode("utf-8") if isinstance(blob, bytes) else blob
+            return None if blob == _FAILED else json.loads(blob)
+        except (redis.RedisError, OSError) as e:
+            print(f"Single-flight wait failed: {e}")
+            self.counts["redis_errors"] += 1
+            return None
+        finally:
+            try:
+                await pubsub.unsubscribe(channel)
+                await pubsub.aclose()
+            except (redis.RedisError, OSError):
+                pass
+
+    def stats(self) -> dict:
+        counts = dict(self.counts)
+        collapsed = counts.get("local_followers", 0) + counts.get("redis_followers", 0)
+        return {**counts, "in_flight": len(self._inflight), "collapsed_calls": collapsed}
+
+
+chat_flights = SingleFlight(
+    "chat_sf",
+    lock_ttl=settings.CHAT_COALESCE_LOCK_TTL_SECONDS,
+    wait_seconds=settings.CHAT_COALESCE_WAIT_SECONDS or settings.LLM_TIMEOUT + 30,
+    result_ttl=settings.CHAT_COALESCE_RESULT_TTL_SECONDS,
+)
@@ -0,0 +1,6 @@
+def estimate_tokens(text: str) -> int:
+    # ~4 bytes of UTF-8 per token holds up for both English and Persian text
+    # (Persian letters are 2 bytes each and tokenize at roughly 2 chars/token).
+    if not text:
+        return 0
+    return (len(text.encode("utf-8")) + 3) // 4
@@ -0,0 +1,232 @@
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Protocol
+
+from app.core.config import settings
+
+
+def chunk_ids(post_id: int, chunks: list[str]) -> list[str]:
+    """Content-derived ids: an unchanged chunk keeps its id wherever it moves in the post."""
+    ids = []
+    seen: dict[str, int] = {}
+    for chunk in chunks:
+        digest = hashlib.sha256(chunk.strip().encode("utf-8")).hexdigest()[:16]
+        n = seen.get(digest, 0)
+        seen[digest] = n + 1
+        ids.append(f"{post_id}:{digest}" if n == 0 else f"{post_id}:{digest}:{n}")
+    return ids
+
+
+def chunk_metadata(post_id: int, title: str | None, url: str | None, modified_gmt: str | None, index: int) -> dict:
+    return {
+        "post_id": str(post_id),
+        "title": (title or "")[:500],
+        "url": (url or "")[:2000],
+        "modified_gmt": (modified_gmt or "")[:64],
+        "chunk_index": index,
+    }
+
+
+@dataclass
+class ChunkDiff:
+    """Old vs new chunk set of one post. `added`/`kept` index into the new chunk list."""
+    post_id: int
+    ids: list[str]
+    added: list[int] = field(default_factory=list)
+    kept: list[int] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    existing_metadata: dict[str, dict] = field(default_factory=dict)
+
+
+def diff_chunks(post_id: int, chunks: list[str], existing: dict[str, dict]) -> ChunkDiff:
+    """`existing` maps the stored chunk ids of the post to their metadata."""
+    ids = chunk_ids(post_id, chunks)
+    diff = ChunkDiff(post_id=post_id, ids=ids, existing_metadata=existing)
+    for i, chunk_id in enumerate(ids):
+        (diff.kept if chunk_id in existing else diff.added).append(i)
+    new_ids = set(ids)
+    diff.removed = [chunk_id for chunk_id in existing if chunk_id not in new_ids]
+    return diff
+
+
+def stale_metadata(diff: ChunkDiff, *, title: str | None, url: str | None, modified_gmt: str | None) -> tuple[list[str], list[dict]]:
+    """Ids and fresh metadata of kept chunks whose stored metadata changed."""
+    ids, metadatas = [], []
+    for i in diff.kept:
+        meta = chunk_metadata(diff.post_id, title, url, modified_gmt, i)
+        if diff.existing_metadata.get(diff.ids[i]) != meta:
+            ids.append(diff.ids[i])
+            metadatas.append(meta)
+    return ids, metadatas
+
+
+class VectorStore(Protocol):
+    """
+    What ingest and chat need from a vector backend. Hits are dicts with
+    id, text, meta and distance (squared L2, smaller is closer).
+    """
+
+    def diff_post_chunks(self, *, post_id: int, chunks: list[str]) -> ChunkDiff: ...
+
+    def apply_chunk_diff(
+        self,
+        diff: ChunkDiff,
+        *,
+        title: str | None,
+        url: str | None,
+        modified_gmt: str | None,
+        chunks: list[str],
+        embeddings: list[list[float]],
+    ) -> None: ...
+
+    def upsert_post_chunks(
+        self,
+        *,
+        post_id: int,
+        title: str | None,
+        url: str | None,
+        modified_gmt: str | None,
+        chunks: list[str],
+        embeddings: list[list[float]],
+    ) -> ChunkDiff: ...
+
+    def search_similar(self, *, query_embedding: list[float], top_k: int) -> list[dict]: ...
+
+    async def search_similar_async(self, *, query_embedding: list[float], top_k: int) -> list[dict]: ...
+
+    def search_similar_many(self, *, query_embeddings: list[list[float]], top_k: int) -> list[list[dict]]:
+        """One hit list per query embedding, from a single backend call."""
+        ...
+
+    async def search_similar_many_async(self, *, query_embeddings: list[list[float]], top_k: int) -> list[list[dict]]: ...
+
+    def iter_chunks(self, batch_size: int = 1000) -> Iterator[list[dict]]:
+        """Every stored chunk as {id, text, meta}, in batches."""
+        ...
+
+    def stats(self) -> dict[str, Any]: ...
+
+
+class LexicallyIndexedStore:
+    """Vector store wrapper that mirrors every chunk write into the lexical index."""
+
+    def __init__(self, store: VectorStore, index):
+        self.store = store
+        self.index = index
+
+    def diff_post_chunks(self, *, post_id: int, chunks: list[str]) -> ChunkDiff:
+        return self.store.diff_post_chunks(post_id=post_id, chunks=chunks)
+
+    def apply_chunk_diff(
+        self,
+        diff: ChunkDiff,
+        *,
+        title: str | None,
+        url: str | None,
+        modified_gmt: str | None,
+        chunks: list[str],
+        embeddings: list[list[float]],
+    ) -> None:
+        self.store.apply_chunk_diff(
+            diff, title=title, url=url, modified_gmt=modified_gmt, chunks=chunks, embeddings=embeddings
+        )
+        self.index.apply_chunk_diff(diff, title=title, url=url, modified_gmt=modified_gmt, chunks=chunks)
+
+    def upsert_post_chunks(
+        self,
+        *,
+        post_id: int,
+        title: str | None,
+        url: str | None,
+        modified_gmt: str | None,
+        chunks: list[str],
+        embeddings: list[list[float]],
+    ) -> ChunkDiff:
+        diff = self.store.upsert_post_chunks(
+            post_id=post_id, title=title, url=url, modified_gmt=modified_gmt, chunks=chunks, embeddings=embeddings
+        )
+        self.index.apply_chunk_diff(diff, title=title, url=url, modified_gmt=modified_gmt, chunks=chunks)
+        return diff
+
+    def search_similar(self, *, query_embedding: list[float], top_k: int) -> list[dict]:
+        return self.store.search_similar(query_embedding=query_embedding, top_k=top_k)
+
+    async def search_similar_async(self, *, query_embedding: list[float], top_k: int) -> list[dict]:
+        return await self.store.search_similar_async(query_embedding=query_embedding, top_k=top_k)
+
+    def search_similar_many(self, *, query_embeddings: list[list[float]], top_k: int) -> list[list[dict]]:
+        return self.store.search_similar_many(query_embeddings=query_embeddings, top_k=top_k)
+
+    async def search_similar_many_async(self, *, query_embeddings: list[list[float]], top_k: int) -> list[list[dict]]:
+        return await self.store.search_similar_many_async(query_embeddings=query_embeddings, top_k=top_k)
+
+    def iter_chunks(self, batch_size: int = 1000) -> Iterator[list[dict]]:
+        return self.store.iter_chunks(batch_size)
+
+    def stats(self) -> dict[str, Any]:
+        return {**self.store.stats(), "lexical": self.index.stats()}
+
+
+_store: VectorStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_vector_store() -> VectorStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = settings.VECTOR_STORE
+                if backend == "chroma":
+                    from app.rag.chroma_store import get_store
+
+                    _store = get_store()
+                elif backend == "local":
+                    from app.rag.local_store import LocalVectorStore
+
+                    _store = LocalVectorStore(
+                        settings.LOCAL_VECTOR_PATH,
+                        dtype=settings.LOCAL_VECTOR_DTYPE,
+                        compact_ratio=settings.LOCAL_VECTOR_COMPACT_RATIO,
+                        quantization=settings.LOCAL_VECTOR_QUANTIZATION,
+                        oversample=settings.LOCAL_VECTOR_OVERSAMPLE,
+                    )
+                else:
+                    raise RuntimeError(f"Unknown VECTOR_STORE: {backend} (expected chroma or local)")
+                if settings.RETRIEVAL_MODE != "vector":
+                    from app.rag.lexical import get_lexical_index
+
+                    _store = LexicallyIndexedStore(_store, get_lexical_index())
+    return _store
+
+
+def upsert_post_chunks(
+    *,
+    post_id: int,
+    title: str | None,
+    url: str | None,
+    modified_gmt: str | None,
+    chunks: list[str],
+    embeddings: list[list[float]],
+) -> ChunkDiff:
+    return get_vector_store().upsert_post_chunks(
+        post_id=post_id,
+        title=title,
+        url=url,
+        modified_gmt=modified_gmt,
+        chunks=chunks,
+        embeddings=embeddings,
+    )
+
+
+def search_similar(*, query_embedding: list[float], top_k: int) -> list[dict]:
+    return get_vector_store().search_similar(query_embedding=query_embedding, top_k=top_k)
+
+
+async def search_similar_async(*, query_embedding: list[float], top_k: int) -> list[dict]:
+    return await get_vector_store().search_similar_async(query_embedding=query_embedding, top_k=top_k)
+
+
+async def search_similar_many_async(*, query_embeddings: list[list[float]], top_k: int) -> list[list[dict]]:
+    return await get_vector_store().search_similar_many_async(query_embeddings=query_embeddings, top_k=top_k)
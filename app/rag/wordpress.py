@@ -1,10 +1,13 @@
 import base64
-from typing import Any
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Iterator
 
 import httpx
-from bs4 import BeautifulSoup
 
 from app.core.config import settings
+from app.core.http import get_http_client
+from app.rag.html_extract import get_extractor
 
 
 def _basic_auth_header() -> str | None:
@@ -15,51 +18,138 @@ def _basic_auth_header() -> str | None:
 
 
 def html_to_text(html: str) -> str:
-    soup = BeautifulSoup(html or "", "html.parser")
-    for tag in soup(["script", "style", "noscript"]):
-        tag.decompose()
-    text = soup.get_text(separator="\n")
-    return "\n".join([line.strip() for line in text.splitlines() if line.strip()])
+    return get_extractor(settings.HTML_EXTRACTOR).extract(html)
 
 
-def fetch_posts(*, modified_after: str | None = None) -> list[dict[str, Any]]:
+class _Page:
+    def __init__(self, items: list[dict[str, Any]], total: int | None, total_pages: int | None):
+        self.items = items
+        self.total = total
+        self.total_pages = total_pages
+
+
+def _header_int(resp: httpx.Response, name: str) -> int | None:
+    value = resp.headers.get(name)
+    return int(value) if value and value.isdigit() else None
+
+
+def _fetch_page(
+    client: httpx.Client, url: str, headers: dict, page: int, modified_after: str | None, fields: str | None = None
+) -> _Page:
+    params = {"page": page, "per_page": settings.WP_PER_PAGE, "status": "publish"}
+    if modified_after:
+        params["modified_after"] = modified_after
+    if fields:
+        params["_fields"] = fields
+
+    resp = client.get(url, params=params, headers=headers)
+    if resp.status_code == 400 and "rest_post_invalid_page_number" in resp.text:
+        return _Page([], None, None)
+    resp.raise_for_status()
+    return _Page(resp.json() or [], _header_int(resp, "X-WP-Total"), _header_int(resp, "X-WP-TotalPages"))
+
+
+def _endpoint() -> tuple[httpx.Client, str, dict]:
     url = settings.WP_BASE_URL.rstrip("/") + settings.WP_POSTS_PATH
     headers = {}
     auth = _basic_auth_header()
     if auth:
         headers["Authorization"] = auth
+    return get_http_client(url), url, headers
+
+
+def _iter_pages(
+    client: httpx.Client, url: str, headers: dict, pages: list[int], modified_after: str | None
+) -> Iterator[tuple[int, list[dict[str, Any]]]]:
+    """Fetch `pages` WP_FETCH_CONCURRENCY at a time, yielding (page, items) in order until an empty page."""
+    window = max(1, settings.WP_FETCH_CONCURRENCY)
+    pool = ThreadPoolExecutor(max_workers=window)
+    try:
+        pending: deque[tuple[int, Future]] = deque()
+        todo = deque(pages)
+        while todo or pending:
+            while todo and len(pending) < window:
+                page = todo.popleft()
+                pending.append((page, pool.submit(_fetch_page, client, url, headers, page, modified_after)))
+            page, fut = pending.popleft()
+            items = fut.result().items
+            if not items:
+                break
+            yield page, items
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
 
-    out: list[dict[str, Any]] = []
-    page = 1
+def _last_page(total_pages: int) -> int:
+    if settings.WP_MAX_POSTS > 0:
+        return min(total_pages, -(-settings.WP_MAX_POSTS // settings.WP_PER_PAGE))
+    return total_pages
+
+
+def page_count(*, modified_after: str | None = None) -> int | None:
+    """Number of pages an ingest run has to read (capped by WP_MAX_POSTS), or None when the site hides X-WP-TotalPages."""
+    client, url, headers = _endpoint()
+    # only the pagination headers matter; the lane that gets page 1 fetches its content
+    first = _fetch_page(client, url, headers, 1, modified_after, fields="id")
+    if not first.items:
+        return 0
+    if first.total_pages is None:
+        return None
+    return _last_page(first.total_pages)
+
+
+def iter_posts(*, modified_after: str | None = None, pages: list[int] | None = None) -> Iterator[dict[str, Any]]:
+    """
+    Yield posts page by page as soon as each page arrives. After the first page,
+    X-WP-TotalPages tells us how many pages remain and those are fetched
+    WP_FETCH_CONCURRENCY at a time, still yielded in page order. Sites that
+    strip the pagination headers are walked sequentially until an empty page.
+
+    With `pages`, only those pages are read (used by the fan-out ingest
+    subtasks); WP_MAX_POSTS then applies to the post's position in the full
+    listing, so the subtasks together stop at the same post a single run would.
+    """
+    client, url, headers = _endpoint()
     per_page = settings.WP_PER_PAGE
     max_posts = settings.WP_MAX_POSTS
 
-    with httpx.Client(timeout=60) as client:
-        while True:
-            # Check if we've reached the limit
-            if max_posts > 0 and len(out) >= max_posts:
-                break
+    if pages is not None:
+        for page, items in _iter_pages(client, url, headers, sorted(pages), modified_after):
+            if max_posts > 0:
+                items = items[:max(0, max_posts - (page - 1) * per_page)]
+            yield from items
+        return
 
-            params = {"page": page, "per_page": per_page, "status": "publish"}
-            if modified_after:
-                params["modified_after"] = modified_after
+    first = _fetch_page(client, url, headers, 1, modified_after)
+    remaining = max_posts if max_posts > 0 else None
 
-            resp = client.get(url, params=params, headers=headers)
-            if resp.status_code == 400 and "rest_post_invalid_page_number" in resp.text:
-                break
-            resp.raise_for_status()
+    def take(items: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        nonlocal remaining
+        if remaining is None:
+            return items
+        items = items[:remaining]
+        remaining -= len(items)
+        return items
 
-            items = resp.json()
-            if not items:
-                break
+    yield from take(first.items)
+    if not first.items or remaining == 0:
+        return
 
-            out.extend(items)
-            
-            # If we have a limit and exceeded it, trim the results
-            if max_posts > 0 and len(out) > max_posts:
-                out = out[:max_posts]
+    if first.total_pages is None:
+        page = 2
+        while remaining != 0:
+            items = _fetch_page(client, url, headers, page, modified_after).items
+            if not items:
                 break
-            
+            yield from take(items)
             page += 1
+        return
 
-    return out
+    for _, items in _iter_pages(client, url, headers, list(range(2, _last_page(first.total_pages) + 1)), modified_after):
+        yield from take(items)
+        if remaining == 0:
+            break
+
+
+def fetch_posts(*, modified_after: str | None = None) -> list[dict[str, Any]]:
+    return list(iter_posts(modified_after=modified_after))
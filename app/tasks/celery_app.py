@@ -1,5 +1,9 @@
 from celery import Celery
+from celery.signals import worker_init, worker_process_shutdown
+from prometheus_client import start_http_server
 from app.core.config import settings
+from app.core.http import close_http_clients
+from app.core.metrics import metrics_registry
 
 celery_app = Celery(
     "rag_wp",
@@ -12,5 +16,18 @@ celery_app.conf.update(
     worker_prefetch_multiplier=1,
 )
 
+
+@worker_init.connect
+def _serve_metrics(**kwargs):
+    # ingest counters live in the worker; with the prefork pool set PROMETHEUS_MULTIPROC_DIR so children's counts are included
+    if settings.METRICS_WORKER_PORT:
+        start_http_server(settings.METRICS_WORKER_PORT, registry=metrics_registry())
+
+
+@worker_process_shutdown.connect
+def _close_http_pools(**kwargs):
+    close_http_clients()
+
+
 # Import tasks to register them with Celery
 from app.tasks import ingest  # noqa: E402, F401
@@ -1,82 +1,358 @@
+import json
+import threading
+import time
+from collections import Counter
 from datetime import datetime, timezone
+from functools import partial
+from typing import Iterator
+from celery import chain, chord
+import httpx
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
+from app.core.metrics import INGEST_COUNTERS
 from app.db.session import SessionLocal
 from app.db import crud
-from app.rag.wordpress import fetch_posts, html_to_text
+from app.rag.wordpress import iter_posts, html_to_text, page_count
 from app.rag.chunking import chunk_text
-from app.rag.embeddings import embed_texts
-from app.rag.chroma_store import upsert_post_chunks
+from app.rag.embed_batcher import EmbeddingBatcher
+from app.rag.embedding_cache import cache_counters
+from app.rag.vector_store import ChunkDiff, LexicallyIndexedStore, get_vector_store
+from app.rag.answer_cache import invalidate_posts
 from app.tasks.celery_app import celery_app
+from app.tasks.pipeline import Emit, FnWorker, Pipeline, Stage, StageWorker
 
+_DB_FLUSH_WAIT_S = 1.0
 
-@celery_app.task(name="ingest_wordpress")
-def ingest_wordpress(full_resync: bool = False) -> dict:
-    db: Session = SessionLocal()
-    try:
-        now = datetime.now(timezone.utc)
 
-        modified_after = None
-        if not full_resync:
-            modified_after = crud.get_latest_modified_gmt(db)
+class _Counts:
+    def __init__(self):
+        self._counts: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counts[name] += n
+        metric = INGEST_COUNTERS.get(name)
+        if metric is not None:
+            metric.inc(n)
+
+    def __getitem__(self, name: str) -> int:
+        return self._counts[name]
+
+
+def _batched(items: Iterator[dict], size: int) -> Iterator[list[dict]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
-        posts = fetch_posts(modified_after=modified_after)
 
-        processed = 0
-        skipped = 0
+class _ParseWorker(StageWorker):
+    """Skips up-to-date posts (one query per batch of posts), then html -> text -> chunks."""
+
+    def __init__(self, counts: _Counts):
+        self.counts = counts
+        self.db: Session = SessionLocal()
+
+    def process(self, posts: list[dict], emit: Emit) -> None:
+        self.counts.incr("fetched", len(posts))
+        known = crud.get_modified_gmt_map(self.db, [int(p["id"]) for p in posts])
+        self.db.rollback()  # end the read transaction so the pooled connection isn't held open
         for p in posts:
             wp_id = int(p["id"])
-            slug = p.get("slug")
-            status = p.get("status")
             modified_gmt = p.get("modified_gmt")
 
             # Check if post needs reprocessing (embedding)
-            if not crud.should_reprocess_post(db, wp_id, modified_gmt):
+            if wp_id in known and known[wp_id] == modified_gmt:
                 print(f"Skipping post {wp_id} - already up to date (modified_gmt: {modified_gmt})")
-                skipped += 1
+                self.counts.incr("skipped")
                 continue
+            self._parse(p, emit)
 
-            title = (p.get("title") or {}).get("rendered") if isinstance(p.get("title"), dict) else p.get("title")
-            link = p.get("link")
-            content_html = (p.get("content") or {}).get("rendered") if isinstance(p.get("content"), dict) else ""
-
-            text = html_to_text(content_html or "")
-            chunks = chunk_text(text)
-            
-            # Filter out empty chunks
-            chunks = [c for c in chunks if c and c.strip()]
-            
-            if not chunks:
-                continue
+    def _parse(self, p: dict, emit: Emit) -> None:
+        wp_id = int(p["id"])
+        modified_gmt = p.get("modified_gmt")
+
+        title = (p.get("title") or {}).get("rendered") if isinstance(p.get("title"), dict) else p.get("title")
+        content_html = (p.get("content") or {}).get("rendered") if isinstance(p.get("content"), dict) else ""
+
+        text = html_to_text(content_html or "")
+        # Filter out empty chunks
+        chunks = [c for c in chunk_text(text) if c and c.strip()]
+        if not chunks:
+            return
+
+        print(f"Processing post {wp_id} - queueing {len(chunks)} chunks for embedding")
+        post = {
+            "wp_post_id": wp_id,
+            "slug": p.get("slug"),
+            "url": p.get("link"),
+            "title": html_to_text(title or ""),
+            "modified_gmt": modified_gmt,
+            "status": p.get("status"),
+        }
+        emit((post, chunks))
+
+    def cleanup(self) -> None:
+        self.db.close()
+
+
+def _diff_chunks(item: tuple[dict, list[str]], emit: Emit, counts: _Counts) -> None:
+    post, chunks = item
+    diff = get_vector_store().diff_post_chunks(post_id=post["wp_post_id"], chunks=chunks)
+    counts.incr("chunks_added", len(diff.added))
+    counts.incr("chunks_unchanged", len(diff.kept))
+    counts.incr("chunks_removed", len(diff.removed))
+    emit((post, chunks, diff))
+
+
+class _EmbedWorker(StageWorker):
+    """Batches the added chunks across posts; a post moves on once all of them have vectors."""
+
+    def __init__(self, counts: _Counts):
+        self.counts = counts
+        self._emit: Emit | None = None
+        self.batcher = EmbeddingBatcher(self._ready)
+
+    def _ready(self, owner: tuple[dict, list[str], ChunkDiff], texts: list[str], embeddings: list[list[float]]) -> None:
+        self._emit((*owner, embeddings))
+
+    def _run(self, emit: Emit, fn, *args) -> None:
+        self._emit = emit
+        before = self.batcher.requests
+        fn(*args)
+        self.counts.incr("embedding_requests", self.batcher.requests - before)
+
+    def process(self, item: tuple[dict, list[str], ChunkDiff], emit: Emit) -> None:
+        _, chunks, diff = item
+        self._run(emit, self.batcher.add, item, [chunks[i] for i in diff.added])
+
+    def poll_timeout(self) -> float | None:
+        return self.batcher.time_until_deadline()
+
+    def tick(self, emit: Emit) -> None:
+        self._run(emit, self.batcher.poll)
+
+    def close(self, emit: Emit) -> None:
+        self._run(emit, self.batcher.flush)
+
+
+def _write_vectors(item: tuple[dict, list[str], ChunkDiff, list[list[float]]], emit: Emit) -> None:
+    post, chunks, diff, embeddings = item
+    get_vector_store().apply_chunk_diff(
+        diff,
+        title=post["title"],
+        url=post["url"],
+        modified_gmt=post["modified_gmt"],
+        chunks=chunks,
+        embeddings=embeddings,
+    )
+    emit(post)
+
+
+class _DbWorker(StageWorker):
+    """Collects written posts and upserts them INGEST_DB_BATCH_SIZE at a time (or after _DB_FLUSH_WAIT_S)."""
+
+    def __init__(self, counts: _Counts):
+        self.counts = counts
+        self.db: Session = SessionLocal()
+        self.rows: list[dict] = []
+        self.oldest: float | None = None
+
+    def process(self, post: dict, emit: Emit) -> None:
+        self.rows.append(post)
+        if self.oldest is None:
+            self.oldest = time.monotonic()
+        if len(self.rows) >= settings.INGEST_DB_BATCH_SIZE:
+            self.close(emit)
+
+    def poll_timeout(self) -> float | None:
+        if self.oldest is None:
+            return None
+        return max(0.0, _DB_FLUSH_WAIT_S - (time.monotonic() - self.oldest))
+
+    def tick(self, emit: Emit) -> None:
+        if self.poll_timeout() == 0:
+            self.close(emit)
+
+    def close(self, emit: Emit) -> None:
+        if not self.rows:
+            return
+        rows, self.rows, self.oldest = self.rows, [], None
+        crud.bulk_upsert_posts(self.db, rows)
+        ids = [r["wp_post_id"] for r in rows]
+        invalidate_posts({r["wp_post_id"]: r["modified_gmt"] for r in rows})
+        self.counts.incr("processed", len(rows))
+        for wp_id in ids:
+            emit(wp_id)
 
-            print(f"Processing post {wp_id} - creating embeddings for {len(chunks)} chunks")
-            embeddings = embed_texts(chunks)
-            
-            # Ensure chunks and embeddings have the same length
-            if len(chunks) != len(embeddings):
-                print(f"Warning: chunks ({len(chunks)}) and embeddings ({len(embeddings)}) length mismatch for post {wp_id}")
+    def cleanup(self) -> None:
+        self.db.close()
+
+
+def build_ingest_pipeline(counts: _Counts) -> Pipeline:
+    return Pipeline(
+        [
+            Stage("parse", lambda: _ParseWorker(counts), workers=settings.INGEST_PARSE_WORKERS),
+            Stage("diff", lambda: FnWorker(partial(_diff_chunks, counts=counts)), workers=settings.INGEST_VECTOR_WORKERS),
+            Stage("embed", lambda: _EmbedWorker(counts), workers=settings.INGEST_EMBED_WORKERS),
+            Stage("vector_write", lambda: FnWorker(_write_vectors), workers=settings.INGEST_VECTOR_WORKERS),
+            Stage("db_write", lambda: _DbWorker(counts), workers=settings.INGEST_DB_WORKERS),
+        ],
+        queue_size=settings.INGEST_QUEUE_SIZE,
+    )
+
+
+def _run_ingest(modified_after: str | None, pages: list[int] | None = None) -> dict:
+    cache_before = cache_counters()
+    counts = _Counts()
+    stages = build_ingest_pipeline(counts).run(
+        _batched(iter_posts(modified_after=modified_after, pages=pages), settings.WP_PER_PAGE)
+    )
+    cache_after = cache_counters()
+    return {
+        "ok": True,
+        "processed_posts": counts["processed"],
+        "skipped_posts": counts["skipped"],
+        "fetched_posts": counts["fetched"],
+        "embedding_requests": counts["embedding_requests"],
+        "chunks_added": counts["chunks_added"],
+        "chunks_unchanged": counts["chunks_unchanged"],
+        "chunks_removed": counts["chunks_removed"],
+        "embedding_cache_hits": cache_after["hits"] - cache_before["hits"],
+        "embedding_cache_misses": cache_after["misses"] - cache_before["misses"],
+        "embedding_tokens_saved": cache_after["tokens_saved"] - cache_before["tokens_saved"],
+        "stages": stages,
+    }
+
+
+def _merge_results(results: list[dict]) -> dict:
+    """Sum the counters of several ingest runs. Per-stage rates don't add up, so only totals are kept."""
+    merged: dict = {"ok": all(r.get("ok") for r in results), "stages": {}, "subtasks": 0}
+    for r in results:
+        merged["subtasks"] += r.get("subtasks", 1)
+        for key, value in r.items():
+            if key in ("ok", "subtasks") or not isinstance(value, int | float) or isinstance(value, bool):
                 continue
-            
-            upsert_post_chunks(
-                post_id=wp_id,
-                title=html_to_text(title or ""),
-                url=link,
-                modified_gmt=modified_gmt,
-                chunks=chunks,
-                embeddings=embeddings,
-            )
-
-            crud.upsert_post(
-                db,
-                wp_post_id=wp_id,
-                slug=slug,
-                url=link,
-                title=html_to_text(title or ""),
-                modified_gmt=modified_gmt,
-                status=status,
-            )
-            processed += 1
-
-        return {"ok": True, "processed_posts": processed, "skipped_posts": skipped, "fetched_posts": len(posts), "finished_at": now.isoformat()}
+            merged[key] = merged.get(key, 0) + value
+        for name, stage in (r.get("stages") or {}).items():
+            total = merged["stages"].setdefault(name, {})
+            for key in ("items_in", "items_out", "busy_s", "queue_wait_s", "blocked_s"):
+                total[key] = round(total.get(key, 0) + stage.get(key, 0), 3)
+    return merged
+
+
+def _page_lanes(total_pages: int) -> list[list[list[int]]]:
+    """Split pages into INGEST_PAGES_PER_TASK chunks dealt round-robin onto at most INGEST_MAX_PARALLEL lanes."""
+    size = max(1, settings.INGEST_PAGES_PER_TASK)
+    chunks = [list(range(p, min(p + size, total_pages + 1))) for p in range(1, total_pages + 1, size)]
+    lanes = min(len(chunks), max(1, settings.INGEST_MAX_PARALLEL))
+    return [chunks[i::lanes] for i in range(lanes)]
+
+
+@celery_app.task(
+    name="ingest_wordpress_pages",
+    autoretry_for=(httpx.TransportError, httpx.HTTPStatusError),
+    retry_backoff=True,
+    max_retries=3,
+)
+def ingest_wordpress_pages(previous: dict | None, pages: list[int], modified_after: str | None = None) -> dict:
+    """One chunk of a fanned-out ingest. Chunks in a lane run as a chain, each adding its counts to `previous`."""
+    result = _run_ingest(modified_after, pages=pages)
+    return _merge_results([previous, result]) if previous else result
+
+
+@celery_app.task(name="finalize_ingest")
+def finalize_ingest(results: list[dict], job_id: str, started_at: str) -> dict:
+    now = datetime.now(timezone.utc)
+    summary = _merge_results(results)
+    elapsed = (now - datetime.fromisoformat(started_at)).total_seconds()
+    summary["elapsed_s"] = round(elapsed, 3)
+    summary["posts_per_s"] = round(summary.get("fetched_posts", 0) / elapsed, 3) if elapsed else 0.0
+    summary["finished_at"] = now.isoformat()
+
+    db: Session = SessionLocal()
+    try:
+        crud.update_ingest_job(
+            db,
+            job_id,
+            status="success" if summary["ok"] else "failure",
+            message=json.dumps(summary),
+            finished_at=now,
+        )
+    finally:
+        db.close()
+    return summary
+
+
+@celery_app.task(name="fail_ingest")
+def fail_ingest(request, exc, traceback, job_id: str) -> None:
+    """Chord errback: a lane gave up after its retries, so finalize_ingest never runs."""
+    db: Session = SessionLocal()
+    try:
+        crud.update_ingest_job(
+            db,
+            job_id,
+            status="failure",
+            message=json.dumps({"ok": False, "error": f"{type(exc).__name__}: {exc}"}),
+            finished_at=datetime.now(timezone.utc),
+        )
+    finally:
+        db.close()
+
+
+@celery_app.task(name="ingest_wordpress", bind=True)
+def ingest_wordpress(self, full_resync: bool = False) -> dict:
+    """
+    Coordinator. Small syncs run in this task; larger ones are split into page
+    chunks spread over up to INGEST_MAX_PARALLEL worker lanes and the chord's
+    finalize_ingest result replaces this task's result (same task id).
+    """
+    db: Session = SessionLocal()
+    try:
+        now = datetime.now(timezone.utc)
+
+        modified_after = None
+        if not full_resync:
+            modified_after = crud.get_latest_modified_gmt(db)
     finally:
         db.close()
+
+    total_pages = page_count(modified_after=modified_after)
+    if total_pages is None or total_pages <= settings.INGEST_PAGES_PER_TASK or settings.INGEST_MAX_PARALLEL <= 1:
+        result = _run_ingest(modified_after)
+        result["finished_at"] = now.isoformat()
+        return result
+
+    lanes = []
+    for chunks in _page_lanes(total_pages):
+        first, *rest = chunks
+        lanes.append(chain(
+            ingest_wordpress_pages.s(None, first, modified_after),
+            *(ingest_wordpress_pages.s(pages, modified_after) for pages in rest),
+        ))
+    print(f"Fanning out {total_pages} pages over {len(lanes)} lanes")
+    finalize = finalize_ingest.s(job_id=self.request.id, started_at=now.isoformat())
+    finalize.link_error(fail_ingest.s(job_id=self.request.id))
+    return self.replace(chord(lanes, finalize))
+
+
+@celery_app.task(name="backfill_lexical_index")
+def backfill_lexical_index() -> dict:
+    """Add chunks already in the vector store to the lexical index (after enabling hybrid retrieval)."""
+    store = get_vector_store()
+    if not isinstance(store, LexicallyIndexedStore):
+        return {"ok": False, "detail": "RETRIEVAL_MODE is vector; there is no lexical index"}
+    scanned = added = 0
+    for batch in store.iter_chunks():
+        scanned += len(batch)
+        added += store.index.add_missing(batch)
+    # the fast path trusts BM25 margins only from here on
+    store.index.mark_backfilled()
+    print(f"Lexical backfill: {added} of {scanned} chunks added")
+    return {"ok": True, "scanned_chunks": scanned, "added_chunks": added}
@@ -0,0 +1,209 @@
+import queue
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Iterable
+
+Emit = Callable[[Any], None]
+
+_DONE = object()
+_POLL_S = 0.1
+
+
+class StageWorker(ABC):
+    """Per-thread handler of a pipeline stage. Subclasses keep their own state (DB session, batcher...)."""
+
+    @abstractmethod
+    def process(self, item: Any, emit: Emit) -> None:
+        ...
+
+    def poll_timeout(self) -> float | None:
+        """Seconds until tick() should run even without new input, or None."""
+        return None
+
+    def tick(self, emit: Emit) -> None:
+        pass
+
+    def close(self, emit: Emit) -> None:
+        pass
+
+
+class FnWorker(StageWorker):
+    def __init__(self, fn: Callable[[Any, Emit], None]):
+        self.fn = fn
+
+    def process(self, item: Any, emit: Emit) -> None:
+        self.fn(item, emit)
+
+
+class Stage:
+    def __init__(self, name: str, make_worker: Callable[[], StageWorker], *, workers: int = 1):
+        self.name = name
+        self.make_worker = make_worker
+        self.workers = max(1, workers)
+
+
+class _StageStats:
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.items_in = 0
+        self.items_out = 0
+        self.busy_s = 0.0
+        self.queue_wait_s = 0.0   # waiting for upstream (starved)
+        self.blocked_s = 0.0      # waiting for room downstream (backpressure)
+        self._lock = threading.Lock()
+
+    def add(self, **deltas: float) -> None:
+        with self._lock:
+            for key, value in deltas.items():
+                setattr(self, key, getattr(self, key) + value)
+
+    def as_dict(self, wall_s: float) -> dict:
+        return {
+            "workers": self.workers,
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+            "items_per_s": round(self.items_in / wall_s, 3) if wall_s else 0.0,
+            "busy_s": round(self.busy_s, 3),
+            "queue_wait_s": round(self.queue_wait_s, 3),
+            "blocked_s": round(self.blocked_s, 3),
+            "utilization": round(self.busy_s / (wall_s * self.workers), 3) if wall_s else 0.0,
+        }
+
+
+class Pipeline:
+    """
+    Runs `source` through `stages`, each on its own thread pool, connected by
+    bounded queues so a slow stage applies backpressure instead of buffering
+    the whole run in memory. The first error stops every stage and is re-raised
+    from run().
+    """
+
+    def __init__(self, stages: list[Stage], *, queue_size: int = 64, source_name: str = "fetch"):
+        self.stages = stages
+        self.queue_size = max(1, queue_size)
+        self.source_name = source_name
+        self._stop = threading.Event()
+        self._error: BaseException | None = None
+        self._error_lock = threading.Lock()
+
+    def _fail(self, exc: BaseException) -> None:
+        with self._error_lock:
+            if self._error is None:
+                self._error = exc
+        self._stop.set()
+
+    def _put(self, q: queue.Queue, item: Any, stats: _StageStats) -> float:
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=_POLL_S)
+                break
+            except queue.Full:
+                continue
+        blocked = time.perf_counter() - start
+        stats.add(blocked_s=blocked)
+        return blocked
+
+    def _run_source(self, source: Iterable[Any], out: queue.Queue, stats: _StageStats) -> None:
+        try:
+            it = iter(source)
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    break
+                stats.add(busy_s=time.perf_counter() - start, items_in=1, items_out=1)
+                self._put(out, item, stats)
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._put(out, _DONE, stats)
+
+    def _run_worker(
+        self,
+        stage: Stage,
+        inq: queue.Queue,
+        outq: queue.Queue | None,
+        stats: _StageStats,
+        remaining: list[int],
+        remaining_lock: threading.Lock,
+    ) -> None:
+        blocked = [0.0]
+
+        def emit(item: Any) -> None:
+            stats.add(items_out=1)
+            if outq is not None:
+                blocked[0] += self._put(outq, item, stats)
+
+        def timed(fn: Callable[..., None], *args: Any) -> None:
+            # busy time excludes time spent waiting for room downstream
+            blocked[0] = 0.0
+            t0 = time.perf_counter()
+            fn(*args)
+            stats.add(busy_s=time.perf_counter() - t0 - blocked[0])
+
+        try:
+            worker = stage.make_worker()
+            try:
+                while not self._stop.is_set():
+                    timeout = worker.poll_timeout()
+                    wait = _POLL_S if timeout is None else min(_POLL_S, timeout)
+                    start = time.perf_counter()
+                    try:
+                        item = inq.get(timeout=wait)
+                    except queue.Empty:
+                        stats.add(queue_wait_s=time.perf_counter() - start)
+                        if timeout is not None:
+                            timed(worker.tick, emit)
+                        continue
+                    stats.add(queue_wait_s=time.perf_counter() - start)
+                    if item is _DONE:
+                        inq.put(_DONE)  # let sibling workers see it too
+                        break
+                    timed(worker.process, item, emit)
+                    stats.add(items_in=1)
+                if not self._stop.is_set():
+                    timed(worker.close, emit)
+            finally:
+                cleanup = getattr(worker, "cleanup", None)
+                if cleanup is not None:
+                    cleanup()
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            with remaining_lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last and outq is not None:
+                self._put(outq, _DONE, stats)
+
+    def run(self, source: Iterable[Any]) -> dict[str, dict]:
+        started = time.perf_counter()
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        all_stats = [_StageStats(self.source_name, 1)] + [_StageStats(s.name, s.workers) for s in self.stages]
+
+        threads = [threading.Thread(target=self._run_source, args=(source, queues[0], all_stats[0]), daemon=True)]
+        for i, stage in enumerate(self.stages):
+            outq = queues[i + 1] if i + 1 < len(queues) else None
+            remaining = [stage.workers]
+            lock = threading.Lock()
+            for _ in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._run_worker,
+                    args=(stage, queues[i], outq, all_stats[i + 1], remaining, lock),
+                    daemon=True,
+                ))
+
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        if self._error is not None:
+            raise self._error
+
+        wall_s = time.perf_counter() - started
+        return {s.name: s.as_dict(wall_s) for s in all_stats}
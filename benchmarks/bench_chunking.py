@@ -0,0 +1,123 @@
+"""
+Compare the legacy character chunker with the token-aware one: chunks and
+tokens per post, token spread, overlap overhead, mid-word cuts and time.
+
+    python -m benchmarks.bench_chunking [--posts 200] [--wp 100]
+"""
+import argparse
+import random
+import statistics
+import time
+from pathlib import Path
+
+from app.core.config import settings
+from app.rag.chunking import chunk_text
+from app.rag.html_extract import StreamExtractor
+from app.rag.tokens import estimate_tokens
+
+CORPUS = Path(__file__).parent / "corpus"
+
+FA_SENTENCES = [
+    "هوش مصنوعی در سال‌های اخیر پیشرفت چشمگیری داشته است.",
+    "برای انتخاب لپ‌تاپ مناسب، ابتدا نیاز خود را مشخص کنید.",
+    "این مقاله به بررسی روش‌های بهینه‌سازی پایگاه داده می‌پردازد؟",
+    "در ادامه، مراحل نصب و پیکربندی را گام‌به‌گام توضیح می‌دهیم.",
+    "کارایی سیستم به عوامل متعددی از جمله حافظه و پردازنده بستگی دارد.",
+]
+EN_SENTENCES = [
+    "Retrieval-augmented generation combines search with a language model.",
+    "Each paragraph should carry a single idea so that it can be retrieved on its own.",
+    "Why does the embedding size matter for latency?",
+    "The benchmark below compares both strategies on the same posts.",
+    "Short sentences are easy to read!",
+]
+
+
+def synthetic_posts(n: int, seed: int) -> list[str]:
+    rnd = random.Random(seed)
+    posts = []
+    for _ in range(n):
+        sentences = FA_SENTENCES if rnd.random() < 0.7 else EN_SENTENCES
+        lines = []
+        for _ in range(rnd.randint(3, 40)):
+            if rnd.random() < 0.15:
+                lines.append(rnd.choice(["مقدمه", "جمع‌بندی", "Installation", "نکات مهم", "Results"]))
+            lines.append(" ".join(rnd.choice(sentences) for _ in range(rnd.randint(1, 8))))
+        posts.append("\n".join(lines))
+    return posts
+
+
+def corpus_posts() -> list[str]:
+    extract = StreamExtractor().extract
+    return [extract(p.read_text(encoding="utf-8")) for p in sorted(CORPUS.glob("*.html"))]
+
+
+def wordpress_posts(limit: int) -> list[str]:
+    from app.rag.wordpress import html_to_text, iter_posts
+
+    out = []
+    for post in iter_posts():
+        out.append(html_to_text((post.get("content") or {}).get("rendered") or ""))
+        if len(out) >= limit:
+            break
+    return out
+
+
+def mid_word_cuts(text: str, chunks: list[str]) -> int:
+    """Chunks whose first or last character sits inside a word of the original text."""
+    cuts = 0
+    pos = 0
+    for chunk in chunks:
+        start = text.find(chunk, max(0, pos - len(chunk)))
+        if start < 0:
+            continue
+        end = start + len(chunk)
+        if start > 0 and not text[start - 1].isspace():
+            cuts += 1
+        if end < len(text) and not text[end].isspace():
+            cuts += 1
+        pos = end
+    return cuts
+
+
+def run(strategy: str, posts: list[str]) -> dict:
+    settings.CHUNK_STRATEGY = strategy
+    started = time.perf_counter()
+    all_chunks = [chunk_text(p) for p in posts]
+    elapsed = time.perf_counter() - started
+
+    tokens = [estimate_tokens(c) for chunks in all_chunks for c in chunks]
+    source_tokens = sum(estimate_tokens(p) for p in posts)
+    return {
+        "chunks/post": len(tokens) / len(posts),
+        "tokens/post": sum(tokens) / len(posts),
+        "tokens/chunk p50": statistics.median(tokens),
+        "tokens/chunk min": min(tokens),
+        "tokens/chunk max": max(tokens),
+        "tokens/chunk cv": statistics.pstdev(tokens) / statistics.mean(tokens),
+        "overlap overhead %": 100 * (sum(tokens) - source_tokens) / source_tokens,
+        "mid-word cuts/post": sum(mid_word_cuts(p, c) for p, c in zip(posts, all_chunks)) / len(posts),
+        "ms/post": 1000 * elapsed / len(posts),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=200, help="synthetic fa/en posts")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--wp", type=int, default=0, help="use this many live WordPress posts instead")
+    args = parser.parse_args()
+
+    posts = wordpress_posts(args.wp) if args.wp else corpus_posts() + synthetic_posts(args.posts, args.seed)
+    posts = [p for p in posts if p.strip()]
+
+    results = {strategy: run(strategy, posts) for strategy in ("chars", "tokens")}
+    print(f"{len(posts)} posts; chars: CHUNK_SIZE={settings.CHUNK_SIZE} CHUNK_OVERLAP={settings.CHUNK_OVERLAP}; "
+          f"tokens: CHUNK_MAX_TOKENS={settings.CHUNK_MAX_TOKENS} CHUNK_OVERLAP_TOKENS={settings.CHUNK_OVERLAP_TOKENS}")
+    print(f"{'metric':<22}{'chars':>12}{'tokens':>12}")
+    for metric in results["chars"]:
+        print(f"{metric:<22}{results['chars'][metric]:>12.2f}{results['tokens'][metric]:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Microbenchmark of the HTML extractors on the WordPress corpus, including long
+posts built by repeating the Gutenberg article.
+
+    python -m benchmarks.bench_html_extract [--repeat 5]
+"""
+import argparse
+import time
+from pathlib import Path
+
+from app.rag.html_extract import SoupExtractor, StreamExtractor
+
+CORPUS = Path(__file__).parent / "corpus"
+
+
+def cases() -> list[tuple[str, str]]:
+    article = (CORPUS / "gutenberg_article.html").read_text(encoding="utf-8")
+    out = [(path.name, path.read_text(encoding="utf-8")) for path in sorted(CORPUS.glob("*.html"))]
+    out += [(f"gutenberg x{n}", article * n) for n in (10, 50)]
+    out.append(("titles", (CORPUS / "titles.txt").read_text(encoding="utf-8").splitlines()[0]))
+    return out
+
+
+def best_of(fn, html: str, repeat: int) -> float:
+    """Seconds per call, best of `repeat` runs of ~0.2s each."""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn(html)
+        if time.perf_counter() - start > 0.2:
+            break
+        loops *= 2
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn(html)
+        best = min(best, (time.perf_counter() - start) / loops)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    soup, stream = SoupExtractor(), StreamExtractor()
+    print(f"{'case':<28}{'bytes':>10}{'soup ms':>12}{'stream ms':>12}{'speedup':>10}")
+    for name, html in cases():
+        assert soup.extract(html) == stream.extract(html), name
+        t_soup = best_of(soup.extract, html, args.repeat)
+        t_stream = best_of(stream.extract, html, args.repeat)
+        print(f"{name:<28}{len(html.encode()):>10}{t_soup * 1000:>12.3f}{t_stream * 1000:>12.3f}{t_soup / t_stream:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Recall@k against exact search, latency and scan memory of the local index
+per LOCAL_VECTOR_QUANTIZATION mode and LOCAL_VECTOR_OVERSAMPLE factor.
+
+    python -m benchmarks.bench_quantization [--rows 20000] [--dim 1536] [--oversample 1,2,4,8,16]
+
+"scan MB" is what a query reads (and what should stay in RAM): the full
+matrix for "none", the codes plus scales for int8/binary. Re-ranking reads
+only top_k * oversample full-precision rows from the matrix file.
+
+Vectors are drawn around --topics cluster centers and each query sits
+--noise away from a stored vector; --topics 0 gives uniform random vectors,
+the worst case for binary codes.
+"""
+import argparse
+import statistics
+import tempfile
+
+import numpy as np
+
+from app.rag.local_store import LocalVectorStore
+from benchmarks.bench_vector_store import percentile, recall, timed_queries
+
+
+def unit(x: np.ndarray) -> np.ndarray:
+    return x / np.linalg.norm(x, axis=-1, keepdims=True)
+
+
+def dataset(rows: int, dim: int, queries: int, topics: int, noise: float) -> tuple[np.ndarray, np.ndarray]:
+    """Unit vectors grouped around topic centers, and queries at a fixed distance from stored vectors."""
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((rows, dim), dtype=np.float32)
+    if topics:
+        centers = unit(rng.standard_normal((topics, dim), dtype=np.float32))
+        vectors = centers[rng.integers(0, topics, rows)] + 0.8 * unit(vectors)
+    vectors = unit(vectors)
+    picked = vectors[rng.integers(0, rows, queries)]
+    return vectors, unit(picked + noise * unit(rng.standard_normal((queries, dim), dtype=np.float32)))
+
+
+def fill(store: LocalVectorStore, vectors: np.ndarray) -> None:
+    for post, begin in enumerate(range(0, len(vectors), 500)):
+        block = vectors[begin:begin + 500]
+        store.upsert_post_chunks(
+            post_id=post, title="t", url="u", modified_gmt="m",
+            chunks=[f"chunk {begin + i}" for i in range(len(block))], embeddings=block,
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=6)
+    parser.add_argument("--oversample", default="1,2,4,8,16")
+    parser.add_argument("--topics", type=int, default=200, help="clusters; 0 for uniform random vectors")
+    parser.add_argument("--noise", type=float, default=0.5, help="query distance from its source vector (unit vectors)")
+    args = parser.parse_args()
+    factors = [int(f) for f in args.oversample.split(",")]
+
+    vectors, queries = dataset(args.rows, args.dim, args.queries, args.topics, args.noise)
+    exact = [set(np.argsort(((vectors - q) ** 2).sum(axis=1))[:args.top_k].tolist()) for q in queries]
+
+    print(f"{args.rows} vectors x {args.dim} dims, {args.queries} queries, top_k={args.top_k}")
+    print(f"{'mode':<10}{'oversample':>11}{'recall@' + str(args.top_k):>11}{'p50 ms':>9}{'p99 ms':>9}{'scan MB':>9}{'vs none':>9}")
+    with tempfile.TemporaryDirectory() as path:
+        store = LocalVectorStore(path)
+        fill(store, vectors)
+        baseline = store.stats()["scan_bytes"]
+        for mode in ("none", "int8", "binary"):
+            for factor in factors if mode != "none" else [1]:
+                # reopening converts the codes in place; the full matrix is reused
+                store = LocalVectorStore(path, quantization=mode, oversample=factor)
+
+                def search(q):
+                    return [int(h["text"].split()[1]) for h in store.search_similar(query_embedding=q, top_k=args.top_k)]
+
+                timed_queries(search, queries[:5])
+                latencies = timed_queries(search, queries)
+                scan = store.stats()["scan_bytes"]
+                print(
+                    f"{mode:<10}{factor:>11}{recall(search, queries, exact, args.top_k):>11.3f}"
+                    f"{statistics.median(latencies):>9.2f}{percentile(latencies, 99):>9.2f}"
+                    f"{scan / 2**20:>9.1f}{baseline / scan:>8.1f}x"
+                )
+
+
+if __name__ == "__main__":
+    main()
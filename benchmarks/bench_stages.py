@@ -0,0 +1,204 @@
+"""
+Times each pipeline stage in isolation on a synthetic corpus (see
+benchmarks/synthetic.py): HTML extraction, chunking, prompt building, source
+dedup and Chroma result reshaping. Reports ops/sec, p50/p99 latency and peak
+traced memory per op, and can save the run as JSON and compare it against an
+earlier one; exits with status 1 when a stage regressed beyond --threshold.
+
+    python -m benchmarks.bench_stages [--posts 200] [--out run.json] [--compare base.json --threshold 0.1]
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable
+
+from app.api.routes_chat import build_sources
+from app.core.config import settings
+from app.rag.chroma_store import reshape_query_result
+from app.rag.chunking import chunk_text
+from app.rag.prompt import build_rag_prompt
+from app.rag.vector_store import chunk_metadata
+from app.rag.wordpress import html_to_text
+from benchmarks.bench_vector_store import percentile
+from benchmarks.synthetic import generate_posts
+
+# settings that change what a stage does; runs that differ in them are not comparable
+STAGE_SETTINGS = ("HTML_EXTRACTOR", "CHUNK_STRATEGY", "CHUNK_MAX_TOKENS", "CHUNK_OVERLAP_TOKENS", "CONTEXT_MAX_TOKENS", "TOP_K")
+
+
+def hit_sets(posts: list[dict], chunks: list[list[str]], n: int, rnd: random.Random) -> list[list[dict]]:
+    """Retrieval results the way search returns them: TOP_K hits from a few posts, often adjacent chunks."""
+    out = []
+    candidates = [i for i, c in enumerate(chunks) if c]
+    for _ in range(n):
+        hits = []
+        for p in rnd.sample(candidates, min(3, len(candidates))):
+            post, post_chunks = posts[p], chunks[p]
+            start = rnd.randrange(len(post_chunks))
+            for index in range(start, min(len(post_chunks), start + rnd.randint(1, 3))):
+                meta = chunk_metadata(post["id"], post["title"], f"https://example.com/?p={post['id']}", "2026-01-01T00:00:00", index)
+                hits.append({"id": f"{post['id']}:{index}", "text": post_chunks[index], "meta": meta})
+        rnd.shuffle(hits)
+        hits = hits[:settings.TOP_K]
+        for rank, h in enumerate(hits):
+            h["distance"] = 0.2 + 0.05 * rank
+        out.append(hits)
+    return out
+
+
+def chroma_result(hits: list[dict]) -> dict:
+    return {
+        "ids": [[h["id"] for h in hits]],
+        "documents": [[h["text"] for h in hits]],
+        "metadatas": [[h["meta"] for h in hits]],
+        "distances": [[h["distance"] for h in hits]],
+    }
+
+
+def stages(posts_n: int, seed: int) -> dict[str, tuple[Callable[[Any], Any], list]]:
+    posts = generate_posts(posts_n, seed=seed)
+    texts = [html_to_text(p["html"]) for p in posts]
+    chunks = [chunk_text(t) for t in texts]
+    hits = hit_sets(posts, chunks, posts_n, random.Random(seed))
+    question = "بهترین تنظیمات کش برای افزایش سرعت سایت وردپرس چیست؟"
+    return {
+        "html_to_text": (html_to_text, [p["html"] for p in posts]),
+        "chunk_text": (chunk_text, texts),
+        "build_rag_prompt": (lambda h: build_rag_prompt(question=question, chunks=h, language="Persian"), hits),
+        "build_sources": (build_sources, hits),
+        "reshape_query_result": (reshape_query_result, [chroma_result(h) for h in hits]),
+    }
+
+
+def timed_round(fn: Callable[[Any], Any], inputs: list, min_seconds: float) -> list[float]:
+    """Per-op seconds over whole passes through `inputs` (so every input weighs the same) lasting min_seconds."""
+    latencies: list[float] = []
+    total = 0.0
+    while total < min_seconds or not latencies:
+        for x in inputs:
+            start = time.perf_counter()
+            fn(x)
+            elapsed = time.perf_counter() - start
+            latencies.append(elapsed)
+            total += elapsed
+    return latencies
+
+
+def measure(fn: Callable[[Any], Any], inputs: list, min_seconds: float, rounds: int, memory_samples: int) -> dict:
+    for x in inputs[:10]:
+        fn(x)
+    # best round by throughput, like timeit: the slower ones measure other load on the machine
+    latencies = min((timed_round(fn, inputs, min_seconds) for _ in range(rounds)), key=lambda r: sum(r) / len(r))
+    total = sum(latencies)
+
+    # separate pass: tracing slows everything down several times
+    peak = 0
+    tracemalloc.start()
+    try:
+        for x in inputs[:memory_samples]:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            fn(x)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "ops": len(latencies),
+        "ops_per_sec": len(latencies) / total,
+        "p50_us": percentile(latencies, 50) * 1e6,
+        "p99_us": percentile(latencies, 99) * 1e6,
+        "peak_kib": peak / 1024,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True, cwd=Path(__file__).parent)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, cwd=Path(__file__).parent)
+        return out.stdout.strip() + ("-dirty" if dirty.stdout.strip() else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(run: dict, base: dict, threshold: float) -> list[str]:
+    """Prints the deltas against `base` and returns the stages that regressed."""
+    for name in STAGE_SETTINGS:
+        if run["meta"]["settings"].get(name) != base["meta"]["settings"].get(name):
+            print(f"warning: {name} differs ({base['meta']['settings'].get(name)} -> {run['meta']['settings'].get(name)})")
+    print(f"\nvs {base['meta'].get('commit') or 'baseline'} (threshold {threshold:.0%})")
+    print(f"{'stage':<24}{'ops/s':>10}{'p50':>10}{'p99':>10}{'peak':>10}")
+    regressed = []
+    for name, now in run["stages"].items():
+        then = base["stages"].get(name)
+        if then is None:
+            print(f"{name:<24}{'(new)':>10}")
+            continue
+        speed = now["ops_per_sec"] / then["ops_per_sec"] - 1
+        p50 = now["p50_us"] / then["p50_us"] - 1
+        p99 = now["p99_us"] / then["p99_us"] - 1
+        mem = now["peak_kib"] / then["peak_kib"] - 1 if then["peak_kib"] else 0.0
+        bad = speed < -threshold or p50 > threshold or mem > threshold
+        print(f"{name:<24}{speed:>+10.1%}{p50:>+10.1%}{p99:>+10.1%}{mem:>+10.1%}{'  REGRESSION' if bad else ''}")
+        if bad:
+            regressed.append(name)
+    return regressed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="length of one timing round")
+    parser.add_argument("--rounds", type=int, default=3, help="timing rounds per stage; the best one is reported")
+    parser.add_argument("--memory-samples", type=int, default=50)
+    parser.add_argument("--only", help="comma-separated stage names")
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown/memory growth, 0.10 = 10%%")
+    args = parser.parse_args()
+
+    all_stages = stages(args.posts, args.seed)
+    names = args.only.split(",") if args.only else list(all_stages)
+    unknown = set(names) - set(all_stages)
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(sorted(unknown))} (expected {', '.join(all_stages)})")
+
+    run = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "posts": args.posts,
+            "rounds": args.rounds,
+            "seed": args.seed,
+            "settings": {name: getattr(settings, name) for name in STAGE_SETTINGS},
+        },
+        "stages": {},
+    }
+    print(f"{'stage':<24}{'ops':>8}{'ops/s':>12}{'p50 us':>12}{'p99 us':>12}{'peak KiB':>12}")
+    for name in names:
+        fn, inputs = all_stages[name]
+        r = measure(fn, inputs, args.min_seconds, args.rounds, args.memory_samples)
+        run["stages"][name] = r
+        print(f"{name:<24}{r['ops']:>8}{r['ops_per_sec']:>12.1f}{r['p50_us']:>12.1f}{r['p99_us']:>12.1f}{r['peak_kib']:>12.1f}")
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(run, indent=2), encoding="utf-8")
+        print(f"\nsaved {args.out}")
+    if args.compare:
+        base = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        if compare(run, base, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
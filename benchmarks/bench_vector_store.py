@@ -0,0 +1,147 @@
+"""
+Query latency, recall@k and memory of the local NumPy index vs Chroma on
+random embeddings.
+
+    python -m benchmarks.bench_vector_store [--rows 20000] [--dim 1536] [--chroma-host localhost --chroma-port 8000]
+
+Without --chroma-host, Chroma runs in-process (EphemeralClient), which leaves
+out the network hop the API pays against the chroma container.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import uuid
+
+import numpy as np
+
+from app.rag.local_store import LocalVectorStore
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return 0
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+def timed_queries(search, queries: np.ndarray) -> list[float]:
+    out = []
+    for q in queries:
+        start = time.perf_counter()
+        search(q)
+        out.append((time.perf_counter() - start) * 1000)
+    return out
+
+
+def recall(search, queries: np.ndarray, exact: list[set], k: int) -> float:
+    found = sum(len(set(search(q)) & truth) for q, truth in zip(queries, exact))
+    return found / (k * len(queries))
+
+
+def bench_local(vectors: np.ndarray, queries: np.ndarray, exact: list[set], k: int, dtype: str) -> dict:
+    with tempfile.TemporaryDirectory() as path:
+        before = rss_bytes()
+        store = LocalVectorStore(path, dtype=dtype)
+        start = time.perf_counter()
+        for post, begin in enumerate(range(0, len(vectors), 100)):
+            block = vectors[begin:begin + 100]
+            store.upsert_post_chunks(
+                post_id=post, title="t", url="u", modified_gmt="m",
+                chunks=[f"chunk {begin + i}" for i in range(len(block))], embeddings=block,
+            )
+        insert_s = time.perf_counter() - start
+
+        def search(q):
+            return [int(h["text"].split()[1]) for h in store.search_similar(query_embedding=q, top_k=k)]
+
+        timed_queries(search, queries[:5])  # warm the page cache
+        latencies = timed_queries(search, queries)
+        return {
+            "insert_s": insert_s,
+            "p50_ms": statistics.median(latencies),
+            "p99_ms": percentile(latencies, 99),
+            f"recall@{k}": recall(search, queries, exact, k),
+            "rss_mb": (rss_bytes() - before) / 2**20,
+            "matrix_mb": store.stats()["matrix_bytes"] / 2**20,
+        }
+
+
+def bench_chroma(vectors: np.ndarray, queries: np.ndarray, exact: list[set], k: int, host: str | None, port: int) -> dict:
+    import chromadb
+
+    before = rss_bytes()
+    client = chromadb.HttpClient(host=host, port=port) if host else chromadb.EphemeralClient()
+    name = f"bench_{uuid.uuid4().hex[:8]}"
+    col = client.create_collection(name)
+    try:
+        start = time.perf_counter()
+        for begin in range(0, len(vectors), 1000):
+            block = vectors[begin:begin + 1000]
+            col.add(
+                ids=[str(begin + i) for i in range(len(block))],
+                embeddings=block.tolist(),
+                documents=[f"chunk {begin + i}" for i in range(len(block))],
+            )
+        insert_s = time.perf_counter() - start
+
+        def search(q):
+            res = col.query(query_embeddings=[q.tolist()], n_results=k, include=["documents", "distances"])
+            return [int(i) for i in res["ids"][0]]
+
+        timed_queries(search, queries[:5])
+        latencies = timed_queries(search, queries)
+        return {
+            "insert_s": insert_s,
+            "p50_ms": statistics.median(latencies),
+            "p99_ms": percentile(latencies, 99),
+            f"recall@{k}": recall(search, queries, exact, k),
+            "rss_mb": (rss_bytes() - before) / 2**20 if not host else float("nan"),
+            "matrix_mb": float("nan"),
+        }
+    finally:
+        client.delete_collection(name)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=6)
+    parser.add_argument("--chroma-host")
+    parser.add_argument("--chroma-port", type=int, default=8000)
+    parser.add_argument("--skip-chroma", action="store_true")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.rows, args.dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    # queries near stored vectors, like real questions near their answers
+    queries = vectors[rng.integers(0, args.rows, args.queries)] + 0.05 * rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    exact = [set(np.argsort(((vectors - q) ** 2).sum(axis=1))[:args.top_k].tolist()) for q in queries]
+
+    results = {
+        "local float32": bench_local(vectors, queries, exact, args.top_k, "float32"),
+        "local float16": bench_local(vectors, queries, exact, args.top_k, "float16"),
+    }
+    if not args.skip_chroma:
+        label = f"chroma http {args.chroma_host}" if args.chroma_host else "chroma in-process"
+        results[label] = bench_chroma(vectors, queries, exact, args.top_k, args.chroma_host, args.chroma_port)
+
+    print(f"{args.rows} vectors x {args.dim} dims, {args.queries} queries, top_k={args.top_k}")
+    metrics = list(next(iter(results.values())))
+    print(f"{'backend':<26}" + "".join(f"{m:>12}" for m in metrics))
+    for name, r in results.items():
+        print(f"{name:<26}" + "".join(f"{r[m]:>12.3f}" for m in metrics))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Local stand-ins for the services ingest and chat call: the WordPress REST
+posts endpoint, OpenAI embeddings/responses and Gemini
+embedContent/batchEmbedContents/generateContent. Each one runs in its own
+uvicorn thread and can add latency, jitter, 5xx errors and 429s.
+
+Embeddings are hashed bags of words, so texts that share words are close and
+retrieval returns plausible hits. Used by benchmarks/load_test.py.
+"""
+import asyncio
+import math
+import random
+import re
+import socket
+import threading
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from benchmarks.synthetic import generate_posts
+
+_WORD = re.compile(r"\w+")
+
+
+@dataclass
+class Faults:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0        # share of requests answered 500
+    rate_limit_rate: float = 0.0   # share of requests answered 429
+
+
+class _Injector:
+    """Applies Faults to a request and counts what each endpoint answered."""
+
+    def __init__(self, name: str, seed: int):
+        self.name = name
+        self.counts: Counter = Counter()
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+
+    async def fault(self, faults: Faults, endpoint: str) -> JSONResponse | None:
+        with self._lock:
+            delay = faults.latency_ms + self._rnd.uniform(-faults.jitter_ms, faults.jitter_ms)
+            roll = self._rnd.random()
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if roll < faults.rate_limit_rate:
+            self.counts[f"{endpoint} 429"] += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded", "code": 429}},
+                status_code=429,
+                headers={"Retry-After": "1"},
+            )
+        if roll < faults.rate_limit_rate + faults.error_rate:
+            self.counts[f"{endpoint} 500"] += 1
+            return JSONResponse({"error": {"message": "Injected failure", "code": 500}}, status_code=500)
+        self.counts[f"{endpoint} 200"] += 1
+        return None
+
+
+def fake_embedding(text: str, dims: int) -> list[float]:
+    vec = [0.0] * dims
+    for word in _WORD.findall(text.casefold()):
+        h = zlib.crc32(word.encode("utf-8"))
+        vec[h % dims] += 1.0 if h & 0x80000000 else -1.0
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _answer(prompt: str) -> str:
+    return f"Test answer based on {prompt.count('URL:')} sources ({len(prompt)} prompt characters)."
+
+
+def wordpress_app(posts: list[dict], faults: Faults, injector: _Injector) -> FastAPI:
+    app = FastAPI()
+    rows = [
+        {
+            "id": p["id"],
+            "slug": f"post-{p['id']}",
+            "link": f"https://wp.example/?p={p['id']}",
+            "status": "publish",
+            "modified_gmt": f"2026-01-{1 + p['id'] % 28:02d}T{p['id'] % 24:02d}:00:00",
+            "title": {"rendered": p["title"]},
+            "content": {"rendered": p["html"]},
+        }
+        for p in posts
+    ]
+
+    @app.get("/wp-json/wp/v2/posts")
+    async def list_posts(page: int = 1, per_page: int = 10, modified_after: str | None = None):
+        fault = await injector.fault(faults, "GET /posts")
+        if fault is not None:
+            return fault
+        per_page = max(1, min(per_page, 100))
+        selected = [r for r in rows if not modified_after or r["modified_gmt"] > modified_after]
+        total_pages = max(1, -(-len(selected) // per_page))
+        if page < 1 or page > total_pages:
+            return JSONResponse(
+                {
+                    "code": "rest_post_invalid_page_number",
+                    "message": "The page number requested is larger than the number of pages available.",
+                    "data": {"status": 400},
+                },
+                status_code=400,
+            )
+        return JSONResponse(
+            selected[(page - 1) * per_page:page * per_page],
+            headers={"X-WP-Total": str(len(selected)), "X-WP-TotalPages": str(total_pages)},
+        )
+
+    return app
+
+
+def openai_app(embed: Faults, generate: Faults, injector: _Injector, dims: int) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        fault = await injector.fault(embed, "POST /embeddings")
+        if fault is not None:
+            return fault
+        body = await request.json()
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        size = body.get("dimensions") or dims
+        tokens = sum(_tokens(t) for t in texts)
+        return {
+            "object": "list",
+            "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(t, size)} for i, t in enumerate(texts)],
+            "model": body.get("model"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.post("/v1/responses")
+    async def responses(request: Request):
+        fault = await injector.fault(generate, "POST /responses")
+        if fault is not None:
+            return fault
+        body = await request.json()
+        answer = _answer(body.get("input", ""))
+        usage = {"input_tokens": _tokens(body.get("input", "")), "output_tokens": _tokens(answer)}
+        return {
+            "object": "response",
+            "status": "completed",
+            "output_text": answer,
+            "output": [{"type": "message", "content": [{"type": "output_text", "text": answer}]}],
+            "usage": {**usage, "total_tokens": sum(usage.values())},
+        }
+
+    return app
+
+
+def gemini_app(embed: Faults, generate: Faults, injector: _Injector, dims: int) -> FastAPI:
+    app = FastAPI()
+
+    def embedding(req: dict) -> dict:
+        text = "".join(part.get("text", "") for part in req["content"]["parts"])
+        return {"values": fake_embedding(text, req.get("outputDimensionality") or dims)}
+
+    # "{model}:{method}" is a single path segment
+    @app.post("/v1beta/models/{target}")
+    async def models(target: str, request: Request):
+        _, _, method = target.partition(":")
+        faults = generate if method == "generateContent" else embed
+        fault = await injector.fault(faults, f"POST :{method}")
+        if fault is not None:
+            return fault
+        body = await request.json()
+        if method == "batchEmbedContents":
+            return {"embeddings": [embedding(req) for req in body["requests"]]}
+        if method == "embedContent":
+            return {"embedding": embedding(body)}
+        if method == "generateContent":
+            prompt = "".join(p.get("text", "") for c in body["contents"] for p in c["parts"])
+            answer = _answer(prompt)
+            return {
+                "candidates": [{"content": {"role": "model", "parts": [{"text": answer}]}, "finishReason": "STOP"}],
+                "usageMetadata": {
+                    "promptTokenCount": _tokens(prompt),
+                    "candidatesTokenCount": _tokens(answer),
+                    "totalTokenCount": _tokens(prompt) + _tokens(answer),
+                },
+            }
+        return JSONResponse({"error": {"code": 404, "message": f"Unknown method {method}"}}, status_code=404)
+
+    return app
+
+
+class UpstreamServer:
+    """Serves an ASGI app on a free localhost port from a background thread."""
+
+    def __init__(self, app: FastAPI):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(("127.0.0.1", 0))
+        self.url = f"http://127.0.0.1:{self._sock.getsockname()[1]}"
+        self._server = uvicorn.Server(uvicorn.Config(app, log_level="warning", lifespan="off", backlog=2048))
+        self._thread = threading.Thread(target=self._server.run, kwargs={"sockets": [self._sock]}, daemon=True)
+
+    def start(self) -> "UpstreamServer":
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError(f"Server on {self.url} did not start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=10)
+
+
+@dataclass
+class Upstreams:
+    wordpress: UpstreamServer
+    openai: UpstreamServer
+    gemini: UpstreamServer
+    injectors: list[_Injector]
+
+    def counts(self) -> dict[str, dict[str, int]]:
+        return {i.name: dict(sorted(i.counts.items())) for i in self.injectors}
+
+    def stop(self) -> None:
+        for server in (self.wordpress, self.openai, self.gemini):
+            server.stop()
+
+
+def start_upstreams(
+    *,
+    posts: int,
+    seed: int = 0,
+    dims: int = 256,
+    wordpress: Faults | None = None,
+    embed: Faults | None = None,
+    generate: Faults | None = None,
+) -> Upstreams:
+    injectors = [_Injector(name, seed + i) for i, name in enumerate(("wordpress", "openai", "gemini"))]
+    wp, oa, gm = injectors
+    embed, generate = embed or Faults(), generate or Faults()
+    return Upstreams(
+        wordpress=UpstreamServer(wordpress_app(generate_posts(posts, seed=seed), wordpress or Faults(), wp)).start(),
+        openai=UpstreamServer(openai_app(embed, generate, oa, dims)).start(),
+        gemini=UpstreamServer(gemini_app(embed, generate, gm, dims)).start(),
+        injectors=injectors,
+    )
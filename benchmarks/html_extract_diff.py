@@ -0,0 +1,82 @@
+"""
+Differential check: the streaming extractor must return exactly what the
+BeautifulSoup extractor returns.
+
+    python -m benchmarks.html_extract_diff            # corpus + fuzz
+    python -m benchmarks.html_extract_diff --wp 200   # also the first 200 posts of WP_BASE_URL
+"""
+import argparse
+import random
+import sys
+from pathlib import Path
+
+from app.rag.html_extract import SoupExtractor, StreamExtractor
+
+CORPUS = Path(__file__).parent / "corpus"
+
+FRAGMENTS = [
+    "<p>", "</p>", "<div class='x'>", "</div>", "<br>", "<br/>", "<b>", "</b>", "<li>", "</ul>",
+    "<script>", "</script>", "<style>", "</style>", "<noscript>", "</noscript>", "<script/>",
+    "<!-- c -->", "<![CDATA[cd]]>", "&amp;", "&nbsp;", "&#8211;", "&#x2014;", "&bogus;", "& ", "&lt;",
+    "<SCRIPT>", "</NOSCRIPT>", "<br></br>", "</br>", "</hr>", "</img>", "<p/>", "<noscript/>", "<pre>", "</pre>", "<?pi x?>",
+    "<!DOCTYPE html>", "&#150;", "&#x110000;", "&#0;", "&copy", "\r\n", "<textarea>", "</textarea>",
+    "text", "متن فارسی", "‌", " ", "\n", "  \t ", "a<b", "x > y", "<img src='a.png'>", "</span>",
+]
+
+
+def load_corpus() -> list[tuple[str, str]]:
+    docs = []
+    for path in sorted(CORPUS.glob("*.html")):
+        docs.append((path.name, path.read_text(encoding="utf-8")))
+    titles = CORPUS / "titles.txt"
+    if titles.exists():
+        for i, line in enumerate(titles.read_text(encoding="utf-8").splitlines()):
+            docs.append((f"titles.txt:{i + 1}", line))
+    return docs
+
+
+def fuzz_docs(n: int, seed: int) -> list[tuple[str, str]]:
+    rnd = random.Random(seed)
+    return [(f"fuzz:{i}", "".join(rnd.choice(FRAGMENTS) for _ in range(rnd.randint(1, 40)))) for i in range(n)]
+
+
+def wordpress_docs(limit: int) -> list[tuple[str, str]]:
+    from app.rag.wordpress import iter_posts
+
+    docs = []
+    for post in iter_posts():
+        for field in ("title", "content"):
+            value = post.get(field)
+            if isinstance(value, dict):
+                docs.append((f"wp:{post['id']}:{field}", value.get("rendered") or ""))
+        if len(docs) >= 2 * limit:
+            break
+    return docs
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fuzz", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--wp", type=int, default=0, help="also compare this many live WordPress posts")
+    args = parser.parse_args()
+
+    docs = load_corpus() + fuzz_docs(args.fuzz, args.seed)
+    if args.wp:
+        docs += wordpress_docs(args.wp)
+
+    soup, stream = SoupExtractor(), StreamExtractor()
+    failures = 0
+    for name, html in docs:
+        expected, got = soup.extract(html), stream.extract(html)
+        if expected != got:
+            failures += 1
+            if failures <= 10:
+                print(f"MISMATCH {name}\n  input:    {html[:200]!r}\n  soup:     {expected[:200]!r}\n  stream:   {got[:200]!r}")
+
+    print(f"{len(docs) - failures}/{len(docs)} documents identical")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
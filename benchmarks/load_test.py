@@ -0,0 +1,205 @@
+"""
+End-to-end load test against local fakes of WordPress, OpenAI and Gemini
+(benchmarks/fake_upstreams.py), with the local vector store, SQLite and a
+throwaway data directory, so no API quota is used. Runs ingest_wordpress
+once, then serves the API with uvicorn and sends /v1/chat requests at the
+given concurrency. Reports throughput, latency percentiles and error rates.
+
+    python -m benchmarks.load_test [--posts 500] [--requests 500 --concurrency 32] [--provider openai|gemini]
+        [--embed-latency-ms 80 --llm-latency-ms 800 --jitter-ms 50 --error-rate 0.01 --rate-limit-rate 0.02]
+
+Redis is taken from REDIS_URL (default redis://localhost:6379/0); without
+one the caches and chat coalescing fall back to running every request.
+Other settings (TOP_K, RETRIEVAL_MODE, ...) can be overridden through the
+environment as usual.
+
+Outcomes are HTTP status codes, or the httpx error name for requests that got
+no response. ReadError/RemoteProtocolError show up next to 500s: uvicorn drops
+the keep-alive connection after an unhandled exception, failing requests
+already queued on it.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+from benchmarks.fake_upstreams import Faults, UpstreamServer, start_upstreams
+from benchmarks.synthetic import EN_WORDS, FA_WORDS
+
+
+def configure(args: argparse.Namespace, upstreams, data_dir: Path) -> None:
+    """Point the app at the fakes. Must run before anything under app/ is imported (settings are read at import)."""
+    os.environ.update({
+        "WP_BASE_URL": upstreams.wordpress.url,
+        "OPENAI_BASE_URL": upstreams.openai.url + "/v1",
+        "GEMINI_BASE_URL": upstreams.gemini.url + "/v1beta",
+        "OPENAI_API_KEY": "load-test",
+        "GEMINI_API_KEY": "load-test",
+        "EMBEDDING_PROVIDER": args.provider,
+        "LLM_PROVIDER": args.provider,
+        "EMBEDDING_DIMENSIONS": str(args.dims),
+        "API_KEY": "load-test",
+        "VECTOR_STORE": "local",
+        "LOCAL_VECTOR_PATH": str(data_dir / "vectors"),
+        "LEXICAL_INDEX_PATH": str(data_dir / "lexical.sqlite3"),
+        "EMBEDDING_CACHE_PATH": str(data_dir / "embedding_cache.sqlite3"),
+        "DATABASE_URL": f"sqlite:///{data_dir / 'rag.db'}",
+        # the ingest runs in this process, so there is no worker to fan out to
+        "INGEST_MAX_PARALLEL": "1",
+    })
+    os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+    os.environ.setdefault("CELERY_BROKER_URL", "memory://")
+    os.environ.setdefault("CELERY_RESULT_BACKEND", "cache+memory://")
+
+
+def questions(n: int, seed: int) -> list[str]:
+    rnd = random.Random(seed)
+    out = []
+    for i in range(n):
+        words = FA_WORDS if i % 3 else EN_WORDS
+        out.append(" ".join(rnd.choice(words) for _ in range(rnd.randint(3, 8))) + ("؟" if words is FA_WORDS else "?"))
+    return out
+
+
+def run_ingest() -> dict:
+    from app.db.models import Base
+    from app.db.session import engine
+    from app.tasks.ingest import ingest_wordpress
+
+    Base.metadata.create_all(bind=engine)  # app.main does this at import; the ingest may run without it
+    started = time.perf_counter()
+    result = ingest_wordpress.apply(kwargs={"full_resync": True})
+    elapsed = time.perf_counter() - started
+    if result.failed():
+        return {"ok": False, "error": repr(result.result), "elapsed_s": round(elapsed, 3)}
+    summary = result.result
+    return {
+        **{k: v for k, v in summary.items() if k != "stages"},
+        "elapsed_s": round(elapsed, 3),
+        "posts_per_s": round(summary.get("fetched_posts", 0) / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+async def drive_chat(url: str, pool: list[str], requests: int, concurrency: int, seed: int) -> dict:
+    rnd = random.Random(seed)
+    todo = [rnd.choice(pool) for _ in range(requests)]
+    latencies: list[float] = []
+    outcomes: Counter = Counter()
+
+    async with httpx.AsyncClient(
+        base_url=url,
+        headers={"X-API-Key": os.environ["API_KEY"]},
+        timeout=120,
+        limits=httpx.Limits(max_connections=concurrency),
+    ) as client:
+        async def worker() -> None:
+            while todo:
+                question = todo.pop()
+                started = time.perf_counter()
+                try:
+                    r = await client.post("/v1/chat", json={"question": question, "language": "Persian"})
+                    outcomes[str(r.status_code)] += 1
+                except httpx.HTTPError as e:
+                    outcomes[type(e).__name__] += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    from benchmarks.bench_vector_store import percentile
+
+    ok = outcomes.get("200", 0)
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(requests / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p90_ms": round(percentile(latencies, 90) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1),
+        "error_rate": round(1 - ok / requests, 4),
+        "outcomes": dict(outcomes),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--distinct-questions", type=int, default=200, help="questions are drawn from a pool this size")
+    parser.add_argument("--provider", choices=("openai", "gemini"), default="openai")
+    parser.add_argument("--dims", type=int, default=256)
+    parser.add_argument("--wp-latency-ms", type=float, default=50)
+    parser.add_argument("--embed-latency-ms", type=float, default=80)
+    parser.add_argument("--llm-latency-ms", type=float, default=800)
+    parser.add_argument("--jitter-ms", type=float, default=0, help="uniform +/- jitter added to every upstream call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of provider calls answered 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of provider calls answered 429")
+    parser.add_argument("--skip-ingest", action="store_true")
+    parser.add_argument("--skip-chat", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", help="keep the index here instead of a temporary directory")
+    parser.add_argument("--out", help="write the report to this JSON file")
+    args = parser.parse_args()
+
+    def provider(latency: float) -> Faults:
+        return Faults(latency, args.jitter_ms, args.error_rate, args.rate_limit_rate)
+
+    upstreams = start_upstreams(
+        posts=args.posts,
+        seed=args.seed,
+        dims=args.dims,
+        wordpress=Faults(args.wp_latency_ms, args.jitter_ms),
+        embed=provider(args.embed_latency_ms),
+        generate=provider(args.llm_latency_ms),
+    )
+    tmp = None if args.data_dir else tempfile.TemporaryDirectory(prefix="rag-load-")
+    data_dir = Path(args.data_dir or tmp.name)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    configure(args, upstreams, data_dir)
+    report: dict = {"args": vars(args)}
+    api = None
+    try:
+        if not args.skip_ingest:
+            print(f"Ingesting {args.posts} posts ...")
+            report["ingest"] = run_ingest()
+            print(json.dumps(report["ingest"], indent=2))
+
+        if not args.skip_chat:
+            from app.main import app
+
+            api = UpstreamServer(app).start()
+            print(f"Sending {args.requests} chat requests, {args.concurrency} at a time ...")
+            pool = questions(args.distinct_questions, args.seed)
+            report["chat"] = asyncio.run(drive_chat(api.url, pool, args.requests, args.concurrency, args.seed))
+            print(json.dumps(report["chat"], indent=2))
+
+        report["upstream_calls"] = upstreams.counts()
+        print("\nUpstream calls:")
+        for name, counts in report["upstream_calls"].items():
+            for endpoint, n in counts.items():
+                print(f"  {name:<10} {endpoint:<28} {n:>8}")
+    finally:
+        if api is not None:
+            api.stop()
+        upstreams.stop()
+        if tmp is not None:
+            tmp.cleanup()
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"\nsaved {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Synthetic WordPress post generator: long Persian and English posts with
+Gutenberg block comments, headings, lists, tables, shortcodes, embeds,
+inline scripts/styles and entities, deterministic for a given seed.
+
+    from benchmarks.synthetic import generate_posts
+    posts = generate_posts(200, seed=0)   # list of {"id", "title", "html"}
+"""
+import random
+
+FA_WORDS = (
+    "هوش مصنوعی یادگیری ماشین داده پایگاه سرور کاربر برنامه‌نویسی توسعه طراحی سایت وردپرس افزونه قالب "
+    "امنیت سرعت بهینه‌سازی جستجو محتوا مقاله آموزش راهنما خرید قیمت گوشی لپ‌تاپ پردازنده حافظه باتری "
+    "نمایشگر کیفیت عملکرد نسخه جدید قدیمی بررسی مقایسه انتخاب نصب پیکربندی تنظیمات مدیریت شبکه ابری "
+    "می‌شود می‌کند است بود دارد شده‌اند خواهد کرد را با از به در برای که این آن یک هر همه بسیار"
+).split()
+EN_WORDS = (
+    "the a of to and in for with on by from retrieval model search index vector embedding latency "
+    "throughput cache server client request response plugin theme post page user content performance "
+    "database query memory processor battery display quality release update review compare choose install "
+    "configure settings network cloud security fast slow better new old is are was has have will can should"
+).split()
+TITLE_FA = ["راهنمای کامل", "بررسی", "آموزش", "مقایسه", "۱۰ نکته درباره", "چگونه"]
+TITLE_EN = ["A complete guide to", "Review:", "How to", "Comparing", "10 tips about", "Why"]
+
+SCRIPTS = [
+    '<script type="application/ld+json">{"@context":"https://schema.org","@type":"Article","headline":"%s"}</script>',
+    "<script>window.dataLayer=window.dataLayer||[];function gtag(){dataLayer.push(arguments)}gtag('js',new Date());</script>",
+    "<style>.wp-block-table td{padding:4px}.has-text-align-center{text-align:center}</style>",
+    "<noscript><img src=\"https://px.example.com/t.gif\" alt=\"\"></noscript>",
+]
+
+
+def _sentence(rnd: random.Random, words: list[str], end: str) -> str:
+    n = rnd.randint(6, 22)
+    text = " ".join(rnd.choice(words) for _ in range(n))
+    if words is EN_WORDS:
+        text = text[0].upper() + text[1:]
+    return text + rnd.choice(end)
+
+
+def _paragraph(rnd: random.Random, persian: bool) -> str:
+    words, end = (FA_WORDS, ".؟!") if persian else (EN_WORDS, ".?!")
+    sentences = [_sentence(rnd, words, end) for _ in range(rnd.randint(2, 7))]
+    if rnd.random() < 0.3:
+        i = rnd.randrange(len(sentences))
+        sentences[i] = f'<a href="https://example.com/p/{rnd.randint(1, 9999)}">{sentences[i]}</a>'
+    if rnd.random() < 0.3:
+        sentences.append(rnd.choice(["&nbsp;", "&#8211;", "&amp;", "&laquo;نقل&raquo;", "&#x2014;", "&hellip;"]))
+    return "<!-- wp:paragraph -->\n<p>" + " ".join(sentences) + "</p>\n<!-- /wp:paragraph -->"
+
+
+def _table(rnd: random.Random, persian: bool) -> str:
+    words = FA_WORDS if persian else EN_WORDS
+    rows = []
+    for r in range(rnd.randint(3, 12)):
+        tag = "th" if r == 0 else "td"
+        cells = "".join(
+            f"<{tag}>{rnd.choice(words)} {rnd.randint(1, 99_000_000):,}</{tag}>" for _ in range(rnd.randint(2, 6))
+        )
+        rows.append(f"<tr>{cells}</tr>")
+    return '<!-- wp:table -->\n<figure class="wp-block-table"><table><tbody>' + "".join(rows) + "</tbody></table></figure>\n<!-- /wp:table -->"
+
+
+def _block(rnd: random.Random, persian: bool, title: str) -> str:
+    words = FA_WORDS if persian else EN_WORDS
+    kind = rnd.random()
+    if kind < 0.55:
+        return _paragraph(rnd, persian)
+    if kind < 0.65:
+        level = rnd.choice([2, 3])
+        heading = " ".join(rnd.choice(words) for _ in range(rnd.randint(2, 6)))
+        return f"<!-- wp:heading -->\n<h{level} class=\"wp-block-heading\">{heading}</h{level}>\n<!-- /wp:heading -->"
+    if kind < 0.73:
+        items = "".join(f"<li>{_sentence(rnd, words, '.')}</li>" for _ in range(rnd.randint(3, 8)))
+        return f"<!-- wp:list -->\n<ul>{items}</ul>\n<!-- /wp:list -->"
+    if kind < 0.80:
+        return _table(rnd, persian)
+    if kind < 0.86:
+        caption = _sentence(rnd, words, ".")
+        return (
+            f'[caption id="attachment_{rnd.randint(1, 9999)}" align="aligncenter" width="800"]'
+            f'<img src="https://example.com/wp-content/uploads/{rnd.randint(1, 999)}.jpg" width="800" height="450" /> {caption}[/caption]'
+        )
+    if kind < 0.90:
+        return f'[gallery ids="{",".join(str(rnd.randint(1, 9999)) for _ in range(rnd.randint(3, 9)))}" columns="3"]'
+    if kind < 0.94:
+        return (
+            '<!-- wp:embed {"providerNameSlug":"youtube"} -->\n<figure class="wp-block-embed"><div class="wp-block-embed__wrapper">'
+            f'<iframe src="https://www.youtube.com/embed/{rnd.randint(10**9, 10**10)}" allowfullscreen></iframe></div></figure>\n<!-- /wp:embed -->'
+        )
+    if kind < 0.97:
+        return f"<pre class=\"wp-block-code\"><code>def f(x):\n    return x &lt; {rnd.randint(1, 100)}</code></pre>"
+    return rnd.choice(SCRIPTS).replace("%s", title)
+
+
+def generate_post(rnd: random.Random, post_id: int, *, min_bytes: int, max_bytes: int, persian_share: float) -> dict:
+    persian = rnd.random() < persian_share
+    words = FA_WORDS if persian else EN_WORDS
+    title = f"{rnd.choice(TITLE_FA if persian else TITLE_EN)} {' '.join(rnd.choice(words) for _ in range(rnd.randint(2, 5)))}"
+    target = rnd.randint(min_bytes, max_bytes)
+    blocks, size = [], 0
+    while size < target:
+        # a few English blocks in Persian posts and vice versa, as in real bilingual blogs
+        block = _block(rnd, persian if rnd.random() < 0.9 else not persian, title)
+        blocks.append(block)
+        size += len(block.encode("utf-8"))
+    return {"id": post_id, "title": title, "html": "\n\n".join(blocks)}
+
+
+def generate_posts(n: int, *, seed: int = 0, min_bytes: int = 4_000, max_bytes: int = 80_000, persian_share: float = 0.6) -> list[dict]:
+    rnd = random.Random(seed)
+    return [
+        generate_post(rnd, i + 1, min_bytes=min_bytes, max_bytes=max_bytes, persian_share=persian_share)
+        for i in range(n)
+    ]
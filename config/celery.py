@@ -1,5 +1,7 @@
 import os
 from celery import Celery
+from celery.signals import worker_init, worker_process_shutdown
+from prometheus_client import start_http_server
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
@@ -8,6 +10,8 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
 from config.settings import settings
+from rag.http import close_clients
+from rag.metrics import metrics_registry
 
 app.conf.update(
     broker_url=settings.CELERY_BROKER_URL,
@@ -15,3 +19,16 @@ app.conf.update(
     task_track_started=True,
     worker_prefetch_multiplier=1,
 )
+
+
+@worker_init.connect
+def _serve_metrics(**kwargs):
+    # ingest counters live in the worker; with the prefork pool set PROMETHEUS_MULTIPROC_DIR so children's counts are included
+    if settings.METRICS_WORKER_PORT:
+        start_http_server(settings.METRICS_WORKER_PORT, registry=metrics_registry())
+
+
+@worker_process_shutdown.connect
+def _close_http_clients(**kwargs):
+    # prefork children exit without running atexit handlers
+    close_clients()
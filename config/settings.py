@@ -30,6 +30,9 @@ class Settings(BaseSettings):
     CELERY_BROKER_URL: str
     CELERY_RESULT_BACKEND: str
 
+    # Metrics (the API serves /metrics; Celery workers only when a port is set)
+    METRICS_WORKER_PORT: int = 0
+
     # Chroma
     CHROMA_HOST: str = "chroma"
     CHROMA_PORT: int = 8000
@@ -41,9 +44,25 @@ class Settings(BaseSettings):
     TOP_K: int = 6
     MAX_CONTEXT_CHUNKS: int = 6
 
+    # Query embedding memoization (in-process LRU + Redis)
+    QUERY_EMBED_CACHE_MAX_SIZE: int = 10000
+    QUERY_EMBED_CACHE_TTL_SECONDS: int = 86400
+
     # Providers
     EMBEDDING_PROVIDER: str = "openai"
     LLM_PROVIDER: str = "openai"
+    EMBEDDING_DIMENSIONS: int = 0
+
+    # Embedding cache
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: str = "data/embedding_cache.sqlite3"
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 500000
+
+    # Embedding batching across posts during ingest
+    EMBED_BATCH_MAX_ITEMS: int = 256
+    EMBED_BATCH_MAX_TOKENS: int = 100000
+    EMBED_BATCH_MAX_WAIT_MS: int = 500
+    INGEST_DB_BATCH_SIZE: int = 500
 
     # OpenAI
     OPENAI_API_KEY: str | None = None
@@ -6,13 +6,31 @@ from django.db.models import Max
 from .models import Post
 from rag.wordpress import fetch_posts, html_to_text
 from rag.chunking import chunk_text
-from rag.embeddings import embed_texts
-from rag.chroma_store import upsert_post_chunks
+from rag.embed_batcher import EmbeddingBatcher
+from rag.embedding_cache import cache_counters
+from rag.chroma_store import ChunkDiff, apply_chunk_diff, diff_post_chunks
+from rag.metrics import INGEST_CHUNKS, INGEST_POSTS
+from config.settings import settings
+
+_UPSERT_FIELDS = ['slug', 'url', 'title', 'modified_gmt', 'status', 'last_ingested_at', 'updated_at']
+
+
+def _bulk_upsert_posts(rows: list[dict]) -> None:
+    """One INSERT ... ON CONFLICT (wp_post_id) DO UPDATE per batch instead of update_or_create per post."""
+    now = django_tz.now()
+    Post.objects.bulk_create(
+        [Post(**row, last_ingested_at=now, updated_at=now) for row in rows],
+        update_conflicts=True,
+        unique_fields=['wp_post_id'],
+        update_fields=_UPSERT_FIELDS,
+        batch_size=settings.INGEST_DB_BATCH_SIZE,
+    )
 
 
 @shared_task(name='ingest_wordpress')
 def ingest_wordpress(full_resync: bool = False) -> dict:
     now = datetime.now(timezone.utc)
+    cache_before = cache_counters()
     
     modified_after = None
     if not full_resync:
@@ -20,14 +38,58 @@ def ingest_wordpress(full_resync: bool = False) -> dict:
         modified_after = latest
     
     posts = fetch_posts(modified_after=modified_after)
+    INGEST_POSTS.labels('fetched').inc(len(posts))
     
     processed = 0
+    skipped = 0
+    pending_rows: list[dict] = []
+    
+    def flush_rows() -> None:
+        nonlocal processed
+        if pending_rows:
+            _bulk_upsert_posts(pending_rows)
+            processed += len(pending_rows)
+            INGEST_POSTS.labels('processed').inc(len(pending_rows))
+            pending_rows.clear()
+    
+    # Only chunks whose content changed are embedded; the rest keep their vectors
+    diffs: dict[int, tuple[ChunkDiff, list[str]]] = {}
+    
+    def write_post(post: dict, added: list[str], embeddings: list[list[float]]) -> None:
+        diff, chunks = diffs.pop(post['wp_post_id'])
+        apply_chunk_diff(
+            diff,
+            title=post['title'],
+            url=post['url'],
+            modified_gmt=post['modified_gmt'],
+            chunks=chunks,
+            embeddings=embeddings,
+        )
+        
+        pending_rows.append(post)
+        if len(pending_rows) >= settings.INGEST_DB_BATCH_SIZE:
+            flush_rows()
+    
+    batcher = EmbeddingBatcher(write_post)
+    
+    # One query per batch of posts for change detection
+    known: dict[int, str | None] = {}
+    batch_size = settings.INGEST_DB_BATCH_SIZE
+    for start in range(0, len(posts), batch_size):
+        batch_ids = [int(p['id']) for p in posts[start:start + batch_size]]
+        known.update(Post.objects.filter(wp_post_id__in=batch_ids).values_list('wp_post_id', 'modified_gmt'))
+    
     for p in posts:
         wp_id = int(p['id'])
         slug = p.get('slug')
         status_val = p.get('status')
         modified_gmt = p.get('modified_gmt')
         
+        if wp_id in known and known[wp_id] == modified_gmt:
+            skipped += 1
+            INGEST_POSTS.labels('skipped').inc()
+            continue
+        
         title = (p.get('title') or {}).get('rendered') if isinstance(p.get('title'), dict) else p.get('title')
         link = p.get('link')
         content_html = (p.get('content') or {}).get('rendered') if isinstance(p.get('content'), dict) else ''
@@ -37,32 +99,35 @@ def ingest_wordpress(full_resync: bool = False) -> dict:
         if not chunks:
             continue
         
-        embeddings = embed_texts(chunks)
-        upsert_post_chunks(
-            post_id=wp_id,
-            title=html_to_text(title or ''),
-            url=link,
-            modified_gmt=modified_gmt,
-            chunks=chunks,
-            embeddings=embeddings,
-        )
-        
-        Post.objects.update_or_create(
-            wp_post_id=wp_id,
-            defaults={
+        diff = diff_post_chunks(post_id=wp_id, chunks=chunks)
+        INGEST_CHUNKS.labels('embedded').inc(len(diff.added))
+        INGEST_CHUNKS.labels('unchanged').inc(len(diff.kept))
+        INGEST_CHUNKS.labels('removed').inc(len(diff.removed))
+        diffs[wp_id] = (diff, chunks)
+        batcher.add(
+            {
+                'wp_post_id': wp_id,
                 'slug': slug,
                 'url': link,
                 'title': html_to_text(title or ''),
                 'modified_gmt': modified_gmt,
                 'status': status_val,
-                'last_ingested_at': django_tz.now(),
-            }
+            },
+            [chunks[i] for i in diff.added],
         )
-        processed += 1
     
+    batcher.flush()
+    flush_rows()
+    
+    cache_after = cache_counters()
     return {
         'ok': True,
         'processed_posts': processed,
+        'skipped_posts': skipped,
         'fetched_posts': len(posts),
+        'embedding_requests': batcher.requests,
+        'embedding_cache_hits': cache_after['hits'] - cache_before['hits'],
+        'embedding_cache_misses': cache_after['misses'] - cache_before['misses'],
+        'embedding_tokens_saved': cache_after['tokens_saved'] - cache_before['tokens_saved'],
         'finished_at': now.isoformat()
     }
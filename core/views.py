@@ -1,5 +1,7 @@
 from datetime import datetime, timezone
 from django.core.paginator import Paginator
+from django.http import HttpResponse
+from prometheus_client import CONTENT_TYPE_LATEST
 from rest_framework.decorators import api_view, authentication_classes
 from rest_framework.response import Response
 from rest_framework import status
@@ -9,10 +11,11 @@ from .authentication import APIKeyAuthentication
 from .models import Post, IngestJob
 from .serializers import PostSerializer, ChatRequestSerializer
 from .tasks import ingest_wordpress
-from rag.embeddings import embed_texts
+from rag.query_embeddings import embed_query
 from rag.chroma_store import search_similar
 from rag.prompt import build_rag_prompt
 from rag.llm import generate_answer
+from rag.metrics import StageTimer, render_metrics
 from config.settings import settings
 
 
@@ -21,6 +24,11 @@ def health(request):
     return Response({'ok': True})
 
 
+def metrics(request):
+    # Prometheus scrape endpoint; like health it takes no API key
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE_LATEST)
+
+
 @api_view(['POST'])
 @authentication_classes([APIKeyAuthentication])
 def run_ingest(request):
@@ -95,13 +103,20 @@ def chat(request):
         return Response({'detail': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
     
     question = serializer.validated_data['question']
-    
-    q_emb = embed_texts([question])[0]
-    hits = search_similar(query_embedding=q_emb, top_k=settings.TOP_K)
-    hits = hits[:settings.MAX_CONTEXT_CHUNKS]
-    
-    prompt = build_rag_prompt(question=question, chunks=hits)
-    answer = generate_answer(prompt=prompt)
+    timer = StageTimer()
+    try:
+        with timer.stage('embed'):
+            q_emb = embed_query(question)
+        with timer.stage('retrieve'):
+            hits = search_similar(query_embedding=q_emb, top_k=settings.TOP_K)
+        hits = hits[:settings.MAX_CONTEXT_CHUNKS]
+        
+        with timer.stage('prompt'):
+            prompt = build_rag_prompt(question=question, chunks=hits)
+        with timer.stage('generate'):
+            answer = generate_answer(prompt=prompt)
+    finally:
+        server_timing = timer.finish()
     
     sources = []
     for h in hits:
@@ -115,4 +130,6 @@ def chat(request):
             'excerpt': (h.get('text') or '')[:300],
         })
     
-    return Response({'answer': answer, 'sources': sources})
+    response = Response({'answer': answer, 'sources': sources})
+    response['Server-Timing'] = server_timing
+    return response
@@ -1,11 +1,225 @@
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, TypeVar
+
 import chromadb
+import httpx
 from chromadb.api.models.Collection import Collection
+from chromadb.errors import InvalidCollectionException, NotFoundError
+
 from config.settings import settings
+from rag.latency import LatencyCounters
+
+T = TypeVar('T')
+
+# Errors after which the cached client/collection is dropped and the call retried once:
+# Chroma restarted (connection refused/reset) or the collection was recreated.
+_RECONNECT_ERRORS = (httpx.TransportError, ConnectionError, InvalidCollectionException, NotFoundError)
+
+
+def chunk_ids(post_id: int, chunks: list[str]) -> list[str]:
+    """Content-derived ids: an unchanged chunk keeps its id wherever it moves in the post."""
+    ids = []
+    seen: dict[str, int] = {}
+    for chunk in chunks:
+        digest = hashlib.sha256(chunk.strip().encode('utf-8')).hexdigest()[:16]
+        n = seen.get(digest, 0)
+        seen[digest] = n + 1
+        ids.append(f'{post_id}:{digest}' if n == 0 else f'{post_id}:{digest}:{n}')
+    return ids
+
+
+def chunk_metadata(post_id: int, title: str | None, url: str | None, modified_gmt: str | None, index: int) -> dict:
+    return {
+        'post_id': str(post_id),
+        'title': (title or '')[:500],
+        'url': (url or '')[:2000],
+        'modified_gmt': (modified_gmt or '')[:64],
+        'chunk_index': index,
+    }
+
+
+@dataclass
+class ChunkDiff:
+    """Old vs new chunk set of one post. `added`/`kept` index into the new chunk list."""
+    post_id: int
+    ids: list[str]
+    added: list[int] = field(default_factory=list)
+    kept: list[int] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    existing_metadata: dict[str, dict] = field(default_factory=dict)
+
+
+def diff_chunks(post_id: int, chunks: list[str], existing: dict[str, dict]) -> ChunkDiff:
+    """`existing` maps the stored chunk ids of the post to their metadata."""
+    ids = chunk_ids(post_id, chunks)
+    diff = ChunkDiff(post_id=post_id, ids=ids, existing_metadata=existing)
+    for i, chunk_id in enumerate(ids):
+        (diff.kept if chunk_id in existing else diff.added).append(i)
+    new_ids = set(ids)
+    diff.removed = [chunk_id for chunk_id in existing if chunk_id not in new_ids]
+    return diff
+
+
+class ChromaStore:
+    """One Chroma client and collection handle per process, reconnected on demand."""
+
+    def __init__(self, *, host: str, port: int, collection_name: str):
+        self.host = host
+        self.port = port
+        self.collection_name = collection_name
+        self.latency = LatencyCounters()
+        self.reconnects = 0
+        self._lock = threading.Lock()
+        self._collection: Collection | None = None
+
+    def collection(self) -> Collection:
+        col = self._collection
+        if col is not None:
+            return col
+        with self._lock:
+            if self._collection is None:
+                with self.latency.time('connect'):
+                    client = chromadb.HttpClient(host=self.host, port=self.port)
+                    self._collection = client.get_or_create_collection(name=self.collection_name)
+            return self._collection
+
+    def reset(self) -> None:
+        with self._lock:
+            self._collection = None
+
+    def _call(self, op: str, fn: Callable[[Collection], T]) -> T:
+        try:
+            with self.latency.time(op):
+                return fn(self.collection())
+        except _RECONNECT_ERRORS:
+            self.reset()
+            self.reconnects += 1
+            with self.latency.time(op):
+                return fn(self.collection())
+
+    def diff_post_chunks(self, *, post_id: int, chunks: list[str]) -> ChunkDiff:
+        res = self._call('get', lambda col: col.get(where={'post_id': str(post_id)}, include=['metadatas']))
+        return diff_chunks(post_id, chunks, dict(zip(res.get('ids') or [], res.get('metadatas') or [])))
+
+    def apply_chunk_diff(
+        self,
+        diff: ChunkDiff,
+        *,
+        title: str | None,
+        url: str | None,
+        modified_gmt: str | None,
+        chunks: list[str],
+        embeddings: list[list[float]],
+    ) -> None:
+        """Delete removed chunks, add new ones (`embeddings` aligned with diff.added) and patch stale metadata of kept ones."""
+        if len(embeddings) != len(diff.added):
+            raise RuntimeError(f'Got {len(embeddings)} embeddings for {len(diff.added)} added chunks')
+
+        if diff.removed:
+            self._call('delete', lambda col: col.delete(ids=diff.removed))
+
+        if diff.added:
+            ids = [diff.ids[i] for i in diff.added]
+            documents = [chunks[i] for i in diff.added]
+            metadatas = [chunk_metadata(diff.post_id, title, url, modified_gmt, i) for i in diff.added]
+            self._call('add', lambda col: col.add(ids=ids, documents=documents, embeddings=embeddings, metadatas=metadatas))
+
+        stale_ids, stale_metadatas = [], []
+        for i in diff.kept:
+            meta = chunk_metadata(diff.post_id, title, url, modified_gmt, i)
+            if diff.existing_metadata.get(diff.ids[i]) != meta:
+                stale_ids.append(diff.ids[i])
+                stale_metadatas.append(meta)
+        if stale_ids:
+            self._call('update', lambda col: col.update(ids=stale_ids, metadatas=stale_metadatas))
+
+    def upsert_post_chunks(
+        self,
+        *,
+        post_id: int,
+        title: str | None,
+        url: str | None,
+        modified_gmt: str | None,
+        chunks: list[str],
+        embeddings: list[list[float]],
+    ) -> ChunkDiff:
+        diff = self.diff_post_chunks(post_id=post_id, chunks=chunks)
+        self.apply_chunk_diff(
+            diff,
+            title=title,
+            url=url,
+            modified_gmt=modified_gmt,
+            chunks=chunks,
+            embeddings=[embeddings[i] for i in diff.added],
+        )
+        return diff
+
+    def search_similar(self, *, query_embedding: list[float], top_k: int) -> list[dict]:
+        res = self._call(
+            'query',
+            lambda col: col.query(
+                query_embeddings=[query_embedding],
+                n_results=top_k,
+                include=['documents', 'metadatas', 'distances'],
+            ),
+        )
+        docs = res.get('documents', [[]])[0]
+        metas = res.get('metadatas', [[]])[0]
+        dists = res.get('distances', [[]])[0]
+        ids = res.get('ids', [[]])[0]  # ids همیشه برگردانده میشه حتی اگر در include نباشه
+
+        out = []
+        for i in range(len(docs)):
+            out.append({'id': ids[i], 'text': docs[i], 'meta': metas[i], 'distance': dists[i]})
+        return out
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            'connected': self._collection is not None,
+            'reconnects': self.reconnects,
+            'operations': self.latency.snapshot(),
+        }
+
+
+_store: ChromaStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> ChromaStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ChromaStore(
+                    host=settings.CHROMA_HOST,
+                    port=settings.CHROMA_PORT,
+                    collection_name=settings.CHROMA_COLLECTION,
+                )
+    return _store
 
 
 def get_collection() -> Collection:
-    client = chromadb.HttpClient(host=settings.CHROMA_HOST, port=settings.CHROMA_PORT)
-    return client.get_or_create_collection(name=settings.CHROMA_COLLECTION)
+    return get_store().collection()
+
+
+def diff_post_chunks(*, post_id: int, chunks: list[str]) -> ChunkDiff:
+    return get_store().diff_post_chunks(post_id=post_id, chunks=chunks)
+
+
+def apply_chunk_diff(
+    diff: ChunkDiff,
+    *,
+    title: str | None,
+    url: str | None,
+    modified_gmt: str | None,
+    chunks: list[str],
+    embeddings: list[list[float]],
+) -> None:
+    get_store().apply_chunk_diff(
+        diff, title=title, url=url, modified_gmt=modified_gmt, chunks=chunks, embeddings=embeddings
+    )
 
 
 def upsert_post_chunks(
@@ -16,39 +230,16 @@ def upsert_post_chunks(
     modified_gmt: str | None,
     chunks: list[str],
     embeddings: list[list[float]],
-) -> None:
-    col = get_collection()
-    
-    col.delete(where={'post_id': str(post_id)})
-    
-    ids = [f"{post_id}:{i}" for i in range(len(chunks))]
-    metadatas = [
-        {
-            'post_id': str(post_id),
-            'title': (title or '')[:500],
-            'url': (url or '')[:2000],
-            'modified_gmt': (modified_gmt or '')[:64],
-            'chunk_index': i,
-        }
-        for i in range(len(chunks))
-    ]
-    
-    col.add(ids=ids, documents=chunks, embeddings=embeddings, metadatas=metadatas)
+) -> ChunkDiff:
+    return get_store().upsert_post_chunks(
+        post_id=post_id,
+        title=title,
+        url=url,
+        modified_gmt=modified_gmt,
+        chunks=chunks,
+        embeddings=embeddings,
+    )
 
 
 def search_similar(*, query_embedding: list[float], top_k: int) -> list[dict]:
-    col = get_collection()
-    res = col.query(
-        query_embeddings=[query_embedding],
-        n_results=top_k,
-        include=['documents', 'metadatas', 'distances', 'ids'],
-    )
-    docs = res.get('documents', [[]])[0]
-    metas = res.get('metadatas', [[]])[0]
-    dists = res.get('distances', [[]])[0]
-    ids = res.get('ids', [[]])[0]
-    
-    out = []
-    for i in range(len(docs)):
-        out.append({'id': ids[i], 'text': docs[i], 'meta': metas[i], 'distance': dists[i]})
-    return out
+    return get_store().search_similar(query_embedding=query_embedding, top_k=top_k)
@@ -1,15 +1,34 @@
 from typing import Literal
-import httpx
 from config.settings import settings
+from rag.embedding_cache import get_embedding_cache
+from rag.http import get_client
+from rag.metrics import record_tokens
+from rag.tokens import estimate_tokens
 
 Provider = Literal['openai', 'gemini']
 
+GEMINI_MAX_TEXT_CHARS = 20000
+GEMINI_BATCH_SIZE = 100
+GEMINI_BATCH_MAX_TOKENS = 20000
 
-def embed_texts(texts: list[str]) -> list[list[float]]:
+
+def embed_texts(texts: list[str], *, use_cache: bool = True) -> list[list[float]]:
     provider: Provider = settings.EMBEDDING_PROVIDER.lower()  # type: ignore
     if provider == 'gemini':
-        return _embed_gemini(texts)
-    return _embed_openai(texts)
+        embed_fn, model = _embed_gemini, settings.GEMINI_EMBEDDING_MODEL
+    else:
+        embed_fn, model = _embed_openai, settings.OPENAI_EMBEDDING_MODEL
+    
+    cache = get_embedding_cache() if use_cache else None
+    if cache is None:
+        return embed_fn(texts)
+    return cache.embed(
+        texts,
+        provider=provider,
+        model=model,
+        dimensions=settings.EMBEDDING_DIMENSIONS,
+        embed_fn=embed_fn,
+    )
 
 
 def _embed_openai(texts: list[str]) -> list[list[float]]:
@@ -19,30 +38,65 @@ def _embed_openai(texts: list[str]) -> list[list[float]]:
     url = 'https://api.openai.com/v1/embeddings'
     headers = {'Authorization': f'Bearer {settings.OPENAI_API_KEY}', 'Content-Type': 'application/json'}
     payload = {'model': settings.OPENAI_EMBEDDING_MODEL, 'input': texts}
+    if settings.EMBEDDING_DIMENSIONS > 0:
+        payload['dimensions'] = settings.EMBEDDING_DIMENSIONS
     
-    with httpx.Client(timeout=60) as client:
-        r = client.post(url, headers=headers, json=payload)
-        r.raise_for_status()
-        data = r.json()
+    r = get_client('openai').post(url, headers=headers, json=payload)
+    r.raise_for_status()
+    data = r.json()
+    record_tokens('openai', 'embed', (data.get('usage') or {}).get('prompt_tokens', 0))
     
     return [item['embedding'] for item in data['data']]
 
 
+def pack_batches(texts: list[str], *, max_items: int, max_tokens: int) -> list[list[int]]:
+    batches: list[list[int]] = []
+    current: list[int] = []
+    current_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (len(current) >= max_items or current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
 def _embed_gemini(texts: list[str]) -> list[list[float]]:
     if not settings.GEMINI_API_KEY:
         raise RuntimeError('GEMINI_API_KEY is missing')
     
     model = settings.GEMINI_EMBEDDING_MODEL
-    url = f'https://generativelanguage.googleapis.com/v1beta/models/{model}:embedContent'
+    url = f'https://generativelanguage.googleapis.com/v1beta/models/{model}:batchEmbedContents'
     headers = {'x-goog-api-key': settings.GEMINI_API_KEY, 'Content-Type': 'application/json'}
     
-    payload = {'content': {'parts': [{'text': t} for t in texts]}}
+    # Empty texts are not sent; they get zero-vector placeholders so positions stay aligned
+    positions = [i for i, t in enumerate(texts) if t and t.strip()]
+    to_send = [texts[i][:GEMINI_MAX_TEXT_CHARS] for i in positions]
     
-    with httpx.Client(timeout=60) as client:
-        r = client.post(url, headers=headers, json=payload)
+    sent: list[list[float]] = []
+    client = get_client('gemini')
+    for batch in pack_batches(to_send, max_items=GEMINI_BATCH_SIZE, max_tokens=GEMINI_BATCH_MAX_TOKENS):
+        requests = []
+        for j in batch:
+            req = {'model': f'models/{model}', 'content': {'parts': [{'text': to_send[j]}]}}
+            if settings.EMBEDDING_DIMENSIONS > 0:
+                req['outputDimensionality'] = settings.EMBEDDING_DIMENSIONS
+            requests.append(req)
+        r = client.post(url, headers=headers, json={'requests': requests})
         r.raise_for_status()
-        data = r.json()
+        vectors = [e['values'] for e in r.json()['embeddings']]
+        if len(vectors) != len(batch):
+            raise RuntimeError(f'Gemini returned {len(vectors)} embeddings for a batch of {len(batch)} texts')
+        sent.extend(vectors)
     
-    if 'embeddings' in data:
-        return [e['values'] for e in data['embeddings']]
-    return [data['embedding']['values']]
+    dims = len(sent[0]) if sent else settings.EMBEDDING_DIMENSIONS
+    if dims <= 0 and texts:
+        raise RuntimeError('Cannot size placeholders for empty texts: no vectors returned and EMBEDDING_DIMENSIONS is 0')
+    embeddings: list[list[float]] = [[0.0] * dims for _ in texts]
+    for i, vec in zip(positions, sent):
+        embeddings[i] = vec
+    return embeddings
@@ -0,0 +1,34 @@
+import atexit
+import threading
+
+import httpx
+
+from rag.metrics import count_responses
+
+_TIMEOUT = 60
+
+_clients: dict[str, httpx.Client] = {}
+_lock = threading.Lock()
+
+
+def get_client(upstream: str) -> httpx.Client:
+    """Process-wide keep-alive client per upstream ('openai', 'gemini', 'wordpress'), so calls skip the TCP/TLS handshake."""
+    client = _clients.get(upstream)
+    if client is not None and not client.is_closed:
+        return client
+    with _lock:
+        client = _clients.get(upstream)
+        if client is None or client.is_closed:
+            client = httpx.Client(timeout=_TIMEOUT, event_hooks=count_responses(upstream))
+            _clients[upstream] = client
+    return client
+
+
+def close_clients() -> None:
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+atexit.register(close_clients)
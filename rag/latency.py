@@ -0,0 +1,43 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+
+class LatencyCounters:
+    """Per-operation call count, error count and latency totals."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._ops: dict[str, dict[str, float]] = {}
+
+    def record(self, op: str, elapsed_ms: float, *, error: bool = False) -> None:
+        with self._lock:
+            s = self._ops.setdefault(op, {'count': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            s['count'] += 1
+            s['total_ms'] += elapsed_ms
+            s['max_ms'] = max(s['max_ms'], elapsed_ms)
+            if error:
+                s['errors'] += 1
+
+    @contextmanager
+    def time(self, op: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.record(op, (time.perf_counter() - start) * 1000, error=True)
+            raise
+        self.record(op, (time.perf_counter() - start) * 1000)
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            return {
+                op: {
+                    **s,
+                    'avg_ms': round(s['total_ms'] / s['count'], 3) if s['count'] else 0.0,
+                    'total_ms': round(s['total_ms'], 3),
+                    'max_ms': round(s['max_ms'], 3),
+                }
+                for op, s in self._ops.items()
+            }
@@ -1,5 +1,8 @@
-import httpx
 from config.settings import settings
+from rag.http import get_client
+from rag.metrics import record_tokens
+
+_TIMEOUT = 90
 
 
 def generate_answer(*, prompt: str) -> str:
@@ -22,10 +25,11 @@ def _gen_openai(prompt: str) -> str:
         'input': prompt,
     }
     
-    with httpx.Client(timeout=90) as client:
-        r = client.post(url, headers=headers, json=payload)
-        r.raise_for_status()
-        data = r.json()
+    r = get_client('openai').post(url, headers=headers, json=payload, timeout=_TIMEOUT)
+    r.raise_for_status()
+    data = r.json()
+    usage = data.get('usage') or {}
+    record_tokens('openai', 'generate', usage.get('input_tokens', 0), usage.get('output_tokens', 0))
     
     if isinstance(data, dict) and data.get('output_text'):
         return str(data['output_text'])
@@ -48,10 +52,11 @@ def _gen_gemini(prompt: str) -> str:
     headers = {'x-goog-api-key': settings.GEMINI_API_KEY, 'Content-Type': 'application/json'}
     payload = {'contents': [{'role': 'user', 'parts': [{'text': prompt}]}]}
     
-    with httpx.Client(timeout=90) as client:
-        r = client.post(url, headers=headers, json=payload)
-        r.raise_for_status()
-        data = r.json()
+    r = get_client('gemini').post(url, headers=headers, json=payload, timeout=_TIMEOUT)
+    r.raise_for_status()
+    data = r.json()
+    usage = data.get('usageMetadata') or {}
+    record_tokens('gemini', 'generate', usage.get('promptTokenCount', 0), usage.get('candidatesTokenCount', 0))
     
     candidates = data.get('candidates', []) or []
     if not candidates:
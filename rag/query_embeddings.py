@@ -0,0 +1,130 @@
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+
+import redis
+
+from config.settings import settings
+from rag.embeddings import embed_texts
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_question(question: str) -> str:
+    text = unicodedata.normalize('NFKC', question or '')
+    # Zero-width non-joiner/joiner are spelling variants in Persian, not meaning
+    text = text.replace('\u200c', ' ').replace('\u200d', '')
+    return _WHITESPACE.sub(' ', text).strip().casefold()
+
+
+class LRUCache:
+    """Thread-safe in-process LRU with per-entry TTL."""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._data: OrderedDict[str, tuple[float, list[float]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> list[float] | None:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: list[float]) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._data),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+
+_memory = LRUCache(settings.QUERY_EMBED_CACHE_MAX_SIZE, settings.QUERY_EMBED_CACHE_TTL_SECONDS)
+_redis: redis.Redis | None = None
+_redis_hits = 0
+_redis_errors = 0
+
+
+def _get_redis() -> redis.Redis:
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(settings.REDIS_URL, socket_timeout=2)
+    return _redis
+
+
+def _cache_key(normalized: str) -> str:
+    provider = settings.EMBEDDING_PROVIDER.lower()
+    model = settings.GEMINI_EMBEDDING_MODEL if provider == 'gemini' else settings.OPENAI_EMBEDDING_MODEL
+    digest = hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+    return f'query_emb:{provider}:{model}:{settings.EMBEDDING_DIMENSIONS}:{digest}'
+
+
+def embed_query(question: str) -> list[float]:
+    global _redis_hits, _redis_errors
+    normalized = normalize_question(question)
+    key = _cache_key(normalized)
+    
+    vec = _memory.get(key)
+    if vec is not None:
+        return vec
+    
+    r = _get_redis()
+    try:
+        blob = r.get(key)
+    except (redis.RedisError, OSError) as e:
+        print(f'Query embedding cache lookup failed: {e}')
+        _redis_errors += 1
+        blob = None
+    if blob is not None:
+        _redis_hits += 1
+        floats = array('f')
+        floats.frombytes(blob)
+        vec = floats.tolist()
+        _memory.put(key, vec)
+        return vec
+    
+    # the normalized form is only the cache key; embed what the user typed
+    vec = embed_texts([question], use_cache=False)[0]
+    _memory.put(key, vec)
+    try:
+        r.set(key, array('f', vec).tobytes(), ex=settings.QUERY_EMBED_CACHE_TTL_SECONDS)
+    except (redis.RedisError, OSError) as e:
+        print(f'Query embedding cache store failed: {e}')
+        _redis_errors += 1
+    return vec
+
+
+def query_cache_stats() -> dict:
+    return {'memory': _memory.stats(), 'redis_hits': _redis_hits, 'redis_errors': _redis_errors}
@@ -1,8 +1,8 @@
 import base64
 from typing import Any
-import httpx
 from bs4 import BeautifulSoup
 from config.settings import settings
+from rag.http import get_client
 
 
 def _basic_auth_header() -> str | None:
@@ -31,22 +31,22 @@ def fetch_posts(*, modified_after: str | None = None) -> list[dict[str, Any]]:
     page = 1
     per_page = settings.WP_PER_PAGE
     
-    with httpx.Client(timeout=60) as client:
-        while True:
-            params = {'page': page, 'per_page': per_page, 'status': 'publish'}
-            if modified_after:
-                params['modified_after'] = modified_after
-            
-            resp = client.get(url, params=params, headers=headers)
-            if resp.status_code == 400 and 'rest_post_invalid_page_number' in resp.text:
-                break
-            resp.raise_for_status()
-            
-            items = resp.json()
-            if not items:
-                break
-            
-            out.extend(items)
-            page += 1
+    client = get_client('wordpress')
+    while True:
+        params = {'page': page, 'per_page': per_page, 'status': 'publish'}
+        if modified_after:
+            params['modified_after'] = modified_after
+        
+        resp = client.get(url, params=params, headers=headers)
+        if resp.status_code == 400 and 'rest_post_invalid_page_number' in resp.text:
+            break
+        resp.raise_for_status()
+        
+        items = resp.json()
+        if not items:
+            break
+        
+        out.extend(items)
+        page += 1
     
     return out
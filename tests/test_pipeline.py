@@ -0,0 +1,117 @@
+import itertools
+import threading
+import time
+
+import pytest
+
+from app.tasks.pipeline import Emit, FnWorker, Pipeline, Stage, StageWorker
+
+
+def _collector(out: list) -> Stage:
+    lock = threading.Lock()
+
+    def collect(item, emit: Emit) -> None:
+        with lock:
+            out.append(item)
+
+    return Stage("collect", lambda: FnWorker(collect))
+
+
+def test_items_flow_through_every_stage_in_order():
+    out: list = []
+    pipeline = Pipeline(
+        [
+            Stage("double", lambda: FnWorker(lambda x, emit: emit(x * 2))),
+            Stage("inc", lambda: FnWorker(lambda x, emit: emit(x + 1))),
+            _collector(out),
+        ],
+        queue_size=2,
+    )
+
+    stats = pipeline.run(range(100))
+
+    assert out == [x * 2 + 1 for x in range(100)]
+    assert list(stats) == ["fetch", "double", "inc", "collect"]
+    assert all(s["items_in"] == 100 for s in stats.values())
+    assert stats["inc"]["items_out"] == 100
+
+
+def test_parallel_workers_see_every_item_once():
+    out: list = []
+    pipeline = Pipeline([Stage("inc", lambda: FnWorker(lambda x, emit: emit(x + 1)), workers=4), _collector(out)])
+
+    pipeline.run(range(200))
+
+    assert sorted(out) == list(range(1, 201))
+
+
+def test_stage_error_stops_the_pipeline_and_is_reraised():
+    seen: list = []
+
+    def fail_on_five(x, emit: Emit) -> None:
+        if x == 5:
+            raise ValueError("bad item")
+        emit(x)
+
+    pipeline = Pipeline([Stage("check", lambda: FnWorker(fail_on_five)), _collector(seen)], queue_size=1)
+
+    # an endless source only finishes if the error stops it
+    with pytest.raises(ValueError, match="bad item"):
+        pipeline.run(itertools.count())
+    assert 5 not in seen
+
+
+def test_source_error_is_reraised():
+    def source():
+        yield 1
+        raise RuntimeError("fetch failed")
+
+    with pytest.raises(RuntimeError, match="fetch failed"):
+        Pipeline([_collector([])]).run(source())
+
+
+class _Buffering(StageWorker):
+    """Holds items until tick() or close() flushes them, like the embedding batcher."""
+
+    def __init__(self, ticks: list):
+        self.buffer: list = []
+        self.ticks = ticks
+
+    def process(self, item, emit: Emit) -> None:
+        self.buffer.append(item)
+
+    def poll_timeout(self) -> float | None:
+        return 0.01 if self.buffer else None
+
+    def tick(self, emit: Emit) -> None:
+        self.ticks.append(list(self.buffer))
+        for item in self.buffer:
+            emit(item)
+        self.buffer.clear()
+
+    def close(self, emit: Emit) -> None:
+        for item in self.buffer:
+            emit(item)
+
+
+def test_tick_fires_on_poll_timeout_without_new_input():
+    ticks: list = []
+    out: list = []
+
+    def slow_source():
+        for i in range(3):
+            yield i
+            time.sleep(0.2)
+
+    Pipeline([Stage("buffer", lambda: _Buffering(ticks)), _collector(out)]).run(slow_source())
+
+    assert ticks == [[0], [1], [2]]
+    assert out == [0, 1, 2]
+
+
+def test_stage_worker_requires_process():
+    class NoProcess(StageWorker):
+        pass
+
+    with pytest.raises(TypeError):
+        NoProcess()